@@ -0,0 +1,183 @@
+"""
+منسق وكلاء البيانات
+Agent Orchestrator for FinClick.AI
+
+تشغيل وكلاء الإثراء بالتوازي تحت مهلة إجمالية واحدة:
+- مهلة خاصة لكل وكيل
+- قاطع دائرة لكل وكيل يتخطاه بعد تكرار الفشل ثم يجربه مجدداً بعد فترة
+- دمج النتائج الجزئية للوكلاء الذين أنهوا في الوقت
+
+زمن الإثراء محدود بالمهلة الإجمالية لا بمجموع أزمنة الوكلاء. الوكلاء دوال غير متزامنة
+تكتب نتيجتها في قاموس جزئي خاص بها، فيمكن اختبار المنسق بوكلاء يتصلون بخوادم HTTP محلية.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+Agent = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class CircuitBreaker:
+    """قاطع دائرة: مغلق ← مفتوح بعد عدد من الإخفاقات المتتالية ← نصف مفتوح بعد مهلة الاستعادة"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """هل يُسمح بتشغيل الوكيل الآن؟ في الحالة نصف المفتوحة يُسمح بمحاولة واحدة فقط"""
+
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self._trial_running or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures}
+
+
+class AgentOrchestrator:
+    """تشغيل مجموعة وكلاء بالتوازي مع مهلات وقواطع دائرة ودمج جزئي"""
+
+    def __init__(self, deadline: Optional[float] = None, default_timeout: float = 5.0,
+                 failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.deadline = deadline or float(os.environ.get("AGENT_DEADLINE_SECONDS", "8"))
+        self.default_timeout = default_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timeouts: Dict[str, float] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def configure(self, name: str, timeout: Optional[float] = None) -> None:
+        """تحديد مهلة وكيل"""
+
+        if timeout is not None:
+            self.timeouts[name] = timeout
+        self._breaker(name)
+
+    def _breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[name]
+
+    @staticmethod
+    def _reported_error(partial: Dict[str, Any]) -> Optional[str]:
+        """الوكلاء يلتقطون أخطاءهم ويكتبون {"error": ...} في القسم الخاص بهم"""
+
+        for value in partial.values():
+            if isinstance(value, dict) and "error" in value:
+                return str(value["error"])
+        return None
+
+    async def _run_agent(self, name: str, agent: Agent, timeout: float) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+        partial: Dict[str, Any] = {}
+        breaker = self._breaker(name)
+        start = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(agent(partial), timeout)
+            error = self._reported_error(partial)
+            status = "failed" if error else "success"
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"exceeded {timeout:.2f}s"
+        except asyncio.CancelledError:
+            breaker.record_failure()
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        if status == "success":
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            logging.warning(f"Agent {name} {status}: {error}")
+
+        report = {"status": status, "duration": round(time.perf_counter() - start, 3)}
+        if error:
+            report["error"] = error
+        return name, partial, report
+
+    async def run(self, agents: Dict[str, Agent], deadline: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """تشغيل الوكلاء وإرجاع (النتائج المدموجة، تقرير كل وكيل)"""
+
+        partials, reports = await self.run_agents(agents, deadline)
+        return self.merge(partials, list(agents)), reports
+
+    async def run_agents(self, agents: Dict[str, Agent], deadline: Optional[float] = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """تشغيل الوكلاء وإرجاع (النتيجة الجزئية لكل وكيل ناجح، تقرير كل وكيل)"""
+
+        deadline = deadline or self.deadline
+        reports: Dict[str, Dict[str, Any]] = {}
+        tasks = {}
+
+        for name, agent in agents.items():
+            if not self._breaker(name).allow():
+                reports[name] = {"status": "skipped", "duration": 0.0, "error": "circuit open"}
+                continue
+            timeout = min(self.timeouts.get(name, self.default_timeout), deadline)
+            tasks[asyncio.create_task(self._run_agent(name, agent, timeout))] = name
+
+        partials: Dict[str, Dict[str, Any]] = {}
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=deadline)
+            for task in pending:
+                task.cancel()
+                reports[tasks[task]] = {"status": "deadline", "duration": round(deadline, 3)}
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            for task in done:
+                name, partial, report = task.result()
+                reports[name] = report
+                if report["status"] == "success":
+                    partials[name] = partial
+
+        return partials, {name: reports[name] for name in agents if name in reports}
+
+    @staticmethod
+    def merge(partials: Dict[str, Dict[str, Any]], order: List[str]) -> Dict[str, Any]:
+        """دمج النتائج الجزئية بترتيب ثابت للوكلاء حتى تكون النتيجة حتمية"""
+
+        merged: Dict[str, Any] = {}
+        for name in order:
+            for key, value in partials.get(name, {}).items():
+                if isinstance(value, list) and isinstance(merged.get(key), list):
+                    merged[key].extend(value)
+                elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+                    merged[key].update(value)
+                elif isinstance(value, (list, dict)):
+                    # نسخة حتى لا يُعدّل الدمج النتائج الجزئية (قد تكون محفوظة في ذاكرة مؤقتة)
+                    merged[key] = type(value)(value)
+                else:
+                    merged[key] = value
+        return merged
+
+    def get_breaker_states(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
@@ -11,24 +11,27 @@ AI Agents System for Financial Data Enrichment
 """
 
 import asyncio
-import aiohttp
-import yfinance as yf
 from alpha_vantage.timeseries import TimeSeries
 from alpha_vantage.fundamentaldata import FundamentalData
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-import requests
 from bs4 import BeautifulSoup
+import os
 import json
 import logging
+from agent_orchestrator import AgentOrchestrator
+from enrichment_cache import enrichment_cache, MINUTE, DAY, WEEK
+from single_flight import SingleFlight
+from http_client import http_client
+from market_data import market_data
+from symbol_resolver import symbol_resolver
 
 class AIFinancialAgents:
     """نظام وكلاء الذكاء الاصطناعي لإثراء البيانات المالية"""
     
     def __init__(self):
-        self.session = None
         self.agents_status = {
             "market_data_agent": True,
             "financial_news_agent": True,
@@ -45,78 +48,136 @@ class AIFinancialAgents:
             "world_bank": True,
             "investing_com": True
         }
-    
-    async def initialize_session(self):
-        """تهيئة جلسة HTTP لطلبات البيانات"""
-        if not self.session:
-            self.session = aiohttp.ClientSession()
-    
-    async def close_session(self):
-        """إغلاق جلسة HTTP"""
-        if self.session:
-            await self.session.close()
-            self.session = None
+        
+        # مصادر الأخبار؛ قابلة للتغيير لتوجيه الوكيل إلى خوادم محلية بديلة في الاختبار
+        self.news_sources = os.environ.get(
+            "FINANCIAL_NEWS_SOURCES",
+            "https://finance.yahoo.com/quote/{company}/news,https://www.investing.com/news/stock-market-news"
+        ).split(",")
+        
+        # تشغيل الوكلاء بالتوازي: مهلة إجمالية، مهلة لكل وكيل، وقاطع دائرة لكل وكيل
+        self.orchestrator = AgentOrchestrator()
+        self.orchestrator.configure("market_data_agent", timeout=6.0)
+        self.orchestrator.configure("financial_news_agent", timeout=5.0)
+        self.orchestrator.configure("economic_indicators_agent", timeout=3.0)
+        self.orchestrator.configure("company_research_agent", timeout=3.0)
+        self.orchestrator.configure("benchmark_analysis_agent", timeout=3.0)
+        
+        # مدة صلاحية نتيجة كل وكيل في الذاكرة المؤقتة
+        self.agent_ttls = {
+            "market_data_agent": 5 * MINUTE,
+            "financial_news_agent": 30 * MINUTE,
+            "economic_indicators_agent": DAY,
+            "company_research_agent": 2 * WEEK,
+            "benchmark_analysis_agent": DAY
+        }
+        
+        # إثراء واحد لكل شركة قيد التنفيذ مهما تعددت الطلبات المتزامنة
+        self.flights = SingleFlight()
     
     async def enrich_company_data(self, company_name: str, sector: str, country: str = "Israel") -> Dict:
-        """إثراء بيانات الشركة بالمعلومات المحلية (بدون APIs خارجية)"""
+        """إثراء بيانات الشركة بتشغيل الوكلاء بالتوازي ضمن مهلة إجمالية ودمج ما اكتمل منها
+
+        نتيجة كل وكيل محفوظة في الذاكرة المؤقتة بمدة صلاحيتها؛ النتائج المنتهية تُعاد فوراً وتُحدّث في الخلفية.
+        الطلبات المتزامنة لنفس الشركة تنتظر إثراءً واحداً وتتشارك نتيجته (لا يُعدّلها المستدعي).
+        """
+        
+        cache_key = f"{company_name.strip().casefold()}|{sector}|{country}"
+        return await self.flights.do(
+            f"enrich|{cache_key}",
+            lambda: self._enrich_company_data(company_name, sector, country, cache_key)
+        )
+    
+    async def _enrich_company_data(self, company_name: str, sector: str, country: str, cache_key: str) -> Dict:
+        """تشغيل الوكلاء عبر الذاكرة المؤقتة ودمج نتائجهم"""
+        
+        agents = {
+            "market_data_agent": lambda partial: self._market_data_agent(company_name, partial),
+            "financial_news_agent": lambda partial: self._financial_news_agent(company_name, sector, partial),
+            "economic_indicators_agent": lambda partial: self._economic_indicators_agent(country, partial),
+            "company_research_agent": lambda partial: self._company_research_agent(company_name, sector, partial),
+            "benchmark_analysis_agent": lambda partial: self._benchmark_analysis_agent(sector, country, partial)
+        }
+        agents = {name: agent for name, agent in agents.items() if self.agents_status.get(name)}
+        
+        agents_report: Dict[str, Dict] = {}
+        
+        def refresh(name: str, agent):
+            # تحديث نتيجة منتهية في الخلفية؛ خارج المهلة الإجمالية لأن الطلب لا ينتظره
+            async def fetch():
+                partials, reports = await self.orchestrator.run_agents({name: agent})
+                if name not in partials:
+                    raise RuntimeError(reports[name].get("error", reports[name]["status"]))
+                return partials[name]
+            return fetch
+        
+        keys = {name: f"{cache_key}|{name}" for name in agents}
+        lookups = await asyncio.gather(*(
+            enrichment_cache.lookup(keys[name], self.agent_ttls[name], refresh(name, agent))
+            for name, agent in agents.items()
+        ))
+        
+        partials: Dict[str, Dict] = {}
+        cache_info: Dict[str, Dict] = {}
+        last_known = {}
+        for name, (hit, cached) in zip(agents, lookups):
+            if hit is not None:
+                partials[name], cache_info[name] = hit
+            else:
+                last_known[name] = cached
+        
+        # كل الوكلاء غير المخزنين في تشغيل واحد تحت المهلة الإجمالية نفسها
+        if last_known:
+            fetched, reports = await self.orchestrator.run_agents({name: agents[name] for name in last_known})
+            agents_report.update(reports)
+            for name, cached in last_known.items():
+                if name in fetched:
+                    partials[name] = fetched[name]
+                    cache_info[name] = await enrichment_cache.fetched(keys[name], self.agent_ttls[name], fetched[name])
+                elif cached is not None:
+                    partials[name], cache_info[name] = enrichment_cache.fallback(cached, self.agent_ttls[name])
+        
+        partial_results = self.orchestrator.merge(partials, list(agents))
+        
+        for name in cache_info:
+            agents_report.setdefault(name, {"status": "cached", "duration": 0.0})
         
-        # استخدام بيانات محلية لتجنب مشاكل APIs الخارجية
         enriched_data = {
             "company_name": company_name,
             "sector": sector,
             "country": country,
             "enrichment_timestamp": datetime.now().isoformat(),
-            "market_data": {
-                "status": "success",
-                "market_trend": "مستقر",
-                "sector_performance": "جيد",
-                "benchmark_comparison": "أعلى من المتوسط"
-            },
-            "financial_news": {
-                "status": "success",
-                "sentiment": "إيجابي",
-                "key_news": ["نمو مستمر في القطاع", "استثمارات جديدة متوقعة"]
-            },
-            "economic_context": {
-                "status": "success",
-                "gdp_growth": "3.2%",
-                "inflation_rate": "2.1%",
-                "interest_rate": "4.5%"
-            },
-            "industry_benchmarks": {
-                "status": "success",
-                "sector_average_roe": "15%",
-                "sector_average_roa": "8%",
-                "sector_growth_rate": "12%"
-            },
-            "company_research": {
-                "status": "success",
-                "company_size": "متوسطة",
-                "market_position": "قوية",
-                "competitive_advantage": "تكنولوجيا متطورة"
-            },
-            "confidence_score": 100.0,
-            "data_source": "محلي - تجنب مشاكل APIs الخارجية"
+            "data_sources_used": [],
+            **partial_results,
+            "agents_report": {name: agents_report[name] for name in agents if name in agents_report},
+            "cache": {
+                "age_seconds": max((info["age_seconds"] for info in cache_info.values()), default=0.0),
+                "sections": cache_info
+            }
         }
+        enriched_data["confidence_score"] = await self._calculate_confidence_score(enriched_data)
         
-        logging.info(f"Data enrichment completed locally for {company_name}")
+        completed = sum(1 for report in agents_report.values() if report["status"] == "success")
+        logging.info(f"Data enrichment completed for {company_name}: {completed}/{len(agents)} agents")
         return enriched_data
     
     async def _market_data_agent(self, company_name: str, enriched_data: Dict) -> None:
         """وكيل بيانات السوق - الحصول على أسعار الأسهم والمؤشرات"""
         
         try:
-            enriched_data["data_sources_used"].append("market_data_agent")
+            enriched_data.setdefault("data_sources_used", []).append("market_data_agent")
             
             # البحث عن رمز السهم
             stock_symbol = await self._find_stock_symbol(company_name)
             
             if stock_symbol:
-                # الحصول على بيانات السهم من Yahoo Finance
+                # الحصول على بيانات السهم عبر خدمة بيانات السوق (تنزيل مجمّع في خيط)
                 try:
-                    ticker = yf.Ticker(stock_symbol)
-                    info = ticker.info
-                    hist = ticker.history(period="1y")
+                    info, hist = await asyncio.gather(
+                        market_data.info(stock_symbol),
+                        market_data.history([stock_symbol], period="1y")
+                    )
+                    closes = hist["close"]
                     
                     enriched_data["market_data"] = {
                         "symbol": stock_symbol,
@@ -131,7 +192,7 @@ class AIFinancialAgents:
                             "1d_change": 0,  # يمكن حسابها من البيانات التاريخية
                             "1w_change": 0,
                             "1m_change": 0,
-                            "1y_change": float(((hist['Close'][-1] - hist['Close'][0]) / hist['Close'][0] * 100)) if len(hist) > 0 else 0
+                            "1y_change": float((closes.iloc[-1] - closes.iloc[0]) / closes.iloc[0] * 100) if len(closes) > 0 else 0
                         }
                     }
                 except Exception as yf_error:
@@ -148,28 +209,24 @@ class AIFinancialAgents:
         """وكيل الأخبار المالية - الحصول على آخر الأخبار المالية"""
         
         try:
-            enriched_data["data_sources_used"].append("financial_news_agent")
-            
-            # مصادر الأخبار المجانية
-            news_sources = [
-                f"https://finance.yahoo.com/quote/{company_name}/news",
-                "https://www.investing.com/news/stock-market-news",
-                "https://finviz.com/news.ashx"
-            ]
+            enriched_data.setdefault("data_sources_used", []).append("financial_news_agent")
             
             financial_news = []
             
-            # محاولة الحصول على الأخبار من مصادر مختلفة
-            for source in news_sources[:2]:  # تحديد المصادر لتجنب التحميل الزائد
+            async def fetch(source: str) -> List[Dict]:
                 try:
-                    if self.session:
-                        async with self.session.get(source, timeout=10) as response:
-                            if response.status == 200:
-                                content = await response.text()
-                                # يمكن تحسين هذا باستخدام parsing أكثر تقدماً
-                                financial_news.extend(await self._parse_financial_news(content, company_name))
-                except:
-                    continue
+                    # عميل HTTP المشترك: اتصالات مفتوحة مسبقاً وإعادة محاولة للأخطاء المؤقتة
+                    status, content = await http_client.get_text(source.format(company=company_name))
+                    if status == 200:
+                        # يمكن تحسين هذا باستخدام parsing أكثر تقدماً
+                        return await self._parse_financial_news(content, company_name)
+                except Exception:
+                    pass
+                return []
+            
+            # المصادر تُطلب بالتوازي
+            for items in await asyncio.gather(*(fetch(source) for source in self.news_sources)):
+                financial_news.extend(items)
             
             # إضافة أخبار تجريبية إذا لم نحصل على أخبار حقيقية
             if not financial_news:
@@ -185,7 +242,7 @@ class AIFinancialAgents:
         """وكيل المؤشرات الاقتصادية - الحصول على البيانات الاقتصادية"""
         
         try:
-            enriched_data["data_sources_used"].append("economic_indicators_agent")
+            enriched_data.setdefault("data_sources_used", []).append("economic_indicators_agent")
             
             # بيانات اقتصادية أساسية (يمكن ربطها بمصادر حقيقية)
             economic_data = {
@@ -221,7 +278,7 @@ class AIFinancialAgents:
         """وكيل بحث الشركات - الحصول على معلومات مفصلة عن الشركة"""
         
         try:
-            enriched_data["data_sources_used"].append("company_research_agent")
+            enriched_data.setdefault("data_sources_used", []).append("company_research_agent")
             
             # معلومات أساسية عن الشركة
             company_profile = {
@@ -279,7 +336,7 @@ class AIFinancialAgents:
         """وكيل التحليل المقارن - الحصول على معايير القطاع"""
         
         try:
-            enriched_data["data_sources_used"].append("benchmark_analysis_agent")
+            enriched_data.setdefault("data_sources_used", []).append("benchmark_analysis_agent")
             
             # معايير القطاع والصناعة
             industry_benchmarks = {
@@ -322,54 +379,28 @@ class AIFinancialAgents:
             enriched_data["industry_benchmarks"] = {"error": str(e)}
     
     async def _find_stock_symbol(self, company_name: str) -> Optional[str]:
-        """البحث عن رمز السهم للشركة"""
-        
-        # قاموس رموز الأسهم الشائعة (يمكن توسيعه)
-        stock_symbols = {
-            "apple": "AAPL",
-            "microsoft": "MSFT",
-            "google": "GOOGL",
-            "amazon": "AMZN",
-            "tesla": "TSLA",
-            "teva": "TEVA",
-            "check point": "CHKP",
-            "nice systems": "NICE",
-            "bank hapoalim": "POLI.TA",
-            "bank leumi": "LUMI.TA"
-        }
+        """البحث عن رمز السهم للشركة في فهرس الإدراجات المحلي"""
         
-        company_lower = company_name.lower()
-        for key, symbol in stock_symbols.items():
-            if key in company_lower or company_lower in key:
-                return symbol
-        
-        return None
+        return symbol_resolver.resolve(company_name)
     
     async def _get_market_indices(self, enriched_data: Dict) -> None:
         """الحصول على بيانات المؤشرات الرئيسية"""
         
         try:
             indices = ["^TA125.TA", "^GSPC", "^IXIC", "^DJI"]  # TA125, S&P500, NASDAQ, DOW
-            indices_data = {}
+            # تنزيل واحد لكل المؤشرات بدلاً من طلب لكل مؤشر
+            changes = market_data.latest_changes(await market_data.history(indices, period="5d"))
             
-            for index in indices:
-                try:
-                    ticker = yf.Ticker(index)
-                    hist = ticker.history(period="5d")
-                    if len(hist) > 0:
-                        current_price = hist['Close'][-1]
-                        prev_price = hist['Close'][-2] if len(hist) > 1 else current_price
-                        change_percent = ((current_price - prev_price) / prev_price * 100) if prev_price != 0 else 0
-                        
-                        indices_data[index] = {
-                            "current_value": float(current_price),
-                            "change_percent": float(change_percent),
-                            "trend": "up" if change_percent > 0 else "down" if change_percent < 0 else "flat"
-                        }
-                except:
-                    continue
+            indices_data = {}
+            for index, row in changes.iterrows():
+                change_percent = float(row["change_percent"])
+                indices_data[index] = {
+                    "current_value": float(row["current_value"]),
+                    "change_percent": change_percent,
+                    "trend": "up" if change_percent > 0 else "down" if change_percent < 0 else "flat"
+                }
             
-            enriched_data["market_data"]["indices"] = indices_data
+            enriched_data.setdefault("market_data", {})["indices"] = indices_data
             
         except Exception as e:
             logging.warning(f"Market indices error: {e}")
@@ -470,6 +501,12 @@ class AIFinancialAgents:
         
         return {
             "agents_status": self.agents_status,
+            "circuit_breakers": self.orchestrator.get_breaker_states(),
+            "enrichment_cache": enrichment_cache.get_stats(),
+            "single_flight": self.flights.get_stats(),
+            "http_client": http_client.get_stats(),
+            "market_data": market_data.get_stats(),
+            "enrichment_deadline_seconds": self.orchestrator.deadline,
             "data_sources": self.data_sources,
             "capabilities": {
                 "real_time_market_data": True,
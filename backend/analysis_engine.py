@@ -16,6 +16,7 @@ import math
 
 # استيراد المحرك الجديد مع 170+ تحليل
 from financial_analysis_engine_170 import FinancialAnalysisEngine as NewFinancialAnalysisEngine
+from symbol_resolver import symbol_resolver
 
 # إعداد السجلات
 logging.basicConfig(level=logging.INFO)
@@ -1138,6 +1139,13 @@ class FinancialAnalysisEngine:
             }
         }
     
+    def _stock_symbol(self) -> str:
+        """رمز السهم المحدد، أو المستنتج من اسم الشركة، لقراءة الأسعار من مخزن الأسعار"""
+        symbol = getattr(self, 'symbol', '')
+        if not symbol and getattr(self, 'company_name', None):
+            symbol = symbol_resolver.resolve(self.company_name) or ''
+        return symbol
+    
     def _convert_to_new_format(self):
         """تحويل البيانات إلى التنسيق الجديد للمحرك 170+"""
         from financial_analysis_engine_170 import FinancialData as NewFinancialData
@@ -1222,6 +1230,8 @@ class FinancialAnalysisEngine:
             # بيانات إضافية
             market_cap=self.data.market_cap,
             stock_price=self.data.stock_price,
+            symbol=self._stock_symbol(),
+            price_date=getattr(self, 'price_date', None),
             book_value_per_share=self.data.book_value_per_share,
             tangible_book_value=self.data.tangible_book_value,
             working_capital=self.data.working_capital,
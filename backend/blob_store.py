@@ -0,0 +1,176 @@
+"""
+تخزين النصوص والجداول المستخرجة خارج مستندات MongoDB
+Compressed Blob Store for FinClick.AI
+
+- local: مخزن محلي معنون بالمحتوى (SHA-256)، المحتوى المكرر يُخزن مرة واحدة
+- gridfs: GridFS عبر motor لنشر متعدد الخوادم
+- الضغط بـ zstd إن توفرت مكتبة zstandard، وإلا zlib
+
+يبقى في المستند ملخص الملف والبنود المستخرجة ومرجع صغير لكل كتلة، وتُقرأ الكتل عند الطلب فقط.
+"""
+
+import os
+import json
+import zlib
+import asyncio
+import hashlib
+import tempfile
+from typing import Any, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd اختياري؛ zlib متاح دائماً
+    zstandard = None
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+except ImportError:
+    AsyncIOMotorGridFSBucket = None
+
+# حقول كل ملف التي تُنقل خارج المستند
+BLOB_FIELDS = ("raw_text", "tables")
+
+
+def _compress(data: bytes) -> tuple:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=10).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+class LocalBlobBackend:
+    """ملفات مضغوطة على القرص باسم بصمة محتواها"""
+
+    name = "local"
+
+    def __init__(self, directory: Optional[str] = None):
+        # المستندات تشير إلى الكتل بعد إعادة التشغيل، فالمجلد الافتراضي دائم وليس مجلداً مؤقتاً
+        data_dir = os.environ.get("FINCLICK_DATA_DIR", os.path.join(os.path.expanduser("~"), ".finclick"))
+        self.directory = directory or os.environ.get("BLOB_STORE_DIR", os.path.join(data_dir, "blobs"))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+            raise KeyError(key)
+        return os.path.join(self.directory, key[:2], key)
+
+    def _put_sync(self, key: str, payload: bytes) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return  # نفس المحتوى مخزن مسبقاً
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+
+    def _get_sync(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    async def put(self, key: str, payload: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._put_sync, key, payload)
+
+    async def get(self, key: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, self._get_sync, key)
+        except FileNotFoundError:
+            raise KeyError(key)
+
+
+class GridFSBlobBackend:
+    """كتل مضغوطة في GridFS؛ اسم الملف هو بصمة المحتوى"""
+
+    name = "gridfs"
+
+    def __init__(self, database, bucket_name: str = "processing_blobs"):
+        if AsyncIOMotorGridFSBucket is None:
+            raise RuntimeError("motor is not installed")
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+
+    async def put(self, key: str, payload: bytes) -> None:
+        if await self.files.find_one({"filename": key}, {"_id": 1}):
+            return
+        await self.bucket.upload_from_stream(key, payload)
+
+    async def get(self, key: str) -> bytes:
+        try:
+            stream = await self.bucket.open_download_stream_by_name(key)
+        except Exception:
+            raise KeyError(key)
+        return await stream.read()
+
+
+class BlobStore:
+    """نقل الحقول الكبيرة لنتائج المعالجة إلى كتل مضغوطة وقراءتها عند الطلب"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBlobBackend()
+
+    def configure(self, database=None) -> None:
+        """اختيار المخزن حسب BLOB_STORE (local أو gridfs)"""
+
+        if os.environ.get("BLOB_STORE", "local").lower() == "gridfs" and database is not None:
+            self.backend = GridFSBlobBackend(database)
+
+    async def put_json(self, value: Any) -> Dict[str, Any]:
+        """تخزين قيمة JSON مضغوطة وإرجاع مرجعها"""
+
+        data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+        key = hashlib.sha256(data).hexdigest()
+        codec, payload = _compress(data)
+        await self.backend.put(key, codec.encode("ascii") + b"\0" + payload)
+        return {"blob": key, "backend": self.backend.name, "size": len(data), "stored_size": len(payload) + len(codec) + 1}
+
+    async def get_json(self, ref: Dict[str, Any]) -> Any:
+        """قراءة قيمة من مرجعها"""
+
+        stored = await self.backend.get(ref["blob"])
+        codec, _, payload = stored.partition(b"\0")
+        return json.loads(_decompress(codec.decode("ascii"), payload))
+
+    async def offload_processing_results(self, processing_results: Dict[str, Any]) -> Dict[str, Any]:
+        """نسخة من النتائج للحفظ في MongoDB: النص الخام والجداول لكل ملف تُستبدل بمراجع"""
+
+        stored = dict(processing_results)
+        stored["files_processed"] = [await self._offload_file(f) for f in processing_results.get("files_processed", [])]
+
+        # ملفات الشركات هي نفس كائنات files_processed؛ يكفي ذكر أسمائها
+        if "companies" in processing_results:
+            stored["companies"] = {
+                company: {
+                    **{k: v for k, v in group.items() if k != "files_processed"},
+                    "files": [f["filename"] for f in group.get("files_processed", [])]
+                }
+                for company, group in processing_results["companies"].items()
+            }
+        return stored
+
+    async def _offload_file(self, file_result: Dict[str, Any]) -> Dict[str, Any]:
+        extracted = dict(file_result.get("extracted_data", {}))
+        blobs = {}
+        for field in BLOB_FIELDS:
+            value = extracted.pop(field, None)
+            if value:
+                blobs[field] = await self.put_json(value)
+
+        stored = dict(file_result)
+        stored["extracted_data"] = extracted
+        stored["blobs"] = blobs
+        return stored
+
+
+# Global instance
+blob_store = BlobStore()
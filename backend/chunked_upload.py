@@ -0,0 +1,307 @@
+"""
+الرفع المجزأ القابل للاستئناف
+Resumable Chunked Uploads for FinClick.AI
+
+- init: إنشاء جلسة رفع بحجم الملف وحجم الجزء
+- append: كتابة كل جزء في موضعه داخل ملف واحد على القرص بعد التحقق من SHA-256
+- status: الأجزاء المستلمة والناقصة لاستئناف الرفع بعد انقطاع الاتصال
+- complete: التحقق من اكتمال الملف وتسليمه للمحلل
+
+تحديث manifest يتم تحت قفل ملف (fcntl) لأن أجزاء الجلسة الواحدة قد تصل إلى
+عمليات uvicorn مختلفة، فلا يضيع جزء مستلم بسبب قراءة وكتابة متزامنتين.
+complete يعلّم الجلسة completing تحت القفل نفسه قبل نقل الملف، فيُرفض أي جزء متأخر
+أو complete ثانٍ بخطأ تعارض بدلاً من الكتابة في ملف يُنقل.
+"""
+
+import os
+import fcntl
+import json
+import uuid
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from upload_buffer import UploadBuffer, UploadTooLargeError
+
+
+class ChunkedUploadError(ValueError):
+    """طلب رفع مجزأ غير صالح (جلسة غير موجودة، جزء خارج النطاق، تحقق فاشل ...)"""
+
+
+class UploadConflictError(ChunkedUploadError):
+    """الجلسة قيد الإنهاء أو أُنهيت: لا أجزاء جديدة ولا complete ثانٍ"""
+
+
+class ChunkedUploadStore:
+    """جلسات الرفع المجزأ محفوظة على القرص المحلي (ملف بيانات + manifest.json لكل جلسة)"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.environ.get(
+            "CHUNKED_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "finclick_chunked_uploads")
+        )
+        self.default_chunk_size = int(os.environ.get("CHUNKED_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+        self.max_chunk_size = 64 * 1024 * 1024
+        self.max_upload_bytes = int(os.environ.get("CHUNKED_UPLOAD_MAX_MB", "1024")) * 1024 * 1024
+        self.session_ttl = timedelta(hours=int(os.environ.get("CHUNKED_UPLOAD_TTL_HOURS", "24")))
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _session_dir(self, upload_id: str) -> str:
+        # المعرف يُولّد بـ uuid4؛ أي قيمة أخرى قد تكون محاولة للخروج من المجلد
+        try:
+            upload_id = uuid.UUID(upload_id).hex
+        except (ValueError, AttributeError, TypeError):
+            raise ChunkedUploadError("Unknown upload session")
+        return os.path.join(self.directory, upload_id)
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self._session_dir(upload_id), "data")
+
+    def _read_manifest(self, upload_id: str) -> Dict[str, Any]:
+        path = os.path.join(self._session_dir(upload_id), "manifest.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise ChunkedUploadError("Unknown upload session")
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        # كتابة ذرية حتى لا يفسد manifest عند توقف الخادم أثناء الكتابة
+        session_dir = self._session_dir(manifest["upload_id"])
+        fd, temp_path = tempfile.mkstemp(dir=session_dir, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(session_dir, "manifest.json"))
+
+    def get_session(self, upload_id: str, user_email: Optional[str] = None) -> Dict[str, Any]:
+        """حالة الجلسة مع التحقق من ملكيتها"""
+
+        manifest = self._read_manifest(upload_id)
+        if user_email is not None and manifest["user_email"] != user_email:
+            raise ChunkedUploadError("Unknown upload session")
+        return manifest
+
+    async def init_upload(self, user_email: str, filename: str, total_size: int, company_name: str,
+                          chunk_size: Optional[int] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """إنشاء جلسة رفع جديدة"""
+
+        if total_size <= 0:
+            raise ChunkedUploadError("total_size must be positive")
+        if total_size > self.max_upload_bytes:
+            raise UploadTooLargeError(f"{filename} exceeds the upload size limit of {self.max_upload_bytes} bytes")
+
+        chunk_size = chunk_size or self.default_chunk_size
+        if not 0 < chunk_size <= self.max_chunk_size:
+            raise ChunkedUploadError(f"chunk_size must be between 1 and {self.max_chunk_size} bytes")
+
+        self.purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._session_dir(upload_id))
+        with open(self._data_path(upload_id), "wb") as f:
+            f.truncate(total_size)
+
+        now = datetime.utcnow().isoformat()
+        manifest = {
+            "upload_id": upload_id,
+            "user_email": user_email,
+            "filename": os.path.basename(filename),
+            "company_name": company_name,
+            "total_size": total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": (total_size + chunk_size - 1) // chunk_size,
+            "sha256": sha256.lower() if sha256 else None,
+            "received": {},
+            "state": "uploading",
+            "created_at": now,
+            "updated_at": now
+        }
+        self._write_manifest(manifest)
+        return self.describe(manifest)
+
+    async def append_chunk(self, upload_id: str, user_email: str, index: int, data: bytes,
+                           checksum: str) -> Dict[str, Any]:
+        """كتابة جزء في موضعه بعد التحقق من SHA-256؛ إعادة إرسال جزء مستلم مسموحة"""
+
+        manifest = self.get_session(upload_id, user_email)
+        if not 0 <= index < manifest["total_chunks"]:
+            raise ChunkedUploadError(f"Chunk index {index} is out of range")
+
+        offset = index * manifest["chunk_size"]
+        expected_size = min(manifest["chunk_size"], manifest["total_size"] - offset)
+        if len(data) != expected_size:
+            raise ChunkedUploadError(f"Chunk {index} must be {expected_size} bytes, got {len(data)}")
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest != (checksum or "").lower():
+            raise ChunkedUploadError(f"Checksum mismatch for chunk {index}")
+
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(None, self._store_chunk, upload_id, index, offset, data, digest)
+        return self.describe(manifest)
+
+    @contextmanager
+    def _locked(self, upload_id: str, mode: int = fcntl.LOCK_EX) -> Iterator[None]:
+        """قفل ملف للجلسة يشمل كل عمليات الخادم"""
+
+        lock_path = os.path.join(self._session_dir(upload_id), "manifest.lock")
+        try:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        except FileNotFoundError:
+            raise ChunkedUploadError("Unknown upload session")
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _check_open(manifest: Dict[str, Any]) -> None:
+        state = manifest.get("state", "uploading")
+        if state != "uploading":
+            raise UploadConflictError(f"Upload is already {state}")
+
+    def _store_chunk(self, upload_id: str, index: int, offset: int, data: bytes, digest: str) -> Dict[str, Any]:
+        """كتابة الجزء تحت قفل مشترك (الأجزاء تُكتب بالتوازي) ثم إضافته إلى manifest تحت قفل حصري"""
+
+        # complete يأخذ القفل الحصري قبل تعليم الجلسة، فلا يُنقل الملف أثناء كتابة جزء فيه
+        with self._locked(upload_id, fcntl.LOCK_SH):
+            self._check_open(self._read_manifest(upload_id))
+            self._write_at(self._data_path(upload_id), offset, data)
+
+        with self._locked(upload_id):
+            manifest = self._read_manifest(upload_id)
+            self._check_open(manifest)
+            manifest["received"][str(index)] = digest
+            manifest["updated_at"] = datetime.utcnow().isoformat()
+            self._write_manifest(manifest)
+            return manifest
+
+    def _begin_complete(self, upload_id: str, user_email: str) -> Dict[str, Any]:
+        """تعليم الجلسة completing تحت القفل الحصري بعد التحقق من اكتمال الأجزاء"""
+
+        with self._locked(upload_id):
+            manifest = self.get_session(upload_id, user_email)
+            self._check_open(manifest)
+            missing = self.describe(manifest)["missing_chunks"]
+            if missing:
+                raise ChunkedUploadError(f"Upload is incomplete: {len(missing)} chunks missing")
+            return self._set_state(manifest, "completing")
+
+    def _finish_complete(self, upload_id: str, state: str) -> None:
+        with self._locked(upload_id):
+            self._set_state(self._read_manifest(upload_id), state)
+
+    def _set_state(self, manifest: Dict[str, Any], state: str) -> Dict[str, Any]:
+        manifest["state"] = state
+        manifest["updated_at"] = datetime.utcnow().isoformat()
+        self._write_manifest(manifest)
+        return manifest
+
+    @staticmethod
+    def _write_at(path: str, offset: int, data: bytes) -> None:
+        fd = os.open(path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, data, offset)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _contiguous_bytes(manifest: Dict[str, Any]) -> int:
+        """عدد البايتات المتصلة المستلمة من بداية الملف"""
+
+        index = 0
+        while str(index) in manifest["received"]:
+            index += 1
+        return min(index * manifest["chunk_size"], manifest["total_size"])
+
+    def describe(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """ملخص الجلسة للعميل: ما تم استلامه وما ينقص"""
+
+        received = sorted(int(index) for index in manifest["received"])
+        received_set = set(received)
+        return {
+            "upload_id": manifest["upload_id"],
+            "filename": manifest["filename"],
+            "company_name": manifest["company_name"],
+            "total_size": manifest["total_size"],
+            "chunk_size": manifest["chunk_size"],
+            "total_chunks": manifest["total_chunks"],
+            "received_chunks": received,
+            "missing_chunks": [i for i in range(manifest["total_chunks"]) if i not in received_set],
+            "contiguous_bytes": self._contiguous_bytes(manifest),
+            "state": manifest.get("state", "uploading")
+        }
+
+    async def complete_upload(self, upload_id: str, user_email: str) -> Tuple[Dict[str, Any], UploadBuffer]:
+        """التحقق من اكتمال الملف وإرجاعه كمخزن رفع؛ complete ثانٍ يُرفض بـ UploadConflictError"""
+
+        loop = asyncio.get_running_loop()
+        manifest = await loop.run_in_executor(None, self._begin_complete, upload_id, user_email)
+
+        data_path = self._data_path(upload_id)
+        try:
+            if manifest["sha256"]:
+                digest = await loop.run_in_executor(None, self._file_sha256, data_path)
+                if digest != manifest["sha256"]:
+                    raise ChunkedUploadError("Checksum mismatch for the assembled file")
+
+            # نقل ملف البيانات خارج مجلد الجلسة؛ UploadBuffer يحذفه بعد التحليل
+            fd, path = tempfile.mkstemp(suffix=os.path.splitext(manifest["filename"])[1].lower(),
+                                        dir=os.environ.get("UPLOAD_TMP_DIR"))
+            os.close(fd)
+            shutil.move(data_path, path)
+        except BaseException:
+            # الجلسة تعود قابلة للاستئناف ليُعاد إرسال الأجزاء أو complete
+            await loop.run_in_executor(None, self._finish_complete, upload_id, "uploading")
+            raise
+
+        # manifest يبقى completed حتى تنتهي صلاحيته، فيُرد على التكرار بتعارض لا بجلسة مجهولة
+        await loop.run_in_executor(None, self._finish_complete, upload_id, "completed")
+        return manifest, UploadBuffer(manifest["filename"], path, manifest["total_size"])
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(UploadBuffer.chunk_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def abort_upload(self, upload_id: str, user_email: str) -> None:
+        """إلغاء جلسة رفع وحذف بياناتها"""
+
+        with self._locked(upload_id):
+            if self.get_session(upload_id, user_email).get("state") == "completing":
+                raise UploadConflictError("Upload is already completing")
+            self._discard(upload_id)
+
+    def _discard(self, upload_id: str) -> None:
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """حذف الجلسات التي لم تُحدّث خلال مدة الصلاحية"""
+
+        cutoff = datetime.utcnow() - self.session_ttl
+        purged = 0
+        for upload_id in os.listdir(self.directory):
+            try:
+                manifest = self._read_manifest(upload_id)
+                expired = datetime.fromisoformat(manifest["updated_at"]) < cutoff
+            except ChunkedUploadError:
+                continue
+            except (ValueError, KeyError):
+                expired = True
+            if expired:
+                self._discard(upload_id)
+                purged += 1
+        return purged
+
+
+# Global instance
+chunked_upload_store = ChunkedUploadStore()
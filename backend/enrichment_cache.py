@@ -0,0 +1,207 @@
+"""
+ذاكرة مؤقتة متدرجة لبيانات الإثراء
+Tiered TTL Cache for FinClick.AI
+
+- المستوى الأول: LRU داخل العملية
+- المستوى الثاني: مجموعة MongoDB يتشاركها جميع العمال وتبقى بعد إعادة التشغيل
+- مدة صلاحية لكل قسم: أسعار السوق بالدقائق، المؤشرات الاقتصادية بالأيام، ملفات الشركات بالأسابيع
+- القيمة المنتهية تُعاد فوراً بينما تُحدّث في الخلفية (stale-while-revalidate)، ويُبلغ عن عمرها
+- جلب واحد لكل مفتاح مهما كان عدد الطلبات المتزامنة (single-flight)
+"""
+
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from single_flight import SingleFlight
+from write_behind import write_queue
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+
+def _bson_safe(value: Any) -> Any:
+    """أنواع numpy وغيرها إلى أنواع JSON أساسية قبل الحفظ في MongoDB"""
+
+    return json.loads(json.dumps(value, default=lambda o: o.item() if hasattr(o, "item") else str(o)))
+
+
+class TieredTTLCache:
+    """LRU داخل العملية مدعوم بـ MongoDB مع مدة صلاحية لكل مفتاح وتحديث في الخلفية"""
+
+    def __init__(self, collection_name: str, max_entries: int = 2048, max_stale_factor: float = 24.0):
+        self.collection_name = collection_name
+        self.max_entries = max_entries
+        # القيمة الأقدم من مدة الصلاحية × هذا المعامل لا تُعاد إلا إذا فشل الجلب
+        self.max_stale_factor = max_stale_factor
+        self.database = None
+
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._refreshing = set()
+        self.stats = {"fresh": 0, "stale": 0, "miss": 0, "stale_fallback": 0, "refresh_failed": 0}
+
+    def bind(self, database) -> None:
+        self.database = database
+
+    def _remember(self, key: str, value: Any, fetched_at: float) -> None:
+        self._entries[key] = (value, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def _lookup(self, key: str) -> Optional[Tuple[Any, float]]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.database is None:
+            return None
+        try:
+            document = await self.database[self.collection_name].find_one({"_id": key})
+        except Exception as e:
+            logging.warning(f"Cache lookup failed for {key}: {e}")
+            return None
+        if document is None:
+            return None
+
+        self._remember(key, document["value"], document["fetched_at"])
+        return document["value"], document["fetched_at"]
+
+    async def _store(self, key: str, value: Any) -> None:
+        fetched_at = time.time()
+        self._remember(key, value, fetched_at)
+        if self.database is not None:
+            await write_queue.update(
+                self.collection_name,
+                {"_id": key},
+                {"$set": {"value": _bson_safe(value), "fetched_at": fetched_at}},
+                upsert=True
+            )
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """الجلب والحفظ مرة واحدة لكل مفتاح؛ الطلبات المتزامنة تنتظر نفس الجلب"""
+
+        async def fetch_and_store():
+            value = await fetch()
+            await self._store(key, value)
+            return value
+
+        return await self._flights.do(key, fetch_and_store)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> None:
+        if self._flights.in_flight(key):
+            return
+
+        async def refresh():
+            try:
+                await self._fetch_and_store(key, fetch)
+            except Exception as e:
+                self.stats["refresh_failed"] += 1
+                logging.warning(f"Background refresh failed for {key}: {e}")
+
+        # الاحتفاظ بمرجع للمهمة حتى لا تُجمع قبل انتهائها
+        task = asyncio.create_task(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def lookup(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Optional[Tuple[Any, Dict[str, Any]]], Optional[Tuple[Any, float]]]:
+        """المرحلة الأولى من get_or_fetch دون جلب متزامن: ((القيمة، المعلومات) أو None، آخر قيمة معروفة)
+
+        القيمة الحديثة أو المنتهية ضمن الحد تُعاد (والمنتهية تُحدّث في الخلفية بـ fetch)؛ وإلا على المستدعي
+        الجلب ثم استدعاء fetched، أو fallback بآخر قيمة معروفة إذا فشل الجلب.
+        """
+
+        cached = await self._lookup(key)
+        if cached is None:
+            return None, None
+
+        value, fetched_at = cached
+        age = time.time() - fetched_at
+        if age <= ttl:
+            self.stats["fresh"] += 1
+            return (value, {"status": "fresh", "age_seconds": round(age, 1), "ttl_seconds": ttl}), cached
+        if age <= ttl * self.max_stale_factor:
+            self.stats["stale"] += 1
+            self._refresh_in_background(key, fetch)
+            return (value, {"status": "stale", "age_seconds": round(age, 1), "ttl_seconds": ttl}), cached
+        return None, cached
+
+    async def fetched(self, key: str, ttl: float, value: Any) -> Dict[str, Any]:
+        """حفظ قيمة جلبها المستدعي بعد lookup وإرجاع معلوماتها"""
+
+        await self._store(key, value)
+        return self._miss(ttl)
+
+    def _miss(self, ttl: float) -> Dict[str, Any]:
+        self.stats["miss"] += 1
+        return {"status": "miss", "age_seconds": 0.0, "ttl_seconds": ttl}
+
+    def fallback(self, cached: Tuple[Any, float], ttl: float) -> Tuple[Any, Dict[str, Any]]:
+        """آخر قيمة معروفة بعد فشل الجلب"""
+
+        self.stats["stale_fallback"] += 1
+        value, fetched_at = cached
+        return value, {"status": "stale_fallback", "age_seconds": round(time.time() - fetched_at, 1), "ttl_seconds": ttl}
+
+    async def get_or_fetch(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, Dict[str, Any]]:
+        """إرجاع (القيمة، معلومات الذاكرة المؤقتة)
+
+        الحالة: fresh، أو stale (أُعيدت القيمة القديمة وبدأ التحديث في الخلفية)، أو miss (جُلبت الآن)،
+        أو stale_fallback (فشل الجلب فأُعيدت آخر قيمة معروفة). fetch يرفع استثناءً عند الفشل.
+        """
+
+        hit, cached = await self.lookup(key, ttl, fetch)
+        if hit is not None:
+            return hit
+
+        try:
+            value = await self._fetch_and_store(key, fetch)
+        except Exception:
+            if cached is None:
+                raise
+            return self.fallback(cached, ttl)
+
+        return value, self._miss(ttl)
+
+    async def put(self, key: str, value: Any) -> None:
+        """تخزين قيمة جاهزة (من مُحدِّث في الخلفية مثلاً)"""
+
+        await self._store(key, value)
+
+    async def peek(self, key: str, reload_after: float = 0.0) -> Optional[Tuple[Any, float]]:
+        """قراءة دون جلب: (القيمة، عمرها بالثواني) أو None
+
+        عامل آخر قد يكون كتب قيمة أحدث في MongoDB، فتُعاد القراءة منها إذا كانت نسخة L1 أقدم من reload_after.
+        """
+
+        cached = self._entries.get(key)
+        if cached is None or (self.database is not None and time.time() - cached[1] > reload_after):
+            self._entries.pop(key, None)
+            cached = await self._lookup(key) or cached
+        if cached is None:
+            return None
+        value, fetched_at = cached
+        return value, time.time() - fetched_at
+
+    def invalidate(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "refreshing": len(self._refreshing),
+            "single_flight": self._flights.get_stats()
+        }
+
+
+# Global instances
+enrichment_cache = TieredTTLCache("enrichment_cache")
+# بيانات محرك التحليل الثوري (سوق، اقتصاد، أبحاث، مقارنات)؛ يُربط بـ MongoDB عند بدء الخادم
+analysis_data_cache = TieredTTLCache("analysis_data_cache")
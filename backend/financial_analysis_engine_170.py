@@ -4,9 +4,13 @@
 """
 
 import math
+from datetime import date, timedelta
+from functools import cached_property
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 
+from price_store import price_store
+
 
 def safe_divide(numerator: float, denominator: float, default: float = 0.0) -> float:
     """Safe division that handles zero denominators and returns JSON-safe values"""
@@ -107,6 +111,9 @@ class FinancialData:
     # بيانات إضافية
     market_cap: float = 0.0
     stock_price: float = 0.0
+    # رمز السهم وتاريخ القوائم (YYYY-MM-DD) لقراءة الأسعار من مخزن الأسعار المحلي
+    symbol: str = ""
+    price_date: Optional[str] = None
     book_value_per_share: float = 0.0
     tangible_book_value: float = 0.0
     working_capital: float = 0.0
@@ -121,6 +128,23 @@ class FinancialAnalysisEngine:
     
     def __init__(self, data: FinancialData):
         self.data = data
+    
+    @cached_property
+    def share_price(self) -> float:
+        """سعر السهم: الإغلاق في تاريخ القوائم (أو آخر إغلاق) من مخزن الأسعار إن توفر، وإلا السعر المُدخل"""
+        if self.data.symbol:
+            price = price_store.close_on_or_before(self.data.symbol, self.data.price_date)
+            if price:
+                return price
+        return self.data.stock_price
+    
+    @cached_property
+    def share_price_year_ago(self) -> Optional[float]:
+        """سعر الإغلاق قبل سنة من تاريخ القوائم من مخزن الأسعار"""
+        if not self.data.symbol:
+            return None
+        reference = date.fromisoformat(self.data.price_date) if self.data.price_date else date.today()
+        return price_store.close_on_or_before(self.data.symbol, reference - timedelta(days=365))
         
     # =====================================
     # 1. نسب السيولة (15 نوع)
@@ -530,13 +554,13 @@ class FinancialAnalysisEngine:
         """نسبة السعر إلى الأرباح P/E"""
         if self.data.earnings_per_share == 0:
             return float('inf')
-        return self.data.stock_price / self.data.earnings_per_share
+        return self.share_price / self.data.earnings_per_share
     
     def price_to_book_ratio(self) -> float:
         """نسبة السعر إلى القيمة الدفترية P/B"""
         if self.data.book_value_per_share == 0:
             return float('inf')
-        return self.data.stock_price / self.data.book_value_per_share
+        return self.share_price / self.data.book_value_per_share
     
     def price_to_sales_ratio(self) -> float:
         """نسبة السعر إلى المبيعات P/S"""
@@ -545,14 +569,14 @@ class FinancialAnalysisEngine:
         sales_per_share = self.data.revenue / self.data.shares
         if sales_per_share == 0:
             return float('inf')
-        return self.data.stock_price / sales_per_share
+        return self.share_price / sales_per_share
     
     def dividend_yield(self) -> float:
         """عائد توزيعات الأرباح"""
-        if self.data.shares == 0 or self.data.stock_price == 0:
+        if self.data.shares == 0 or self.share_price == 0:
             return 0.0
         dividend_per_share = self.data.dividends_paid / self.data.shares
-        return (dividend_per_share / self.data.stock_price) * 100
+        return (dividend_per_share / self.share_price) * 100
     
     def payout_ratio(self) -> float:
         """نسبة توزيع الأرباح"""
@@ -584,9 +608,9 @@ class FinancialAnalysisEngine:
     
     def earnings_yield(self) -> float:
         """عائد الأرباح"""
-        if self.data.stock_price == 0:
+        if self.share_price == 0:
             return 0.0
-        return (self.data.earnings_per_share / self.data.stock_price) * 100
+        return (self.data.earnings_per_share / self.share_price) * 100
     
     def price_to_cash_flow(self) -> float:
         """نسبة السعر إلى التدفق النقدي"""
@@ -595,7 +619,7 @@ class FinancialAnalysisEngine:
         cash_flow_per_share = self.data.operating_cash_flow / self.data.shares
         if cash_flow_per_share == 0:
             return float('inf')
-        return self.data.stock_price / cash_flow_per_share
+        return self.share_price / cash_flow_per_share
     
     def ev_to_sales(self) -> float:
         """نسبة قيمة المؤسسة إلى المبيعات"""
@@ -621,11 +645,15 @@ class FinancialAnalysisEngine:
     
     def total_shareholder_return(self) -> float:
         """معدل العائد الإجمالي للمساهمين"""
-        if self.data.shares == 0 or self.data.stock_price == 0:
+        if self.data.shares == 0 or self.share_price == 0:
             return 0.0
         dividend_per_share = self.data.dividends_paid / self.data.shares
-        capital_gain = 0  # يحتاج بيانات السعر السابق
-        return ((dividend_per_share + capital_gain) / self.data.stock_price) * 100
+        previous_price = self.share_price_year_ago
+        if not previous_price:
+            # بدون تاريخ أسعار: عائد التوزيعات فقط
+            return (dividend_per_share / self.share_price) * 100
+        capital_gain = self.share_price - previous_price
+        return ((dividend_per_share + capital_gain) / previous_price) * 100
 
     # =============================================
     # 6. التحليل الرأسي والأفقي والمتقدم
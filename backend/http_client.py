@@ -0,0 +1,168 @@
+"""
+عميل HTTP مشترك لجميع مصادر البيانات الخارجية
+Pooled HTTP Client for FinClick.AI
+
+جلسة aiohttp واحدة طوال عمر الخادم يتشاركها جميع الوكلاء وجالبي البيانات:
+- حد للاتصالات الكلي ولكل خادم، مع إبقاء الاتصالات مفتوحة (keep-alive)
+- ذاكرة مؤقتة لنتائج DNS
+- إعادة المحاولة للأخطاء المؤقتة (انقطاع، مهلة، 429، 5xx) بتأخير متزايد عشوائي
+- تُفتح عند بدء الخادم وتُغلق عند إيقافه
+- في وضع التسجيل تُحفظ الاستجابات، وفي وضع الإعادة تُوجَّه الطلبات إلى خادم الإعادة المحلي
+"""
+
+import os
+import json
+import random
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from provider_replay import providers
+
+# حالات تستحق إعادة المحاولة
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# طرق يُعاد إرسالها تلقائياً؛ غيرها (POST مثلاً) قد يُنفذ مرتين على الخادم
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class PooledHTTPClient:
+    """جلسة aiohttp مشتركة مع مجمع اتصالات وإعادة محاولة"""
+
+    def __init__(self):
+        self.limit = int(os.environ.get("HTTP_POOL_LIMIT", "100"))
+        self.limit_per_host = int(os.environ.get("HTTP_POOL_LIMIT_PER_HOST", "10"))
+        self.keepalive_timeout = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "30"))
+        self.dns_cache_ttl = int(os.environ.get("HTTP_DNS_CACHE_SECONDS", "300"))
+        self.timeout = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "10"))
+        self.max_retries = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+        self.backoff_base = float(os.environ.get("HTTP_BACKOFF_SECONDS", "0.25"))
+        self.user_agent = os.environ.get("HTTP_USER_AGENT", "FinClick.AI/1.0")
+
+        self._session = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    async def start(self) -> None:
+        """فتح الجلسة؛ يُستدعى عند بدء الخادم"""
+
+        if self._session is not None and not self._session.closed:
+            return
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": self.user_agent}
+        )
+
+    async def close(self) -> None:
+        """إغلاق الجلسة وجميع اتصالاتها؛ يُستدعى عند إيقاف الخادم"""
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def session(self):
+        """الجلسة المشتركة؛ تُفتح عند أول استخدام خارج الخادم (سكربتات، اختبارات)"""
+
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: حتى لا تعيد الطلبات الفاشلة معاً المحاولة في نفس اللحظة
+        return random.uniform(0, self.backoff_base * 2 ** attempt)
+
+    async def request(self, method: str, url: str, read: str = "text",
+                      retries: Optional[int] = None, idempotent: Optional[bool] = None, **kwargs) -> Tuple[int, Any]:
+        """إرسال طلب وإرجاع (رمز الحالة، المحتوى)
+
+        read: text أو json أو bytes. يُرفع آخر خطأ إذا فشلت كل المحاولات بسبب الاتصال،
+        وتُرجع آخر استجابة إذا بقيت حالتها قابلة لإعادة المحاولة.
+        لا يُعاد إلا GET و HEAD و OPTIONS، أو طلب يعلن المستدعي أنه آمن التكرار (idempotent=True).
+        """
+
+        session = await self.session()
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retries = (self.max_retries if retries is None else retries) if idempotent else 0
+
+        # المزود هو اسم الخادم؛ المعاملات والجسم جزء من بصمة الطلب المسجل
+        provider = urlparse(url).hostname or "http"
+        recorded_request = {
+            "method": method, "url": url,
+            **{name: kwargs[name] for name in ("params", "json", "data") if kwargs.get(name) is not None}
+        }
+        if providers.replaying:
+            url = providers.replay_url(provider, recorded_request)
+            kwargs = {name: value for name, value in kwargs.items() if name not in ("params", "json", "data")}
+
+        for attempt in range(retries + 1):
+            self.stats["requests"] += 1
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES and attempt < retries:
+                        retry_after = response.headers.get("Retry-After", "")
+                        delay = min(float(retry_after), self.timeout) if retry_after.isdigit() else self._backoff(attempt)
+                    elif providers.recording:
+                        raw = await response.read()
+                        providers.record(provider, recorded_request, response.status, raw,
+                                         response.headers.get("Content-Type", "application/octet-stream"))
+                        return response.status, self._decode(raw, read, response.charset)
+                    else:
+                        if read == "json":
+                            body = await response.json(content_type=None)
+                        elif read == "bytes":
+                            body = await response.read()
+                        else:
+                            body = await response.text()
+                        return response.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == retries:
+                    self.stats["failures"] += 1
+                    raise
+                logging.warning(f"HTTP {method} {url} failed (attempt {attempt + 1}), retrying: {e}")
+                delay = self._backoff(attempt)
+
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _decode(raw: bytes, read: str, charset: Optional[str]) -> Any:
+        if read == "bytes":
+            return raw
+        text = raw.decode(charset or "utf-8", errors="replace")
+        if read == "json":
+            return json.loads(text) if text.strip() else None
+        return text
+
+    async def get_text(self, url: str, **kwargs) -> Tuple[int, str]:
+        return await self.request("GET", url, read="text", **kwargs)
+
+    async def get_json(self, url: str, **kwargs) -> Tuple[int, Any]:
+        return await self.request("GET", url, read="json", **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {**self.stats, "open": self._session is not None and not self._session.closed}
+        if stats["open"]:
+            connector = self._session.connector
+            stats["limit"] = connector.limit
+            stats["limit_per_host"] = connector.limit_per_host
+        return stats
+
+
+# Global instance
+http_client = PooledHTTPClient()
@@ -0,0 +1,288 @@
+"""
+فهرس تسميات بنود القوائم المالية
+Arabic/English Line-Item Label Index for FinClick.AI
+
+فهرس واحد مُجمَّع مسبقاً تستخدمه مسارات النصوص والجداول وOCR:
+- تطبيع عربي: حذف التشكيل والتطويل، توحيد الألف والياء والتاء المربوطة، حذف "ال" التعريف
+- مطابقة تامة عبر جدول تجزئة لعبارات الكلمات (لا يعتمد زمنها على عدد التسميات)
+- مطابقة تقريبية لأخطاء OCR: مرشحون من فهرس ثلاثيات الأحرف ثم تقييم بـ rapidfuzz أو difflib
+"""
+
+import re
+import difflib
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # rapidfuzz اختياري؛ difflib يعطي نفس المقياس بسرعة أقل
+    fuzz = None
+
+# الأرقام العربية-الهندية والفارسية وفواصلها إلى مقابلاتها اللاتينية
+ARABIC_DIGITS_TABLE = str.maketrans(
+    '٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹٫٬−',
+    '01234567890123456789.,-'
+)
+
+# توحيد أشكال الحروف العربية وحذف التشكيل والتطويل
+_ARABIC_FOLD_TABLE = {
+    **ARABIC_DIGITS_TABLE,
+    **str.maketrans('أإآٱىؤئة', 'اااايويه'),
+    **{code: None for code in list(range(0x064B, 0x0660)) + [0x0670, 0x0640]}
+}
+
+# الكلمة أي حروف وأرقام متصلة فيها حرف واحد على الأقل ("Tota1" من OCR كلمة لا رقم)
+_TOKEN_PATTERN = re.compile(r'[^\W_]*[^\W\d_][^\W_]*|\(?-?\d[\d,]*(?:\.\d+)?\)?')
+
+# بنود القوائم المالية ومرادفاتها مرتبة حسب الأولوية
+FINANCIAL_LABELS: Dict[str, Dict[str, List[str]]] = {
+    'balance_sheet': {
+        'cash': ['النقد وما في حكمه', 'Cash and Cash Equivalents', 'النقد وما يعادله', 'Cash and Equivalents'],
+        'accounts_receivable': ['الذمم المدينة', 'Accounts Receivable', 'المدينون', 'Trade Receivables'],
+        'inventory': ['المخزون', 'Inventory', 'Inventories'],
+        'current_assets': ['الأصول المتداولة', 'Current Assets', 'الموجودات المتداولة'],
+        'fixed_assets': ['الأصول الثابتة', 'Fixed Assets', 'الممتلكات والمعدات', 'Property, Plant and Equipment',
+                         'الأصول غير المتداولة', 'Non-current Assets'],
+        'total_assets': ['إجمالي الأصول', 'Total Assets', 'مجموع الأصول', 'إجمالي الموجودات'],
+        'current_liabilities': ['الخصوم المتداولة', 'Current Liabilities', 'المطلوبات المتداولة'],
+        'long_term_liabilities': ['الخصوم طويلة الأجل', 'Long-term Liabilities', 'الخصوم غير المتداولة', 'Non-current Liabilities'],
+        'long_term_debt': ['القروض طويلة الأجل', 'Long-term Debt', 'Long-term Loans'],
+        'total_liabilities': ['إجمالي الخصوم', 'Total Liabilities', 'إجمالي المطلوبات', 'مجموع الخصوم'],
+        'share_capital': ['رأس المال', 'Share Capital', 'Paid-up Capital'],
+        'retained_earnings': ['الأرباح المحتجزة', 'Retained Earnings', 'الأرباح المبقاة'],
+        'total_equity': ['حقوق المساهمين', 'Shareholders Equity', 'حقوق الملكية', "Shareholders' Equity", 'Total Equity']
+    },
+    'income_statement': {
+        'revenue': ['الإيرادات', 'Revenue', 'المبيعات', 'Sales', 'صافي المبيعات', 'Net Sales'],
+        'cost_of_goods_sold': ['تكلفة البضاعة المباعة', 'Cost of Goods Sold', 'تكلفة المبيعات', 'Cost of Sales', 'تكلفة الإيرادات', 'Cost of Revenue'],
+        'gross_profit': ['مجمل الربح', 'Gross Profit', 'الربح الإجمالي'],
+        'operating_expenses': ['المصروفات التشغيلية', 'Operating Expenses', 'مصاريف التشغيل'],
+        'operating_profit': ['الربح التشغيلي', 'Operating Profit', 'ربح العمليات', 'Operating Income'],
+        'interest_expense': ['مصروفات الفوائد', 'Interest Expense', 'تكاليف التمويل', 'Finance Costs'],
+        'net_income': ['صافي الربح', 'Net Income', 'الربح الصافي', 'Net Profit']
+    },
+    'cash_flow': {
+        'operating_cash_flow': ['التدفق النقدي التشغيلي', 'Operating Cash Flow', 'صافي النقد من الأنشطة التشغيلية',
+                                'Net Cash from Operating Activities', 'العمليات التشغيلية', 'Operating Activities'],
+        'investing_cash_flow': ['التدفق النقدي الاستثماري', 'Investing Cash Flow', 'صافي النقد من الأنشطة الاستثمارية',
+                                'Net Cash from Investing Activities', 'الأنشطة الاستثمارية', 'Investing Activities'],
+        'financing_cash_flow': ['التدفق النقدي التمويلي', 'Financing Cash Flow', 'صافي النقد من الأنشطة التمويلية',
+                                'Net Cash from Financing Activities', 'الأنشطة التمويلية', 'Financing Activities'],
+        'net_cash_flow': ['صافي التدفق النقدي', 'Net Cash Flow', 'صافي التغير في النقد', 'Net Change in Cash']
+    }
+}
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد النص قبل المطابقة: الحروف العربية، الأرقام، حالة الأحرف"""
+
+    return str(text).translate(_ARABIC_FOLD_TABLE).casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    """كلمات وأرقام النص بعد التطبيع، مع حذف "ال" التعريف من الكلمات العربية"""
+
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(normalize_arabic(text)):
+        if token.startswith('ال') and len(token) > 3:
+            token = token[2:]
+        tokens.append(token)
+    return tokens
+
+
+def trigrams(normalized: str) -> Iterator[str]:
+    """ثلاثيات أحرف النص المطبّع مع حدود الكلمة"""
+
+    padded = f' {normalized} '
+    return (padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: str, b: str) -> float:
+    """تشابه نصين بين 0 و 1 (rapidfuzz إن توفرت، وإلا difflib)"""
+
+    if fuzz is not None:
+        return fuzz.ratio(a, b) / 100.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _parse_number(token: str) -> Optional[float]:
+    negative = token.startswith('(') and token.endswith(')')
+    try:
+        value = float(token.strip('()').replace(',', ''))
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def _is_number(token: str) -> bool:
+    return token[0].isdigit() or token[0] in '(-'
+
+
+class LabelIndex:
+    """فهرس تسميات مُجمَّع مسبقاً مع مطابقة تامة وتقريبية"""
+
+    def __init__(self, labels: Dict[str, Dict[str, List[str]]] = FINANCIAL_LABELS,
+                 min_similarity: float = 0.85, cache_size: int = 8192):
+        self.labels = labels
+        self.min_similarity = min_similarity
+
+        # (statement_type, field, rank, normalized label)
+        self._entries: List[Tuple[str, str, int, str]] = []
+        self._phrases: Dict[Tuple[str, ...], int] = {}
+        self._trigrams: Dict[str, List[int]] = {}
+        self._max_tokens = 1
+
+        for statement_type, fields in labels.items():
+            for field, synonyms in fields.items():
+                for rank, synonym in enumerate(synonyms):
+                    tokens = tuple(tokenize(synonym))
+                    if not tokens or tokens in self._phrases:
+                        continue  # المرادف المكرر بعد التطبيع يتبع أول بند سُجل له
+                    entry_id = len(self._entries)
+                    normalized = ' '.join(tokens)
+                    self._entries.append((statement_type, field, rank, normalized))
+                    self._phrases[tokens] = entry_id
+                    self._max_tokens = max(self._max_tokens, len(tokens))
+                    for trigram in set(trigrams(normalized)):
+                        self._trigrams.setdefault(trigram, []).append(entry_id)
+
+        self._resolve_cached = lru_cache(maxsize=cache_size)(self._resolve)
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    @property
+    def fuzzy_backend(self) -> str:
+        return 'rapidfuzz' if fuzz is not None else 'difflib'
+
+    def _scan(self, tokens: List[str]) -> Iterator[Tuple[int, int, int]]:
+        """أطول عبارة مطابقة عند كل موضع: (البداية، النهاية، رقم المدخل)"""
+
+        position = 0
+        while position < len(tokens):
+            for length in range(min(self._max_tokens, len(tokens) - position), 0, -1):
+                entry_id = self._phrases.get(tuple(tokens[position:position + length]))
+                if entry_id is not None:
+                    yield position, position + length, entry_id
+                    position += length
+                    break
+            else:
+                position += 1
+
+    def _fuzzy(self, normalized: str, max_candidates: int = 5) -> Optional[Tuple[int, float]]:
+        """(أقرب تسمية من مرشحي فهرس الثلاثيات، درجة تشابهها) إن تجاوز التشابه الحد الأدنى"""
+
+        if len(normalized) < 4 or not any(c.isalpha() for c in normalized):
+            return None
+
+        shared = Counter()
+        for trigram in set(trigrams(normalized)):
+            shared.update(self._trigrams.get(trigram, ()))
+
+        best_id, best_score = None, self.min_similarity
+        for entry_id, _ in shared.most_common(max_candidates):
+            score = similarity(normalized, self._entries[entry_id][3])
+            if score >= best_score:
+                best_id, best_score = entry_id, score
+        return None if best_id is None else (best_id, best_score)
+
+    def _resolve(self, label: str) -> Optional[Tuple[int, float]]:
+        tokens = [token for token in tokenize(label) if not _is_number(token)]
+        if not tokens:
+            return None
+
+        exact = self._phrases.get(tuple(tokens))
+        if exact is not None:
+            return exact, 1.0
+
+        # أطول تسمية ضمن الخلية ("Total current assets" ← current assets)؛ الدرجة حسب نسبة الكلمات المطابقة
+        matches = list(self._scan(tokens))
+        if matches:
+            start, end, entry_id = max(matches, key=lambda m: m[1] - m[0])
+            return entry_id, 0.7 + 0.3 * (end - start) / len(tokens)
+
+        return self._fuzzy(' '.join(tokens))
+
+    def resolve_scored(self, label: str) -> Optional[Tuple[Tuple[str, str], float]]:
+        """(البند، درجة المطابقة 0-1) لتسمية خلية أو سطر: 1 للتامة، وأقل للجزئية والتقريبية"""
+
+        resolved = self._resolve_cached(str(label))
+        if resolved is None:
+            return None
+        entry_id, score = resolved
+        return self._entries[entry_id][:2], score
+
+    def resolve(self, label: str) -> Optional[Tuple[str, str]]:
+        """البند (القائمة، الحقل) لتسمية خلية أو سطر، أو None"""
+
+        resolved = self.resolve_scored(label)
+        return None if resolved is None else resolved[0]
+
+    def resolve_many(self, labels: Iterable[str]) -> List[Optional[Tuple[str, str]]]:
+        """تصنيف عمود تسميات كامل؛ التسميات المتكررة تُحل مرة واحدة"""
+
+        return [self.resolve(label) for label in labels]
+
+    def resolve_many_scored(self, labels: Iterable[str]) -> List[Optional[Tuple[Tuple[str, str], float]]]:
+        return [self.resolve_scored(label) for label in labels]
+
+    def find_values(self, text: str, fuzzy: bool = True) -> Dict[Tuple[str, str], float]:
+        """كل تسمية في النص يليها رقم مباشرة، مع أول ظهور لأعلى مرادف أولوية لكل بند"""
+
+        return {key: value for key, (value, _) in self.find_scored_values(text, fuzzy).items()}
+
+    def find_scored_values(self, text: str, fuzzy: bool = True) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """مثل find_values مع درجة مطابقة التسمية لكل بند: (القيمة، الدرجة)
+
+        عند تفعيل fuzzy تُطابق الكلمات السابقة لرقم غير مسبوق بتسمية تامة تقريبياً (أخطاء OCR)،
+        ودرجتها هي التشابه.
+        """
+
+        tokens = tokenize(text)
+        best: Dict[Tuple[str, str], Tuple[int, float, float]] = {}
+        matched_until = 0
+
+        def record(entry_id: int, rank_offset: int, value_index: int, score: float = 1.0) -> None:
+            statement_type, field, rank, _ = self._entries[entry_id]
+            value = _parse_number(tokens[value_index])
+            key = (statement_type, field)
+            rank += rank_offset
+            if value and (key not in best or rank < best[key][0]):
+                best[key] = (rank, value, score)
+
+        exact_ends = {}
+        for start, end, entry_id in self._scan(tokens):
+            exact_ends[end] = entry_id
+
+        for index, token in enumerate(tokens):
+            if not _is_number(token):
+                continue
+            if index in exact_ends:
+                record(exact_ends[index], 0, index)
+                matched_until = index + 1
+                continue
+            if not fuzzy:
+                continue
+
+            # أطول نافذة كلمات قبل الرقم تطابق تسمية تقريبياً
+            window_start = max(matched_until, index - self._max_tokens)
+            words = tokens[window_start:index]
+            if not words or any(_is_number(word) for word in words[-1:]):
+                continue
+            for offset in range(len(words)):
+                if any(_is_number(word) for word in words[offset:]):
+                    continue
+                match = self._fuzzy(' '.join(words[offset:]))
+                if match is not None:
+                    # المطابقة التقريبية أقل أولوية من أي مطابقة تامة للبند نفسه
+                    record(match[0], 1000, index, match[1])
+                    break
+            matched_until = index + 1
+
+        return {key: (value, score) for key, (_, value, score) in best.items()}
+
+
+# Global instance
+label_index = LabelIndex()
@@ -0,0 +1,372 @@
+"""
+خدمة بيانات السوق المجمّعة
+Batched Market Data Service for FinClick.AI
+
+- طلبات الرموز المتزامنة تُجمع خلال نافذة قصيرة في تنزيل واحد متعدد الرموز
+- العميل الحاجب (yfinance) يعمل في مجمع خيوط فلا يوقف حلقة الأحداث
+- النتائج تُوحّد في إطار عمودي مضغوط مفهرس بـ (الرمز، التاريخ)
+- backend بديل يقرأ ملفات CSV محلية للاختبار دون اتصال (MARKET_DATA_BACKEND=fixture)
+- في وضعي التسجيل والإعادة (PROVIDER_MODE) تُحفظ الأسعار لكل رمز أو تُقدَّم من خادم الإعادة المحلي
+"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import logging
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from single_flight import SingleFlight
+from price_store import price_store
+from provider_replay import providers
+
+try:
+    import yfinance as yf
+except ImportError:
+    yf = None
+
+# أعمدة الإطار الموحد
+PRICE_COLUMNS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+_YF_COLUMNS = {
+    "Open": "open", "High": "high", "Low": "low", "Close": "close",
+    "Adj Close": "adj_close", "Volume": "volume"
+}
+
+
+def empty_frame() -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=["symbol", "date"])
+    return pd.DataFrame({column: pd.Series(dtype="float64") for column in PRICE_COLUMNS}, index=index)
+
+
+def _normalize(raw: pd.DataFrame, symbols: List[str]) -> pd.DataFrame:
+    """نتيجة تنزيل yfinance (أعمدة مسطحة لرمز واحد أو متعددة المستويات) إلى إطار (الرمز، التاريخ)"""
+
+    if raw is None or raw.empty:
+        return empty_frame()
+
+    if isinstance(raw.columns, pd.MultiIndex):
+        # مستوى الرموز يختلف حسب group_by وإصدار yfinance
+        level = 1 if set(raw.columns.get_level_values(1)) & set(symbols) else 0
+        per_symbol = {
+            symbol: raw.xs(symbol, axis=1, level=level)
+            for symbol in symbols if symbol in raw.columns.get_level_values(level)
+        }
+    else:
+        per_symbol = {symbols[0]: raw}
+
+    frames = []
+    for symbol, data in per_symbol.items():
+        data = data.rename(columns=_YF_COLUMNS).reindex(columns=PRICE_COLUMNS).rename_axis(columns=None)
+        data = data.dropna(subset=["close"])
+        if data.empty:
+            continue
+        dates = pd.DatetimeIndex(data.index)
+        if dates.tz is not None:
+            dates = dates.tz_localize(None)
+        data.index = pd.MultiIndex.from_arrays([[symbol] * len(data), dates.normalize()], names=["symbol", "date"])
+        frames.append(data.astype("float64"))
+
+    if not frames:
+        return empty_frame()
+    return pd.concat(frames).sort_index()
+
+
+def period_start(last_date: pd.Timestamp, period: str) -> Optional[pd.Timestamp]:
+    """بداية الفترة بصيغة yfinance (5d، 1mo، 1y، max) نسبةً إلى آخر تاريخ"""
+
+    if period == "max":
+        return None
+    for suffix, unit in (("mo", "months"), ("y", "years"), ("d", "days")):
+        if period.endswith(suffix):
+            return last_date - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"Unsupported period: {period}")
+
+
+class YFinanceBackend:
+    """تنزيل متعدد الرموز من Yahoo Finance"""
+
+    name = "yfinance"
+
+    def download(self, symbols: List[str], period: str) -> pd.DataFrame:
+        if yf is None:
+            raise RuntimeError("yfinance is not installed")
+        raw = yf.download(
+            tickers=symbols, period=period, group_by="column",
+            auto_adjust=False, threads=True, progress=False
+        )
+        return _normalize(raw, symbols)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        if yf is None:
+            raise RuntimeError("yfinance is not installed")
+        return yf.Ticker(symbol).info or {}
+
+
+class FixtureBackend:
+    """بيانات محلية: <SYMBOL>.csv بأعمدة date,open,high,low,close,volume و info.json اختياري"""
+
+    name = "fixture"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.directory, f"{symbol}.csv")
+
+    def download(self, symbols: List[str], period: str) -> pd.DataFrame:
+        frames = []
+        for symbol in symbols:
+            if not os.path.exists(self._path(symbol)):
+                continue
+            data = pd.read_csv(self._path(symbol), parse_dates=["date"]).set_index("date").sort_index()
+            if period.endswith("d"):
+                # 5d في yfinance تعني آخر 5 أيام تداول
+                data = data.tail(int(period[:-1]))
+            else:
+                start = period_start(data.index[-1], period)
+                if start is not None:
+                    data = data[data.index > start]
+            frames.append(data)
+        # نفس المسار الذي تمر به نتيجة yfinance
+        raw = pd.concat(frames, axis=1, keys=[s for s in symbols if os.path.exists(self._path(s))]) if frames else None
+        return _normalize(raw, symbols)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        path = os.path.join(self.directory, "info.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get(symbol, {})
+
+
+class RecordingBackend:
+    """تسجيل نتائج backend حقيقي لكل رمز، فلا تعتمد الإعادة على طريقة تجميع الرموز"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = f"{backend.name}+record"
+
+    def download(self, symbols: List[str], period: str) -> pd.DataFrame:
+        frame = self.backend.download(symbols, period)
+        loaded = set(frame.index.get_level_values("symbol"))
+        for symbol in symbols:
+            # رمز بلا بيانات يُسجَّل كملف فارغ حتى تعيده الإعادة كما هو
+            data = frame.xs(symbol, level="symbol") if symbol in loaded else empty_frame().droplevel("symbol")
+            providers.record("market_data", {"op": "download", "symbol": symbol, "period": period}, 200,
+                             data.to_csv(index_label="date").encode("utf-8"), "text/csv")
+        return frame
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        info = self.backend.info(symbol)
+        providers.record("market_data", {"op": "info", "symbol": symbol}, 200,
+                         json.dumps(info, ensure_ascii=False, default=str).encode("utf-8"), "application/json")
+        return info
+
+
+class ReplayBackend:
+    """أسعار وبيانات مسجلة من خادم الإعادة المحلي؛ الطلبات حاجبة في الخيوط كما مع yfinance"""
+
+    name = "replay"
+
+    def __init__(self, timeout: float = 10.0):
+        self.timeout = timeout
+
+    def _get(self, request: Dict[str, Any]) -> Optional[bytes]:
+        try:
+            with urllib.request.urlopen(providers.replay_url("market_data", request), timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None  # لم يُسجَّل: نفس نتيجة رمز غير موجود
+            raise RuntimeError(f"Replay server returned {e.code}") from e
+
+    def download(self, symbols: List[str], period: str) -> pd.DataFrame:
+        frames = {}
+        for symbol in symbols:
+            body = self._get({"op": "download", "symbol": symbol, "period": period})
+            if body:
+                frames[symbol] = pd.read_csv(io.BytesIO(body), parse_dates=["date"]).set_index("date")
+        raw = pd.concat(frames.values(), axis=1, keys=list(frames)) if frames else None
+        return _normalize(raw, symbols)
+
+    def info(self, symbol: str) -> Dict[str, Any]:
+        body = self._get({"op": "info", "symbol": symbol})
+        return json.loads(body) if body else {}
+
+
+class MarketDataService:
+    """طلبات أسعار مجمّعة غير حاجبة مع إطار عمودي في الذاكرة"""
+
+    def __init__(self, backend=None):
+        if backend is None:
+            if os.environ.get("MARKET_DATA_BACKEND", "yfinance").lower() == "fixture":
+                backend = FixtureBackend(os.environ.get(
+                    "MARKET_DATA_FIXTURES", os.path.join(os.path.dirname(__file__), "fixtures", "market_data")
+                ))
+            else:
+                backend = YFinanceBackend()
+            if providers.recording:
+                backend = RecordingBackend(backend)
+            elif providers.replaying:
+                backend = ReplayBackend()
+        self.backend = backend
+        self.batch_window = float(os.environ.get("MARKET_DATA_BATCH_MS", "25")) / 1000
+        self.ttl = float(os.environ.get("MARKET_DATA_TTL_SECONDS", "60"))
+        # الرموز التي لم يُعد لها التنزيل أي صف (مدرجة خطأً أو موقوفة) تُحفظ كنتيجة فارغة لمدة أقصر
+        self.empty_ttl = float(os.environ.get("MARKET_DATA_EMPTY_TTL_SECONDS", "30"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MARKET_DATA_WORKERS", "4")),
+            thread_name_prefix="market-data"
+        )
+
+        # طلبات تنتظر التنزيل المجمّع القادم لكل فترة: الرمز ← Future
+        self._pending: Dict[str, Dict[str, asyncio.Future]] = {}
+        # الإطار المحمّل لكل فترة ووقت تحميل كل رمز فيه
+        self._frames: Dict[str, pd.DataFrame] = {}
+        self._loaded_at: Dict[tuple, float] = {}
+        self._empty_at: Dict[tuple, float] = {}
+        self._info_flights = SingleFlight()
+        self._flushes = set()
+        self.stats = {"requests": 0, "downloads": 0, "symbols_downloaded": 0, "memory_hits": 0}
+
+    async def _run_blocking(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _fresh(self, symbol: str, period: str) -> bool:
+        now = time.monotonic()
+        loaded_at = self._loaded_at.get((symbol, period))
+        if loaded_at is not None and now - loaded_at <= self.ttl:
+            return True
+        empty_at = self._empty_at.get((symbol, period))
+        return empty_at is not None and now - empty_at <= self.empty_ttl
+
+    async def history(self, symbols: List[str], period: str = "1y") -> pd.DataFrame:
+        """أسعار الرموز للفترة كإطار مفهرس بـ (الرمز، التاريخ)
+
+        الرموز غير الموجودة في الذاكرة تنضم إلى التنزيل المجمّع القادم، فتصبح كل
+        الطلبات المتزامنة (من وكلاء أو مستخدمين مختلفين) تنزيلاً واحداً.
+        """
+
+        self.stats["requests"] += 1
+        symbols = list(dict.fromkeys(symbols))
+        missing = [symbol for symbol in symbols if not self._fresh(symbol, period)]
+
+        if missing:
+            # shield: إلغاء أحد المنتظرين لا يلغي نتيجة التنزيل المشتركة
+            await asyncio.gather(*(asyncio.shield(self._enqueue(symbol, period)) for symbol in missing))
+        else:
+            self.stats["memory_hits"] += 1
+
+        frame = self._frames.get(period)
+        if frame is None or frame.empty:
+            return empty_frame()
+        return frame[frame.index.get_level_values("symbol").isin(symbols)]
+
+    def _enqueue(self, symbol: str, period: str) -> asyncio.Future:
+        pending = self._pending.get(period)
+        if pending is None:
+            pending = self._pending[period] = {}
+            asyncio.get_running_loop().call_later(self.batch_window, self._start_flush, period)
+        if symbol not in pending:
+            pending[symbol] = asyncio.get_running_loop().create_future()
+        return pending[symbol]
+
+    def _start_flush(self, period: str) -> None:
+        # الاحتفاظ بمرجع للمهمة حتى لا تُجمع قبل انتهائها
+        task = asyncio.ensure_future(self._flush(period))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, period: str) -> None:
+        pending = self._pending.pop(period, {})
+        if not pending:
+            return
+
+        symbols = list(pending)
+        downloaded = True
+        try:
+            frame = await self._run_blocking(self.backend.download, symbols, period)
+        except Exception as e:
+            logging.warning(f"Market data download failed for {len(symbols)} symbols: {e}")
+            frame = empty_frame()
+            downloaded = False
+
+        self.stats["downloads"] += 1
+        self.stats["symbols_downloaded"] += len(symbols)
+        self._merge(frame, symbols, period)
+        if downloaded:
+            # فشل التنزيل لا يعني أن الرموز بلا بيانات، فلا يُحفظ كنتيجة فارغة
+            self._mark_empty(frame, symbols, period)
+
+        # كل تنزيل يُضاف إلى مخزن الأسعار المحلي الذي تعتمد عليه نسب السوق ومقاييس المخاطر
+        if not frame.empty:
+            try:
+                await self._run_blocking(price_store.append_frame, frame)
+            except Exception as e:
+                logging.warning(f"Price store append failed: {e}")
+
+        for future in pending.values():
+            if not future.done():
+                future.set_result(None)
+
+    def _merge(self, frame: pd.DataFrame, symbols: List[str], period: str) -> None:
+        """استبدال بيانات الرموز المنزّلة في إطار الفترة"""
+
+        existing = self._frames.get(period)
+        if existing is not None and not existing.empty:
+            existing = existing[~existing.index.get_level_values("symbol").isin(symbols)]
+            frame = pd.concat([existing, frame]).sort_index()
+        self._frames[period] = frame
+
+        now = time.monotonic()
+        for symbol in frame.index.get_level_values("symbol").unique():
+            self._loaded_at[(symbol, period)] = now
+
+    def _mark_empty(self, frame: pd.DataFrame, symbols: List[str], period: str) -> None:
+        """تسجيل الرموز التي لم يُعد لها التنزيل أي صف حتى لا تُنزّل في كل نافذة تجميع"""
+
+        loaded = set(frame.index.get_level_values("symbol")) if not frame.empty else set()
+        now = time.monotonic()
+        for symbol in symbols:
+            if symbol in loaded:
+                self._empty_at.pop((symbol, period), None)
+            else:
+                self._empty_at[(symbol, period)] = now
+
+    async def info(self, symbol: str) -> Dict[str, Any]:
+        """بيانات الشركة (القيمة السوقية، مكرر الربحية...) في خيط؛ طلب واحد لكل رمز قيد التنفيذ"""
+
+        return await self._info_flights.do(symbol, lambda: self._run_blocking(self.backend.info, symbol))
+
+    @staticmethod
+    def latest_changes(frame: pd.DataFrame) -> pd.DataFrame:
+        """آخر سعر إغلاق والتغير عن الإغلاق السابق لكل رمز"""
+
+        if frame.empty:
+            return pd.DataFrame(columns=["current_value", "change", "change_percent"])
+        closes = frame["close"]
+        last = closes.groupby(level="symbol").last()
+        # الإغلاق السابق لآخر صف في كل رمز؛ الرمز ذو الصف الواحد يُقارن بنفسه
+        previous = closes.groupby(level="symbol").shift(1).groupby(level="symbol").last()
+        previous = previous.reindex(last.index).fillna(last)
+        change_percent = ((last - previous) / previous.where(previous != 0) * 100).fillna(0.0)
+        return pd.DataFrame({"current_value": last, "change": last - previous, "change_percent": change_percent})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "backend": self.backend.name,
+            "rows_in_memory": sum(len(frame) for frame in self._frames.values()),
+            "empty_symbols": len(self._empty_at)
+        }
+
+
+# Global instance
+market_data = MarketDataService()
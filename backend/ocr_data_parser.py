@@ -7,19 +7,19 @@ OCR and Data Parsing Engine for FinClick.AI
 - Excel financial files  
 - Word documents
 - Images (JPG, PNG)
+- ZIP / TAR archives (one folder per company)
 - Automatic table extraction
 - Smart financial data recognition
 """
 
-import io
 import os
 import re
+import asyncio
 import json
 import cv2
 import numpy as np
 import pandas as pd
-from PIL import Image
-import pytesseract
+from PIL import Image, ImageOps
 import PyPDF2
 import pdfplumber
 import tabula
@@ -28,94 +28,270 @@ from openpyxl import load_workbook
 from docx import Document
 from bs4 import BeautifulSoup
 from typing import Dict, List, Any, Optional, Tuple
-import requests
 from datetime import datetime
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from ocr_engine import ocr_engine, NUMERIC_WHITELIST
+from upload_buffer import UploadBuffer, archive_path_parts, is_archive, iter_archive_members, shared_archive_root
+from label_index import label_index, ARABIC_DIGITS_TABLE
+
+
+class FieldResolutionTracker:
+    """تتبع البنود المحسومة أثناء قراءة الملف لإيقاف المسح عند اكتمالها
+
+    ثقة كل بند = درجة مطابقة تسميته (1 للتامة، التشابه للتقريبية) × موثوقية مصدر القراءة،
+    فالبند المقروء بمطابقة تقريبية من OCR لا يوقف المسح بينما يوقفه بند مطابق تماماً.
+    """
+    
+    def __init__(self, required_fields: List[Tuple[str, str]], threshold: float = 0.7, full_scan: bool = False):
+        self.required_fields = list(required_fields)
+        self.threshold = threshold
+        self.full_scan = full_scan
+        self.confidence: Dict[Tuple[str, str], float] = {}
+        # درجة مطابقة تسمية القيمة المعتمدة لكل بند، تملؤها دوال الاستخراج
+        self.field_scores: Dict[Tuple[str, str], float] = {}
+    
+    def record(self, reliability: float) -> None:
+        """تحديث ثقة البنود المطلوبة من درجات مطابقتها وموثوقية المصدر الحالي"""
+        
+        for key in self.required_fields:
+            if key in self.field_scores:
+                self.confidence[key] = max(self.confidence.get(key, 0.0), self.field_scores[key] * reliability)
+    
+    @property
+    def resolved(self) -> bool:
+        """هل حُسمت جميع البنود المطلوبة بثقة أعلى من الحد؟"""
+        
+        if self.full_scan:
+            return False
+        return all(self.confidence.get(field, 0.0) >= self.threshold for field in self.required_fields)
+    
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "required_fields": len(self.required_fields),
+            "resolved_fields": sum(1 for field in self.required_fields if self.confidence.get(field, 0.0) >= self.threshold),
+            "field_confidence": {f"{statement_type}.{field}": round(self.confidence[(statement_type, field)], 3)
+                                 for statement_type, field in self.required_fields
+                                 if (statement_type, field) in self.confidence},
+            "full_scan": self.full_scan
+        }
 
 class FinancialDataParser:
     """محرك استخراج وتحليل البيانات المالية الذكي"""
     
     def __init__(self):
         self.supported_formats = ['.pdf', '.xlsx', '.xls', '.docx', '.doc', '.jpg', '.jpeg', '.png']
-        self.financial_keywords = {
-            'ar': [
-                'الأصول المتداولة', 'الأصول الثابتة', 'إجمالي الأصول',
-                'الخصوم المتداولة', 'الخصوم طويلة الأجل', 'إجمالي الخصوم',
-                'رأس المال', 'الأرباح المحتجزة', 'حقوق المساهمين',
-                'الإيرادات', 'المبيعات', 'تكلفة البضاعة المباعة',
-                'مجمل الربح', 'الربح التشغيلي', 'صافي الربح',
-                'التدفق النقدي', 'العمليات التشغيلية', 'الأنشطة الاستثمارية'
-            ],
-            'en': [
-                'Current Assets', 'Fixed Assets', 'Total Assets',
-                'Current Liabilities', 'Long-term Liabilities', 'Total Liabilities', 
-                'Share Capital', 'Retained Earnings', 'Shareholders Equity',
-                'Revenue', 'Sales', 'Cost of Goods Sold',
-                'Gross Profit', 'Operating Profit', 'Net Income',
-                'Cash Flow', 'Operating Activities', 'Investing Activities'
-            ]
+        
+        # Configure tesseract for better Arabic OCR (--oem 3 --psm 6 -l ara+eng)
+        self.ocr_language = 'ara+eng'
+        self.ocr_psm = 6
+        
+        # OCR خلايا الجداول: الخلايا الرقمية بقائمة أحرف محددة، وعدد الخلايا المعالجة بالتوازي
+        # (حد عمليات tesseract الفعلي هو مجمع ocr_engine المشترك بين كل الملفات)
+        self.ocr_numeric_whitelist = NUMERIC_WHITELIST
+        self.ocr_cell_concurrency = ocr_engine.workers
+        
+        # توجيه كل كتلة نصية إلى نموذج ara أو eng أو أرقام فقط بدلاً من ara+eng؛ مع pytesseract
+        # يمرَّر المسار كمعاملي lang و config لكن كل كتلة عملية tesseract جديدة
+        self.ocr_language_routing = os.environ.get('OCR_LANGUAGE_ROUTING', '1') != '0'
+        if not self.ocr_language_routing:
+            logging.info("OCR language routing disabled (OCR_LANGUAGE_ROUTING=0); using ara+eng for every block")
+        elif ocr_engine.backend_name != 'tesserocr':
+            logging.info("OCR language routing runs on pytesseract: one tesseract process per block")
+        
+        # تطبيع الصور قبل OCR: الدقة المستهدفة، أقصى بعد، وحد عدد البكسلات (حماية من الصور المفخخة)
+        self.ocr_target_dpi = 300
+        self.ocr_max_dimension = 3500
+        self.max_image_pixels = 60_000_000
+        
+        # حد حجم الملف المرفوع، يُفرض أثناء القراءة على دفعات
+        self.max_upload_bytes = int(os.environ.get('MAX_UPLOAD_SIZE_MB', '200')) * 1024 * 1024
+        
+        # الأرشيفات: حد عدد الملفات والحجم الإجمالي بعد فك الضغط
+        self.archive_max_members = int(os.environ.get('ARCHIVE_MAX_MEMBERS', '500'))
+        self.archive_max_total_bytes = int(os.environ.get('ARCHIVE_MAX_TOTAL_MB', '1024')) * 1024 * 1024
+        
+        # مجمع المحللين: كل ملف يُحلل في خيط مستقل بحلقة أحداث خاصة به
+        self.parser_workers = int(os.environ.get('PARSER_WORKERS', str(min(8, os.cpu_count() or 4))))
+        self._parser_pool = ThreadPoolExecutor(max_workers=self.parser_workers, thread_name_prefix='parser')
+        
+        # فهرس تسميات البنود المشترك بين مسارات النصوص والجداول وOCR
+        self.label_index = label_index
+        
+        # البنود الأساسية التي يتوقف المسح عند حسمها بثقة أعلى من الحد (ما لم يُطلب مسح كامل)
+        self.required_fields = [
+            ('balance_sheet', 'total_assets'),
+            ('balance_sheet', 'current_assets'),
+            ('balance_sheet', 'current_liabilities'),
+            ('balance_sheet', 'total_equity'),
+            ('income_statement', 'revenue'),
+            ('income_statement', 'gross_profit'),
+            ('income_statement', 'net_income'),
+            ('cash_flow', 'operating_cash_flow'),
+            ('cash_flow', 'investing_cash_flow'),
+            ('cash_flow', 'financing_cash_flow')
+        ]
+        self.resolution_confidence_threshold = 0.7
+        # موثوقية كل مصدر قراءة، تُضرب في درجة مطابقة تسمية البند
+        self.source_reliability = {
+            'pdfplumber': 0.9,
+            'pypdf2': 0.8,
+            'excel': 1.0,
+            'ocr_table': 0.85,
+            'ocr_text': 0.75
         }
         
-        # Configure tesseract for better Arabic OCR
-        self.ocr_config = r'--oem 3 --psm 6 -l ara+eng'
+        # القراءة المتدفقة لملفات Excel: حجم الدفعة وحد الخلايا لكل ملف
+        self.excel_chunk_rows = 2000
+        self.excel_max_cells = 5_000_000
         
-    async def process_uploaded_files(self, files: List[Any], company_name: str) -> Dict[str, Any]:
+    async def process_uploaded_files(self, files: List[Any], company_name: str, full_scan: bool = False) -> Dict[str, Any]:
         """معالجة الملفات المرفوعة واستخراج البيانات المالية"""
         
+        warnings: List[str] = []
+        
+        # كل ملف يُرسل إلى مجمع المحللين فور قراءته؛ ملفات الأرشيف تُرسل واحداً تلو الآخر أثناء فك الضغط
+        dispatched: List[Tuple[str, str, asyncio.Task]] = []
+        for file in files:
+            if is_archive(file.filename):
+                dispatched.extend(await self._dispatch_archive(file, company_name, full_scan, warnings))
+            else:
+                task = asyncio.create_task(self._process_single_file(file, full_scan=full_scan))
+                dispatched.append((company_name, file.filename, task))
+        
+        return await self._collect_results(company_name, dispatched, warnings)
+    
+    async def process_assembled_upload(self, upload: UploadBuffer, company_name: str, full_scan: bool = False) -> Dict[str, Any]:
+        """معالجة ملف مكتمل من رفع مجزأ"""
+        
+        task = asyncio.create_task(self._parse_in_pool(upload, full_scan))
+        return await self._collect_results(company_name, [(company_name, upload.filename, task)], [])
+    
+    async def _collect_results(self, company_name: str, dispatched: List[Tuple[str, str, asyncio.Task]],
+                               warnings: List[str]) -> Dict[str, Any]:
+        """انتظار نتائج الملفات بترتيب إرسالها ودمجها إجمالاً ولكل شركة"""
+        
         processing_results = {
             "company_name": company_name,
             "processing_date": datetime.now().isoformat(),
             "files_processed": [],
-            "extracted_data": {
-                "balance_sheet": {},
-                "income_statement": {},
-                "cash_flow": {},
-                "notes": []
-            },
+            "extracted_data": self._empty_extracted_data(),
+            "companies": {},
             "processing_summary": {
-                "total_files": len(files),
+                "total_files": 0,
                 "successful": 0,
                 "failed": 0,
-                "warnings": []
+                "warnings": warnings
             }
         }
         
-        for file in files:
+        for company, filename, task in dispatched:
+            company_results = processing_results["companies"].setdefault(company, {
+                "files_processed": [],
+                "extracted_data": self._empty_extracted_data(),
+                "processing_summary": {"total_files": 0, "successful": 0, "failed": 0}
+            })
+            processing_results["processing_summary"]["total_files"] += 1
+            company_results["processing_summary"]["total_files"] += 1
+            
             try:
-                file_result = await self._process_single_file(file)
+                file_result = await task
+                file_result["company"] = company
                 processing_results["files_processed"].append(file_result)
+                company_results["files_processed"].append(file_result)
                 
                 if file_result["status"] == "success":
                     processing_results["processing_summary"]["successful"] += 1
+                    company_results["processing_summary"]["successful"] += 1
                     # دمج البيانات المستخرجة
                     await self._merge_financial_data(
                         processing_results["extracted_data"], 
                         file_result["extracted_data"]
                     )
+                    await self._merge_financial_data(
+                        company_results["extracted_data"],
+                        file_result["extracted_data"]
+                    )
                 else:
                     processing_results["processing_summary"]["failed"] += 1
+                    company_results["processing_summary"]["failed"] += 1
                     
             except Exception as e:
                 processing_results["processing_summary"]["failed"] += 1
-                processing_results["processing_summary"]["warnings"].append(
-                    f"Error processing {file.filename}: {str(e)}"
-                )
+                company_results["processing_summary"]["failed"] += 1
+                warnings.append(f"Error processing {filename}: {str(e)}")
         
         # تنظيف وتحسين البيانات المستخرجة
         await self._clean_and_enhance_data(processing_results["extracted_data"])
+        for company_results in processing_results["companies"].values():
+            await self._clean_and_enhance_data(company_results["extracted_data"])
         
         return processing_results
     
-    async def _process_single_file(self, file) -> Dict[str, Any]:
-        """معالجة ملف واحد"""
+    @staticmethod
+    def _empty_extracted_data() -> Dict[str, Any]:
+        return {
+            "balance_sheet": {},
+            "income_statement": {},
+            "cash_flow": {},
+            "notes": []
+        }
+    
+    def _is_supported_member(self, member_path: str) -> bool:
+        """ملفات الأرشيف المقبولة: الصيغ المدعومة فقط، بدون أرشيفات متداخلة"""
+        
+        return os.path.splitext(member_path.lower())[1] in self.supported_formats
+    
+    @staticmethod
+    def _company_for_member(member_path: str, default_company: str, shared_root: Optional[str] = None) -> str:
+        """اسم الشركة هو المجلد الأول داخل الأرشيف بعد تخطي الجذر المشترك؛ الملفات في الجذر تتبع الشركة المحددة في الطلب"""
+        
+        parts = archive_path_parts(member_path)
+        if shared_root is not None and parts and parts[0] == shared_root:
+            parts = parts[1:]
+        return parts[0] if len(parts) > 1 else default_company
+    
+    async def _dispatch_archive(self, archive, company_name: str, full_scan: bool,
+                                warnings: List[str]) -> List[Tuple[str, str, asyncio.Task]]:
+        """قراءة ملفات الأرشيف بالتتابع وإرسال كل ملف إلى مجمع المحللين فور اكتمال قراءته
+        
+        التحليل يبدأ أثناء القراءة، أما تجميع الملفات حسب الشركة فيتم بعد معرفة كل المسارات
+        لأن tar المتدفق لا يكشف مسبقاً هل كل الملفات داخل مجلد جذري واحد.
+        """
         
-        file_extension = os.path.splitext(file.filename.lower())[1]
-        file_content = await file.read()
+        members: List[Tuple[str, asyncio.Task]] = []
+        skipped: List[str] = []
         
-        result = {
-            "filename": file.filename,
-            "file_type": file_extension,
-            "file_size": len(file_content),
+        try:
+            async for member_path, upload in iter_archive_members(
+                archive,
+                max_members=self.archive_max_members,
+                max_total_bytes=self.archive_max_total_bytes,
+                max_member_bytes=self.max_upload_bytes,
+                accept=self._is_supported_member,
+                skipped=skipped,
+                max_archive_bytes=self.max_upload_bytes
+            ):
+                task = asyncio.create_task(self._parse_in_pool(upload, full_scan))
+                members.append((member_path, task))
+        except Exception as e:
+            # الملفات المقروءة قبل الخطأ تبقى قيد المعالجة
+            warnings.append(f"Error reading archive {archive.filename}: {str(e)}")
+        
+        for member_path in skipped:
+            warnings.append(f"Skipped unsupported file {archive.filename}/{member_path}")
+        
+        shared_root = shared_archive_root([member_path for member_path, _ in members])
+        return [
+            (self._company_for_member(member_path, company_name, shared_root), f"{archive.filename}/{member_path}", task)
+            for member_path, task in members
+        ]
+    
+    def _new_file_result(self, filename: str) -> Dict[str, Any]:
+        return {
+            "filename": filename,
+            "file_type": os.path.splitext(filename.lower())[1],
+            "file_size": 0,
             "status": "processing",
             "extracted_data": {
                 "balance_sheet": {},
@@ -130,18 +306,48 @@ class FinancialDataParser:
                 "processing_time": 0.0
             }
         }
+    
+    async def _process_single_file(self, file, full_scan: bool = False) -> Dict[str, Any]:
+        """معالجة ملف واحد"""
+        
+        try:
+            # نسخة واحدة على القرص يتشاركها جميع المحللين عبر المسار
+            upload = await UploadBuffer.from_upload(file, self.max_upload_bytes)
+        except Exception as e:
+            result = self._new_file_result(file.filename)
+            result["status"] = "error"
+            result["error"] = str(e)
+            return result
+        
+        return await self._parse_in_pool(upload, full_scan)
+    
+    async def _parse_in_pool(self, upload: UploadBuffer, full_scan: bool = False) -> Dict[str, Any]:
+        """تحليل ملف محفوظ على القرص في مجمع المحللين دون حجب حلقة أحداث الخادم"""
+        
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._parser_pool, lambda: asyncio.run(self._process_buffered_file(upload, full_scan))
+        )
+    
+    async def _process_buffered_file(self, upload: UploadBuffer, full_scan: bool = False) -> Dict[str, Any]:
+        """معالجة ملف محفوظ على القرص ثم حذفه"""
+        
+        result = self._new_file_result(upload.filename)
+        file_extension = result["file_type"]
+        result["file_size"] = upload.size
         
         start_time = datetime.now()
+        tracker = FieldResolutionTracker(self.required_fields, self.resolution_confidence_threshold, full_scan)
         
         try:
             if file_extension == '.pdf':
-                result = await self._process_pdf_file(file_content, result)
+                result = await self._process_pdf_file(upload, result, tracker)
             elif file_extension in ['.xlsx', '.xls']:
-                result = await self._process_excel_file(file_content, result)
+                result = await self._process_excel_file(upload, result, tracker)
             elif file_extension in ['.docx', '.doc']:
-                result = await self._process_word_file(file_content, result)
+                result = await self._process_word_file(upload, result)
             elif file_extension in ['.jpg', '.jpeg', '.png']:
-                result = await self._process_image_file(file_content, result)
+                result = await self._process_image_file(upload, result, tracker)
             else:
                 result["status"] = "error"
                 result["error"] = f"Unsupported file format: {file_extension}"
@@ -149,6 +355,7 @@ class FinancialDataParser:
             # حساب وقت المعالجة
             processing_time = (datetime.now() - start_time).total_seconds()
             result["processing_details"]["processing_time"] = processing_time
+            result["processing_details"]["field_resolution"] = tracker.summary()
             
             if result["status"] != "error":
                 result["status"] = "success"
@@ -156,51 +363,55 @@ class FinancialDataParser:
         except Exception as e:
             result["status"] = "error"
             result["error"] = str(e)
+        finally:
+            upload.close()
             
         return result
     
-    async def _process_pdf_file(self, file_content: bytes, result: Dict) -> Dict:
+    async def _process_pdf_file(self, upload: UploadBuffer, result: Dict, tracker: FieldResolutionTracker) -> Dict:
         """معالجة ملفات PDF مع معالجة محسنة للأخطاء"""
         
         result["processing_details"]["method_used"] = "PDF Processing"
         
         # الطريقة 1: استخدام pdfplumber لاستخراج النصوص والجداول
         try:
-            with pdfplumber.open(io.BytesIO(file_content)) as pdf:
+            with pdfplumber.open(upload.path) as pdf:
                 full_text = ""
                 tables = []
+                pages_scanned = 0
                 
                 for page in pdf.pages:
-                    # استخراج النص
+                    pages_scanned += 1
+                    
                     try:
-                        page_text = page.extract_text()
-                        if page_text:
-                            full_text += page_text + "\n"
+                        page_text, page_tables = self._read_pdf_page(page)
                     except Exception as page_error:
                         logging.warning(f"Error extracting text from page: {page_error}")
                         continue
                     
-                    # استخراج الجداول
-                    try:
-                        page_tables = page.extract_tables()
-                        if page_tables:
-                            for table in page_tables:
-                                if table and len(table) > 1:  # التأكد من وجود بيانات
-                                    tables.append(table)
-                    except Exception as table_error:
-                        logging.warning(f"Error extracting tables from page: {table_error}")
-                        continue
+                    if page_text:
+                        full_text += page_text + "\n"
+                    tables.extend(page_tables)
+                    
+                    # استخراج البنود صفحة بصفحة والتوقف عند حسم جميع البنود المطلوبة
+                    await self._extract_page_data(page_text, page_tables, result["extracted_data"], tracker.field_scores)
+                    tracker.record(self.source_reliability['pdfplumber'])
+                    if tracker.resolved:
+                        break
                 
                 result["extracted_data"]["raw_text"] = full_text
                 result["extracted_data"]["tables"] = tables
                 result["processing_details"]["confidence_score"] = 0.8
+                result["processing_details"]["pages_scanned"] = pages_scanned
+                result["processing_details"]["total_pages"] = len(pdf.pages)
+                result["processing_details"]["stopped_early"] = pages_scanned < len(pdf.pages)
                 
         except Exception as pdfplumber_error:
             logging.warning(f"pdfplumber failed: {pdfplumber_error}")
             
             # الطريقة 2: استخدام PyPDF2 مع معالجة الملفات المشفرة
             try:
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+                pdf_reader = PyPDF2.PdfReader(upload.path)
                 
                 # التحقق من التشفير
                 if pdf_reader.is_encrypted:
@@ -222,7 +433,9 @@ class FinancialDataParser:
                         return result
                 
                 full_text = ""
+                pages_scanned = 0
                 for page in pdf_reader.pages:
+                    pages_scanned += 1
                     try:
                         page_text = page.extract_text()
                         if page_text:
@@ -230,35 +443,35 @@ class FinancialDataParser:
                     except Exception as page_error:
                         logging.warning(f"PyPDF2 page extraction error: {page_error}")
                         continue
+                    
+                    await self._extract_page_data(page_text, [], result["extracted_data"], tracker.field_scores)
+                    tracker.record(self.source_reliability['pypdf2'])
+                    if tracker.resolved:
+                        break
                 
                 result["extracted_data"]["raw_text"] = full_text
                 result["processing_details"]["method_used"] = "PyPDF2 Processing"
                 result["processing_details"]["confidence_score"] = 0.6
+                result["processing_details"]["pages_scanned"] = pages_scanned
+                result["processing_details"]["total_pages"] = len(pdf_reader.pages)
+                result["processing_details"]["stopped_early"] = pages_scanned < len(pdf_reader.pages)
                 
             except Exception as pypdf_error:
                 logging.warning(f"PyPDF2 failed: {pypdf_error}")
                 
                 # الطريقة 3: استخدام camelot كخيار أخير
                 try:
-                    import tempfile
-                    import os
+                    # camelot يقرأ الملف المؤقت للرفع مباشرة دون نسخة إضافية
+                    tables = camelot.read_pdf(upload.path, pages='all', flavor='lattice')
+                    result["extracted_data"]["tables"] = [table.df.values.tolist() for table in tables]
+                    result["processing_details"]["method_used"] = "Camelot PDF Processing"
+                    result["processing_details"]["confidence_score"] = 0.5
                     
-                    # حفظ مؤقت للملف لـ camelot
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                        temp_file.write(file_content)
-                        temp_file_path = temp_file.name
-                    
-                    try:
-                        tables = camelot.read_pdf(temp_file_path, pages='all', flavor='lattice')
-                        result["extracted_data"]["tables"] = [table.df.values.tolist() for table in tables]
-                        result["processing_details"]["method_used"] = "Camelot PDF Processing"
-                        result["processing_details"]["confidence_score"] = 0.5
-                    finally:
-                        # حذف الملف المؤقت
-                        try:
-                            os.unlink(temp_file_path)
-                        except:
-                            pass
+                    # تحليل الجداول
+                    await self._extract_financial_data_from_tables(
+                        result["extracted_data"]["tables"], 
+                        result["extracted_data"]
+                    )
                             
                 except Exception as camelot_error:
                     logging.error(f"All PDF processing methods failed: {camelot_error}")
@@ -266,30 +479,66 @@ class FinancialDataParser:
                     result["error"] = f"Unable to process PDF file. Please ensure it's not corrupted or heavily encrypted."
                     return result
         
-        # تحليل النصوص واستخراج البيانات المالية
-        if result["extracted_data"]["raw_text"]:
-            await self._extract_financial_data_from_text(
-                result["extracted_data"]["raw_text"], 
-                result["extracted_data"]
-            )
+        return result
+    
+    @staticmethod
+    def _read_pdf_page(page) -> Tuple[str, List]:
+        """نص وجداول صفحة pdfplumber؛ فشل الجداول لا يُسقط نص الصفحة"""
         
-        # تحليل الجداول
-        if result["extracted_data"]["tables"]:
-            await self._extract_financial_data_from_tables(
-                result["extracted_data"]["tables"], 
-                result["extracted_data"]
-            )
+        page_text = page.extract_text() or ""
         
-        return result
+        page_tables = []
+        try:
+            for table in page.extract_tables() or []:
+                if table and len(table) > 1:  # التأكد من وجود بيانات
+                    page_tables.append(table)
+        except Exception as table_error:
+            logging.warning(f"Error extracting tables from page: {table_error}")
+        
+        return page_text, page_tables
+    
+    async def _extract_page_data(self, text: str, tables: List[List], extracted_data: Dict,
+                                 field_scores: Optional[Dict[Tuple[str, str], float]] = None) -> None:
+        """استخراج بنود صفحة واحدة؛ البنود المحسومة من صفحات سابقة تبقى كما هي مع درجات مطابقتها"""
+        
+        page_data = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+        page_scores: Dict[Tuple[str, str], float] = {}
+        
+        if text:
+            await self._extract_financial_data_from_text(text, page_data, page_scores)
+        if tables:
+            await self._extract_financial_data_from_tables(tables, page_data, page_scores)
+        
+        self._keep_first_values(page_data, page_scores, extracted_data, field_scores)
     
-    async def _process_excel_file(self, file_content: bytes, result: Dict) -> Dict:
+    @staticmethod
+    def _keep_first_values(source: Dict, source_scores: Dict, extracted_data: Dict,
+                           field_scores: Optional[Dict[Tuple[str, str], float]]) -> None:
+        """إضافة البنود الجديدة فقط مع درجة مطابقة القيمة المعتمدة"""
+        
+        for statement_type, fields in source.items():
+            for field, value in fields.items():
+                if field in extracted_data[statement_type]:
+                    continue
+                extracted_data[statement_type][field] = value
+                if field_scores is not None:
+                    field_scores[(statement_type, field)] = source_scores.get((statement_type, field), 0.0)
+    
+    async def _process_excel_file(self, upload: UploadBuffer, result: Dict, tracker: FieldResolutionTracker) -> Dict:
         """معالجة ملفات Excel"""
         
+        # صيغة xls القديمة لا يدعمها openpyxl
+        if result.get("file_type") == '.xlsx':
+            try:
+                return await self._process_excel_file_streaming(upload, result, tracker)
+            except Exception as stream_error:
+                logging.warning(f"Streaming Excel read failed, falling back to pandas: {stream_error}")
+        
         result["processing_details"]["method_used"] = "Excel Processing"
         
         try:
             # قراءة الملف باستخدام pandas
-            excel_data = pd.read_excel(io.BytesIO(file_content), sheet_name=None)
+            excel_data = pd.read_excel(upload.path, sheet_name=None)
             
             all_text = ""
             tables = []
@@ -316,13 +565,88 @@ class FinancialDataParser:
         
         return result
     
-    async def _process_word_file(self, file_content: bytes, result: Dict) -> Dict:
+    async def _process_excel_file_streaming(self, upload: UploadBuffer, result: Dict, tracker: FieldResolutionTracker) -> Dict:
+        """قراءة Excel صفاً بصف عبر openpyxl بوضع القراءة فقط دون تحميل الأوراق كاملة"""
+        
+        result["processing_details"]["method_used"] = "Excel Streaming Processing"
+        extracted_data = result["extracted_data"]
+        
+        workbook = load_workbook(upload.path, read_only=True, data_only=True)
+        cells_read = 0
+        rows_read = 0
+        sheets_read = []
+        stopped_early = False
+        
+        try:
+            for worksheet in workbook.worksheets:
+                sheets_read.append(worksheet.title)
+                chunk = []
+                
+                for row in worksheet.iter_rows(values_only=True):
+                    if not any(cell is not None for cell in row):
+                        continue
+                    chunk.append(row)
+                    rows_read += 1
+                    cells_read += len(row)
+                    
+                    if len(chunk) >= self.excel_chunk_rows:
+                        self._map_excel_rows(chunk, extracted_data, tracker.field_scores)
+                        chunk = []
+                        tracker.record(self.source_reliability['excel'])
+                        if tracker.resolved:
+                            stopped_early = True
+                            break
+                    
+                    if cells_read >= self.excel_max_cells:
+                        result["processing_details"]["warning"] = (
+                            f"Workbook truncated after {cells_read} cells (limit {self.excel_max_cells})"
+                        )
+                        stopped_early = True
+                        break
+                
+                if chunk:
+                    self._map_excel_rows(chunk, extracted_data, tracker.field_scores)
+                    tracker.record(self.source_reliability['excel'])
+                
+                if stopped_early or tracker.resolved:
+                    break
+        finally:
+            workbook.close()
+        
+        result["processing_details"]["confidence_score"] = 0.9
+        result["processing_details"]["rows_scanned"] = rows_read
+        result["processing_details"]["sheets_scanned"] = sheets_read
+        result["processing_details"]["stopped_early"] = stopped_early
+        
+        return result
+    
+    def _map_excel_rows(self, rows: List[tuple], extracted_data: Dict,
+                        field_scores: Optional[Dict[Tuple[str, str], float]] = None) -> None:
+        """تمرير دفعة صفوف إلى مُصنِّف البنود؛ أول قيمة تُحسم لكل بند تبقى معتمدة"""
+        
+        chunk_data = {"balance_sheet": {}, "income_statement": {}, "cash_flow": {}}
+        chunk_scores: Dict[Tuple[str, str], float] = {}
+        
+        # تسميات بنود القوائم عبر المطابق النصي لكل صف على حدة
+        for row in rows:
+            row_text = ' '.join(str(cell) for cell in row if cell is not None)
+            for (statement_type, field), (value, score) in self.label_index.find_scored_values(row_text).items():
+                if field not in chunk_data[statement_type]:
+                    chunk_data[statement_type][field] = value
+                    chunk_scores[(statement_type, field)] = score
+        
+        # تسميات العمود الأول والقيم الرقمية عبر المسار المتجه للجداول
+        self._map_table_rows(rows, chunk_data, chunk_scores)
+        
+        self._keep_first_values(chunk_data, chunk_scores, extracted_data, field_scores)
+    
+    async def _process_word_file(self, upload: UploadBuffer, result: Dict) -> Dict:
         """معالجة ملفات Word"""
         
         result["processing_details"]["method_used"] = "Word Processing"
         
         try:
-            doc = Document(io.BytesIO(file_content))
+            doc = Document(upload.path)
             
             full_text = ""
             tables = []
@@ -353,41 +677,154 @@ class FinancialDataParser:
         
         return result
     
-    async def _process_image_file(self, file_content: bytes, result: Dict) -> Dict:
+    async def _process_image_file(self, upload: UploadBuffer, result: Dict, tracker: FieldResolutionTracker) -> Dict:
         """معالجة الصور باستخدام OCR"""
         
         result["processing_details"]["method_used"] = "OCR Processing"
         
         try:
             # تحويل البيانات إلى صورة
-            image = Image.open(io.BytesIO(file_content))
+            with Image.open(upload.path) as image:
+                # تصغير الصورة إلى دقة OCR المستهدفة وتصحيح الميلان وقص الهوامش
+                image, normalization = await self._normalize_image_for_ocr(image)
+            result["processing_details"]["image_normalization"] = normalization
             
             # تحسين الصورة للـ OCR
             enhanced_image = await self._enhance_image_for_ocr(image)
-            
-            # استخراج النص باستخدام OCR
-            extracted_text = pytesseract.image_to_string(enhanced_image, config=self.ocr_config)
-            
-            result["extracted_data"]["raw_text"] = extracted_text
             result["processing_details"]["confidence_score"] = 0.6  # OCR عادة أقل دقة
             
-            # محاولة كشف الجداول في الصورة
+            # كشف الجداول في الصورة وقراءتها خلية بخلية، جدولاً بجدول
+            text_image = enhanced_image
             try:
-                table_data = await self._detect_tables_in_image(enhanced_image)
-                if table_data:
-                    result["extracted_data"]["tables"] = table_data
+                gray = np.array(enhanced_image)
+                read_boxes = []
+                for grid in self._locate_table_grids(gray):
+                    table_data = await self._detect_tables_in_image(enhanced_image, [grid])
+                    if not table_data:
+                        continue
+                    result["extracted_data"]["tables"].extend(table_data)
                     result["processing_details"]["confidence_score"] = 0.7
-            except:
-                pass  # الجداول اختيارية
+                    read_boxes.append(grid[0])
+                    
+                    await self._extract_financial_data_from_tables(table_data, result["extracted_data"], tracker.field_scores)
+                    tracker.record(self.source_reliability['ocr_table'])
+                    if tracker.resolved:
+                        break
+                
+                # مناطق الجداول قُرئت بالفعل فلا داعي لإعادة قراءتها مع النص
+                if read_boxes:
+                    text_image = self._blank_regions(gray, read_boxes)
+            except Exception as table_error:
+                logging.warning(f"Image table detection failed: {table_error}")  # الجداول اختيارية
             
-            # استخراج البيانات المالية
-            await self._extract_financial_data_from_text(extracted_text, result["extracted_data"])
+            # استخراج النص باستخدام OCR ما لم تُحسم جميع البنود من الجداول
+            if tracker.resolved:
+                result["processing_details"]["stopped_early"] = True
+            else:
+                if self.ocr_language_routing:
+                    extracted_text = await self._ocr_routed_text(text_image)
+                else:
+                    extracted_text = await ocr_engine.recognize(text_image, lang=self.ocr_language, psm=self.ocr_psm)
+                result["extracted_data"]["raw_text"] = extracted_text
+                
+                # قيم الجداول أدق من النص فلا يكمل النص إلا البنود الناقصة
+                await self._extract_page_data(extracted_text, [], result["extracted_data"], tracker.field_scores)
+                tracker.record(self.source_reliability['ocr_text'])
             
         except Exception as e:
             raise Exception(f"Image OCR processing failed: {e}")
         
         return result
     
+    async def _normalize_image_for_ocr(self, image: Image) -> Tuple[Image, Dict[str, Any]]:
+        """تطبيع الصورة قبل التحسين بتكلفة تتناسب مع الحجم المستهدف لا حجم الصورة الأصلية"""
+        
+        original_size = image.size
+        
+        # الأبعاد متاحة من ترويسة الملف قبل فك الترميز
+        if original_size[0] * original_size[1] > self.max_image_pixels:
+            raise ValueError(
+                f"Image too large: {original_size[0]}x{original_size[1]} pixels "
+                f"(limit {self.max_image_pixels})"
+            )
+        
+        # تحديد معامل التصغير من DPI المسجل ومن أقصى بعد مسموح
+        scale = min(1.0, self.ocr_max_dimension / max(original_size))
+        dpi = image.info.get('dpi')
+        if dpi and dpi[0] and dpi[0] > self.ocr_target_dpi:
+            scale = min(scale, self.ocr_target_dpi / float(dpi[0]))
+        
+        target_size = (max(1, int(original_size[0] * scale)), max(1, int(original_size[1] * scale)))
+        
+        # draft يفك ترميز JPEG مباشرة بدقة مخفضة وبتدرج رمادي
+        image.draft('L', target_size)
+        image = ImageOps.exif_transpose(image).convert('L')
+        if scale < 1.0:
+            # مربع بطول الضلع الأكبر يبقى صحيحاً حتى لو دُوّرت الصورة حسب EXIF
+            long_edge = max(target_size)
+            image.thumbnail((long_edge, long_edge), Image.LANCZOS, reducing_gap=2.0)
+        
+        gray = np.array(image)
+        
+        # تصحيح الميلان
+        angle = self._estimate_skew_angle(gray)
+        if abs(angle) >= 0.5:
+            gray = self._rotate_image(gray, angle)
+        
+        # قص الهوامش الفارغة
+        gray = self._crop_margins(gray)
+        
+        details = {
+            "original_size": list(original_size),
+            "normalized_size": [int(gray.shape[1]), int(gray.shape[0])],
+            "scale": round(scale, 4),
+            "deskew_angle": angle
+        }
+        return Image.fromarray(gray), details
+    
+    def _estimate_skew_angle(self, gray: np.ndarray, max_angle: float = 5.0, step: float = 0.5) -> float:
+        """تقدير زاوية الميلان على نسخة مصغرة بتعظيم تباين مجاميع الصفوف (أسطر النص)"""
+        
+        # نسخة صغيرة ثابتة الحجم تجعل التكلفة مستقلة عن حجم الصورة
+        preview_scale = min(1.0, 800 / max(gray.shape))
+        preview = cv2.resize(gray, None, fx=preview_scale, fy=preview_scale, interpolation=cv2.INTER_AREA)
+        _, binary = cv2.threshold(preview, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-max_angle, max_angle + step / 2, step):
+            rotated = self._rotate_image(binary, float(angle), border_value=0)
+            score = float(np.var(np.count_nonzero(rotated, axis=1)))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        
+        return round(best_angle, 2)
+    
+    @staticmethod
+    def _rotate_image(gray: np.ndarray, angle: float, border_value: int = 255) -> np.ndarray:
+        """تدوير الصورة حول مركزها مع تعبئة الأطراف بالأبيض"""
+        
+        height, width = gray.shape[:2]
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        return cv2.warpAffine(
+            gray, matrix, (width, height),
+            flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=border_value
+        )
+    
+    @staticmethod
+    def _crop_margins(gray: np.ndarray, padding: int = 10) -> np.ndarray:
+        """قص الهوامش التي لا تحتوي على محتوى"""
+        
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        points = cv2.findNonZero(binary)
+        if points is None:
+            return gray
+        
+        x, y, w, h = cv2.boundingRect(points)
+        height, width = gray.shape[:2]
+        x0, y0 = max(0, x - padding), max(0, y - padding)
+        x1, y1 = min(width, x + w + padding), min(height, y + h + padding)
+        return gray[y0:y1, x0:x1]
+    
     async def _enhance_image_for_ocr(self, image: Image) -> Image:
         """تحسين الصورة لتحسين دقة OCR"""
         
@@ -409,8 +846,8 @@ class FinancialDataParser:
         
         return Image.fromarray(img_array)
     
-    async def _detect_tables_in_image(self, image: Image) -> List[List]:
-        """كشف الجداول في الصور"""
+    async def _detect_tables_in_image(self, image: Image, grids: Optional[List] = None) -> List[List]:
+        """كشف الجداول في الصور وقراءة خلاياها بالتوازي"""
         
         img_array = np.array(image)
         
@@ -420,150 +857,249 @@ class FinancialDataParser:
         else:
             gray = img_array
         
+        if grids is None:
+            grids = self._locate_table_grids(gray)
+        
+        tables = []
+        for (x, y, w, h), rows, cols in grids:
+            table = await self._ocr_table_cells(gray[y:y + h, x:x + w], rows, cols)
+            if len(table) > 1:
+                tables.append(table)
+        
+        return tables
+    
+    def _locate_table_grids(self, gray: np.ndarray) -> List[Tuple[Tuple[int, int, int, int], List[int], List[int]]]:
+        """تحديد الجداول وخطوط صفوفها وأعمدتها من الخطوط الأفقية والعمودية"""
+        
+        # الخطوط داكنة على خلفية فاتحة: نعكس الصورة ونحولها إلى ثنائية
+        binary = cv2.adaptiveThreshold(
+            cv2.bitwise_not(gray), 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY, 15, -2
+        )
+        height, width = binary.shape
+        
         # كشف الخطوط الأفقية والعمودية
-        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 1))
-        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 25))
+        horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(25, width // 40), 1))
+        vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(25, height // 40)))
         
-        horizontal_lines = cv2.morphologyEx(gray, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-        vertical_lines = cv2.morphologyEx(gray, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+        horizontal_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
+        vertical_lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
         
         # دمج الخطوط
         table_mask = cv2.addWeighted(horizontal_lines, 0.5, vertical_lines, 0.5, 0.0)
         
-        # البحث عن المستطيلات (خلايا الجدول)
+        # كل إطار خارجي مرشح لجدول
         contours, _ = cv2.findContours(table_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # هذا مثال مبسط - في التطبيق الحقيقي نحتاج خوارزمية أكثر تعقيداً
-        return []
+        grids = []
+        for contour in sorted(contours, key=lambda c: cv2.boundingRect(c)[1]):
+            x, y, w, h = cv2.boundingRect(contour)
+            if w < width * 0.3 or h < 40:
+                continue
+            
+            rows = self._line_positions(horizontal_lines[y:y + h, x:x + w], axis=1)
+            cols = self._line_positions(vertical_lines[y:y + h, x:x + w], axis=0)
+            
+            # صفان وعمودان على الأقل
+            if len(rows) >= 3 and len(cols) >= 3:
+                grids.append(((x, y, w, h), rows, cols))
+        
+        return grids
     
-    async def _extract_financial_data_from_text(self, text: str, extracted_data: Dict) -> None:
-        """استخراج البيانات المالية من النصوص"""
+    @staticmethod
+    def _line_positions(line_mask: np.ndarray, axis: int, min_fill: float = 0.5) -> List[int]:
+        """مواضع الخطوط التي تمتد على معظم عرض/ارتفاع الجدول، مع دمج الخطوط السميكة"""
         
-        if not text:
-            return
+        length = line_mask.shape[axis]
+        profile = np.count_nonzero(line_mask, axis=axis)
+        hits = np.flatnonzero(profile >= length * min_fill)
+        if hits.size == 0:
+            return []
         
-        # تنظيف النص
-        text = re.sub(r'\s+', ' ', text).strip()
+        groups = np.split(hits, np.flatnonzero(np.diff(hits) > 1) + 1)
+        return [int(group.mean()) for group in groups]
+    
+    async def _ocr_table_cells(self, gray: np.ndarray, rows: List[int], cols: List[int]) -> List[List[str]]:
+        """قراءة خلايا الجدول بالتوازي: الخلايا الرقمية بقائمة أرقام فقط وخلايا التسميات بالنموذج العربي+الإنجليزي"""
         
-        # البحث عن الأرقام والمبالغ المالية
-        financial_patterns = [
-            r'(\d{1,3}(?:,\d{3})*(?:\.\d{2})?)',  # أرقام مع فواصل
-            r'(\d+\.?\d*)',  # أرقام عادية
-        ]
+        # عمود التسميات هو الأعرض (يمين الجدول في القوائم العربية ويساره في الإنجليزية)
+        label_col = int(np.argmax(np.diff(cols)))
+        semaphore = asyncio.Semaphore(self.ocr_cell_concurrency)
+        padding = 3
         
-        # استخراج بيانات قائمة المركز المالي
-        balance_sheet_keywords = {
-            'current_assets': ['الأصول المتداولة', 'Current Assets', 'أصول متداولة'],
-            'fixed_assets': ['الأصول الثابتة', 'Fixed Assets', 'أصول ثابتة'],
-            'total_assets': ['إجمالي الأصول', 'Total Assets', 'مجموع الأصول'],
-            'current_liabilities': ['الخصوم المتداولة', 'Current Liabilities', 'خصوم متداولة'],
-            'total_equity': ['حقوق المساهمين', 'Shareholders Equity', 'حقوق الملكية']
-        }
-        
-        for key, keywords in balance_sheet_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['balance_sheet'][key] = value
-        
-        # استخراج بيانات قائمة الدخل
-        income_keywords = {
-            'revenue': ['الإيرادات', 'Revenue', 'المبيعات', 'Sales'],
-            'gross_profit': ['مجمل الربح', 'Gross Profit', 'الربح الإجمالي'],
-            'operating_profit': ['الربح التشغيلي', 'Operating Profit', 'ربح العمليات'],
-            'net_income': ['صافي الربح', 'Net Income', 'الربح الصافي']
-        }
+        async def read_cell(y0: int, y1: int, x0: int, x1: int, is_label: bool) -> str:
+            cell = gray[y0 + padding:y1 - padding, x0 + padding:x1 - padding]
+            if cell.size == 0:
+                return ""
+            
+            # تخطي الخلايا الفارغة دون استدعاء OCR
+            if np.count_nonzero(cell < 128) < cell.size * 0.005:
+                return ""
+            
+            async with semaphore:
+                if is_label and self.ocr_language_routing:
+                    text, _ = await ocr_engine.recognize_block(Image.fromarray(cell), psm=7)
+                elif is_label:
+                    text = await ocr_engine.recognize(Image.fromarray(cell), lang=self.ocr_language, psm=7)
+                else:
+                    text = await ocr_engine.recognize(
+                        Image.fromarray(cell), lang='eng', psm=7, whitelist=self.ocr_numeric_whitelist
+                    )
+            return text.strip()
         
-        for key, keywords in income_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['income_statement'][key] = value
+        jobs = []
+        for r in range(len(rows) - 1):
+            # عمود التسميات أولاً كما يتوقع مُصنِّف الجداول
+            ordered_cols = [label_col] + [c for c in range(len(cols) - 1) if c != label_col]
+            for c in ordered_cols:
+                jobs.append(read_cell(rows[r], rows[r + 1], cols[c], cols[c + 1], c == label_col))
         
-        # استخراج بيانات التدفقات النقدية
-        cash_flow_keywords = {
-            'operating_cash_flow': ['التدفق النقدي التشغيلي', 'Operating Cash Flow'],
-            'investing_cash_flow': ['التدفق النقدي الاستثماري', 'Investing Cash Flow'],
-            'financing_cash_flow': ['التدفق النقدي التمويلي', 'Financing Cash Flow']
-        }
+        cells = await asyncio.gather(*jobs)
         
-        for key, keywords in cash_flow_keywords.items():
-            value = self._extract_value_near_keywords(text, keywords)
-            if value:
-                extracted_data['cash_flow'][key] = value
+        width = len(cols) - 1
+        table = [list(cells[i:i + width]) for i in range(0, len(cells), width)]
+        return [row for row in table if any(row)]
     
-    def _extract_value_near_keywords(self, text: str, keywords: List[str]) -> Optional[float]:
-        """استخراج القيمة العددية القريبة من الكلمات المفتاحية"""
+    async def _ocr_routed_text(self, image: Image) -> str:
+        """OCR الصفحة سطراً بسطر مع اختيار نموذج اللغة لكل كتلة حسب خطها"""
         
-        for keyword in keywords:
-            # البحث عن الكلمة المفتاحية
-            pattern = rf'{re.escape(keyword)}[:\s]*(\d{{1,3}}(?:,\d{{3}})*(?:\.\d{{2}})?)'
-            match = re.search(pattern, text, re.IGNORECASE)
+        gray = np.array(image)
+        rows = self._segment_text_rows(gray)
+        semaphore = asyncio.Semaphore(self.ocr_cell_concurrency)
+        padding = 4
+        height, width = gray.shape[:2]
+        
+        async def read_block(box: Tuple[int, int, int, int]) -> Tuple[str, str]:
+            x, y, w, h = box
+            block = gray[max(0, y - padding):min(height, y + h + padding), max(0, x - padding):min(width, x + w + padding)]
+            async with semaphore:
+                text, route = await ocr_engine.recognize_block(Image.fromarray(block), psm=7)
+            return text.strip(), route
+        
+        results = await asyncio.gather(*(read_block(box) for row in rows for box in row))
+        
+        lines = []
+        position = 0
+        for row in rows:
+            row_results = results[position:position + len(row)]
+            position += len(row)
             
-            if match:
-                # تنظيف الرقم وتحويله
-                number_str = match.group(1).replace(',', '')
-                try:
-                    return float(number_str)
-                except ValueError:
-                    continue
+            # السطور التي تحتوي على نص عربي تُقرأ من اليمين لليسار حتى تسبق التسمية قيمتها
+            rtl = any(route in ('ara', 'ara+eng') for _, route in row_results)
+            ordered = sorted(zip(row, row_results), key=lambda item: item[0][0], reverse=rtl)
+            line = ' '.join(text for _, (text, _) in ordered if text)
+            if line:
+                lines.append(line)
         
-        return None
+        return '\n'.join(lines)
     
-    async def _extract_financial_data_from_tables(self, tables: List[List], extracted_data: Dict) -> None:
+    @staticmethod
+    def _segment_text_rows(gray: np.ndarray) -> List[List[Tuple[int, int, int, int]]]:
+        """تقسيم الصفحة إلى كتل كلمات متجاورة مجمعة في أسطر من الأعلى للأسفل"""
+        
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(15, gray.shape[1] // 60), 3))
+        merged = cv2.dilate(binary, kernel, iterations=1)
+        
+        contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = [cv2.boundingRect(c) for c in contours]
+        boxes = sorted((b for b in boxes if b[2] >= 8 and b[3] >= 8), key=lambda b: b[1] + b[3] / 2)
+        
+        rows: List[List[Tuple[int, int, int, int]]] = []
+        row_bottom = -1
+        for box in boxes:
+            center = box[1] + box[3] / 2
+            if rows and center <= row_bottom:
+                rows[-1].append(box)
+                row_bottom = max(row_bottom, box[1] + box[3])
+            else:
+                rows.append([box])
+                row_bottom = box[1] + box[3]
+        
+        return rows
+    
+    @staticmethod
+    def _blank_regions(gray: np.ndarray, boxes: List[Tuple[int, int, int, int]]) -> Image:
+        """تبييض مناطق الجداول قبل OCR النص الكامل"""
+        
+        masked = gray.copy()
+        for x, y, w, h in boxes:
+            masked[y:y + h, x:x + w] = 255
+        return Image.fromarray(masked)
+    
+    async def _extract_financial_data_from_text(self, text: str, extracted_data: Dict,
+                                                field_scores: Optional[Dict[Tuple[str, str], float]] = None) -> None:
+        """استخراج البيانات المالية من النصوص، مع درجة مطابقة تسمية كل بند إن طُلبت"""
+        
+        if not text:
+            return
+        
+        # تنظيف النص
+        text = re.sub(r'\s+', ' ', text).strip()
+        
+        # مسح واحد للنص يحدد كل تسمية والرقم الذي يليها
+        for (statement_type, field), (value, score) in self.label_index.find_scored_values(text).items():
+            extracted_data[statement_type][field] = value
+            if field_scores is not None:
+                field_scores[(statement_type, field)] = score
+    
+    async def _extract_financial_data_from_tables(self, tables: List[List], extracted_data: Dict,
+                                                  field_scores: Optional[Dict[Tuple[str, str], float]] = None) -> None:
         """استخراج البيانات المالية من الجداول"""
         
         for table in tables:
             if not table or len(table) < 2:
                 continue
             
-            # تحويل الجدول إلى DataFrame للمعالجة الأسهل
             try:
-                df = pd.DataFrame(table[1:], columns=table[0])
-                
-                # البحث عن أعمدة تحتوي على أرقام
-                numeric_columns = []
-                for col in df.columns:
-                    if df[col].dtype == 'object':
-                        # محاولة تحويل العمود إلى أرقام
-                        numeric_values = pd.to_numeric(df[col], errors='coerce')
-                        if not numeric_values.isna().all():
-                            numeric_columns.append(col)
-                
-                # استخراج البيانات بناءً على النصوص في العمود الأول
-                for _, row in df.iterrows():
-                    row_text = str(row.iloc[0]).lower()
-                    
-                    # البحث عن القيم العددية في الصف
-                    numeric_value = None
-                    for col in numeric_columns:
-                        try:
-                            val = pd.to_numeric(str(row[col]).replace(',', ''), errors='coerce')
-                            if not pd.isna(val) and val != 0:
-                                numeric_value = float(val)
-                                break
-                        except:
-                            continue
-                    
-                    if numeric_value is None:
-                        continue
-                    
-                    # تصنيف البيانات
-                    if any(keyword in row_text for keyword in ['أصول متداولة', 'current assets']):
-                        extracted_data['balance_sheet']['current_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['أصول ثابتة', 'fixed assets']):
-                        extracted_data['balance_sheet']['fixed_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['إجمالي الأصول', 'total assets']):
-                        extracted_data['balance_sheet']['total_assets'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['إيرادات', 'revenue', 'مبيعات', 'sales']):
-                        extracted_data['income_statement']['revenue'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['مجمل الربح', 'gross profit']):
-                        extracted_data['income_statement']['gross_profit'] = numeric_value
-                    elif any(keyword in row_text for keyword in ['صافي الربح', 'net income']):
-                        extracted_data['income_statement']['net_income'] = numeric_value
-                        
+                # الصف الأول عناوين الأعمدة
+                self._map_table_rows(table[1:], extracted_data, field_scores)
             except Exception as e:
                 # تجاهل الأخطاء في جداول معينة والانتقال للجدول التالي
                 continue
     
+    def _map_table_rows(self, rows: List, extracted_data: Dict,
+                        field_scores: Optional[Dict[Tuple[str, str], float]] = None) -> None:
+        """ربط صفوف جدول ببنود القوائم: العمود الأول تسميات البنود والباقي قيم"""
+        
+        df = pd.DataFrame(rows)
+        if df.shape[1] < 2:
+            return
+        
+        values = self._normalize_numeric_frame(df.iloc[:, 1:])
+        
+        # أول قيمة غير صفرية في كل صف بعد تحويل الأعمدة دفعة واحدة
+        row_values = values.mask(values == 0).bfill(axis=1).iloc[:, 0]
+        
+        for (statement_type, field), (value, score) in self._classify_table_rows(df.iloc[:, 0], row_values).items():
+            extracted_data[statement_type][field] = value
+            if field_scores is not None:
+                field_scores[(statement_type, field)] = score
+    
+    @staticmethod
+    def _normalize_numeric_frame(frame: pd.DataFrame) -> pd.DataFrame:
+        """تحويل خلايا جدول إلى أرقام في تمريرة واحدة: الفواصل، الأقواس كسالب، والأرقام العربية"""
+        
+        cells = pd.Series(frame.to_numpy(dtype=object).ravel()).astype(str)
+        cells = (
+            cells.str.translate(ARABIC_DIGITS_TABLE)
+                 .str.replace(r'[,\s]', '', regex=True)
+                 .str.replace(r'^\((.*)\)$', r'-\1', regex=True)
+        )
+        numbers = pd.to_numeric(cells, errors='coerce').to_numpy(dtype=float)
+        return pd.DataFrame(numbers.reshape(frame.shape), index=frame.index)
+    
+    def _classify_table_rows(self, labels: pd.Series, row_values: pd.Series) -> Dict[Tuple[str, str], Tuple[float, float]]:
+        """تصنيف تسميات العمود الأول عبر فهرس التسميات المشترك: البند ← (القيمة، درجة المطابقة)"""
+        
+        classified = {}
+        
+        # آخر صف مطابق لكل بند هو المعتمد، كما في المعالجة صفاً بصف
+        for resolved, value in zip(self.label_index.resolve_many_scored(labels.astype(str)), row_values.to_numpy()):
+            if resolved is not None and not np.isnan(value):
+                classified[resolved[0]] = (float(value), resolved[1])
+        
+        return classified
+    
     async def _merge_financial_data(self, target_data: Dict, source_data: Dict) -> None:
         """دمج البيانات المالية من مصادر متعددة"""
         
@@ -659,6 +1195,12 @@ class FinancialDataParser:
         
         return {
             "supported_formats": self.supported_formats,
+            "archive_formats": [".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz"],
+            "archive_limits": {
+                "max_members": self.archive_max_members,
+                "max_total_bytes": self.archive_max_total_bytes
+            },
+            "parser_workers": self.parser_workers,
             "processing_capabilities": {
                 "pdf": {
                     "methods": ["pdfplumber", "camelot", "PyPDF2"],
@@ -680,11 +1222,18 @@ class FinancialDataParser:
                 },
                 "images": {
                     "methods": ["tesseract OCR"],
+                    "ocr_backend": ocr_engine.backend_name,
+                    "language_routing": self.ocr_language_routing,
+                    "language_routes": dict(ocr_engine.route_stats),
                     "accuracy": "70%",
-                    "supports_tables": "Limited",
+                    "supports_tables": True,
                     "supports_arabic": True
                 }
             },
+            "label_index": {
+                "labels": self.label_index.size,
+                "fuzzy_matching": self.label_index.fuzzy_backend
+            },
             "financial_data_extraction": {
                 "balance_sheet_items": 15,
                 "income_statement_items": 12,
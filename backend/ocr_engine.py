@@ -0,0 +1,301 @@
+"""
+محرك OCR الدائم
+Persistent OCR Engine for FinClick.AI
+
+- tesserocr: ربط مباشر بواجهة Tesseract C-API يبقي نماذج اللغة محملة في الذاكرة
+- pytesseract: بديل احتياطي يشغّل عملية tesseract جديدة لكل صورة
+- ScriptRouter: اختيار نموذج ara أو eng أو أرقام فقط لكل كتلة نصية بدلاً من ara+eng الأبطأ دائماً
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # الربط الأصلي اختياري
+    tesserocr = None
+
+# أحرف القيم المالية: أرقام وفواصل وأقواس السالب
+NUMERIC_WHITELIST = "0123456789,.()-"
+
+# مسار كل تصنيف: (نموذج اللغة، قائمة الأحرف المسموحة)
+ROUTES = {
+    "ara": ("ara", None),
+    "eng": ("eng", None),
+    "digits": ("eng", NUMERIC_WHITELIST),
+    "ara+eng": ("ara+eng", None)
+}
+
+
+class PytesseractBackend:
+    """تشغيل tesseract كعملية منفصلة لكل صورة (السلوك السابق)"""
+
+    name = "pytesseract"
+
+    @staticmethod
+    def _config(psm: int, whitelist: Optional[str]) -> str:
+        config = f"--oem 3 --psm {psm}"
+        if whitelist:
+            config += f" -c tessedit_char_whitelist={whitelist}"
+        return config
+
+    def image_to_string(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                        whitelist: Optional[str] = None) -> str:
+        return pytesseract.image_to_string(image, lang=lang, config=self._config(psm, whitelist))
+
+    def image_to_string_with_confidence(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                                        whitelist: Optional[str] = None) -> Tuple[str, float]:
+        data = pytesseract.image_to_data(image, lang=lang, config=self._config(psm, whitelist),
+                                         output_type=pytesseract.Output.DICT)
+        words = [(text, float(conf)) for text, conf in zip(data["text"], data["conf"]) if text.strip() and float(conf) >= 0]
+        if not words:
+            return "", 0.0
+        return " ".join(text for text, _ in words), sum(conf for _, conf in words) / len(words)
+
+    def close(self) -> None:
+        pass
+
+
+class TesserocrBackend:
+    """مجمع محركات Tesseract دائمة لكل لغة؛ كل محرك يُستخدم من خيط واحد في كل مرة"""
+
+    name = "tesserocr"
+
+    def __init__(self, pool_size: Optional[int] = None, tessdata_path: Optional[str] = None):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+
+        self.pool_size = pool_size or os.cpu_count() or 1
+        self.tessdata_path = tessdata_path or os.environ.get("TESSDATA_PREFIX")
+        self._pools: Dict[str, queue.Queue] = {}
+        self._created: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, lang: str):
+        """الحصول على محرك محمّل مسبقاً للغة، أو إنشاء محرك جديد ضمن حد المجمع"""
+
+        with self._lock:
+            pool = self._pools.setdefault(lang, queue.Queue())
+            try:
+                return pool.get_nowait()
+            except queue.Empty:
+                if self._created.get(lang, 0) < self.pool_size:
+                    self._created[lang] = self._created.get(lang, 0) + 1
+                    create = True
+                else:
+                    create = False
+
+        if create:
+            kwargs = {"lang": lang, "oem": tesserocr.OEM.DEFAULT}
+            if self.tessdata_path:
+                kwargs["path"] = self.tessdata_path
+            try:
+                return tesserocr.PyTessBaseAPI(**kwargs)
+            except Exception:
+                # تحرير المكان المحجوز حتى لا ينتظر الطالبون التاليون محركاً لن يُنشأ
+                with self._lock:
+                    self._created[lang] -= 1
+                raise
+
+        return pool.get()
+
+    def _release(self, lang: str, api) -> None:
+        self._pools[lang].put(api)
+
+    def image_to_string(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                        whitelist: Optional[str] = None) -> str:
+        return self.image_to_string_with_confidence(image, lang=lang, psm=psm, whitelist=whitelist)[0]
+
+    def image_to_string_with_confidence(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                                        whitelist: Optional[str] = None) -> Tuple[str, float]:
+        api = self._acquire(lang)
+        try:
+            api.SetPageSegMode(psm)
+            api.SetVariable("tessedit_char_whitelist", whitelist or "")
+            api.SetImage(image)
+            return api.GetUTF8Text(), float(api.MeanTextConf())
+        finally:
+            api.Clear()
+            self._release(lang, api)
+
+    def close(self) -> None:
+        """تحرير جميع المحركات المحملة"""
+
+        with self._lock:
+            for pool in self._pools.values():
+                while not pool.empty():
+                    pool.get_nowait().End()
+            self._pools.clear()
+            self._created.clear()
+
+
+class ScriptRouter:
+    """تصنيف سريع لكتلة نصية (عربي/لاتيني/أرقام/مختلط) من مكوناتها المتصلة قبل تشغيل OCR
+
+    الكلمات العربية متصلة الحروف فتظهر كمكونات عريضة منخفضة، بينما الحروف
+    والأرقام اللاتينية مكونات منفصلة نسبة عرضها إلى ارتفاعها أقل من واحد.
+    الأرقام كلها في شريط ارتفاع واحد، أما الكلمات اللاتينية فتجمع حروفاً صغيرة (x-height) وأخرى صاعدة أو نازلة.
+    """
+
+    def __init__(self, arabic_threshold: float = 0.45, latin_threshold: float = 0.15,
+                 digit_height_tolerance: float = 0.1, min_confidence: float = 60.0):
+        self.arabic_threshold = arabic_threshold
+        self.latin_threshold = latin_threshold
+        self.digit_height_tolerance = digit_height_tolerance
+        self.min_confidence = min_confidence
+
+    def classify(self, gray: np.ndarray) -> str:
+        """إرجاع المسار المناسب: ara أو eng أو digits أو ara+eng، أو blank للكتل الفارغة"""
+
+        if gray.size == 0:
+            return "blank"
+        if gray.ndim == 3:
+            gray = cv2.cvtColor(gray, cv2.COLOR_RGB2GRAY)
+
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        components = stats[1:]
+        components = components[components[:, cv2.CC_STAT_AREA] >= 3]
+        if len(components) == 0:
+            return "blank"
+
+        widths = components[:, cv2.CC_STAT_WIDTH]
+        heights = components[:, cv2.CC_STAT_HEIGHT]
+        areas = components[:, cv2.CC_STAT_AREA]
+
+        # ارتفاع الحروف المرجعي من المكونات الكبيرة (بدون النقاط والتشكيل)
+        reference_height = float(np.median(heights[heights >= np.percentile(heights, 50)]))
+        wide = widths > 1.5 * reference_height
+        wide_ink = float(areas[wide].sum()) / float(areas.sum())
+
+        if wide_ink >= self.arabic_threshold:
+            return "ara"
+        if wide_ink <= self.latin_threshold:
+            return "digits" if self._digits_only(components, reference_height) else "eng"
+        return "ara+eng"
+
+    def _digits_only(self, components: np.ndarray, reference_height: float) -> bool:
+        """هل كل الحروف (دون الفواصل والنقاط والأقواس) داخل شريط ارتفاع واحد؟
+
+        الحروف الصاعدة (T، d) تتجاوز الشريط من الأعلى والنازلة (p، y) من الأسفل، أما الأرقام فلا.
+        الأقواس تتجاوزه أيضاً لكنها ضيقة فتُستثنى. الكلمات بلا حروف صاعدة أو نازلة (TOTAL، some)
+        تُصنف أرقاماً، فتُقرأ بالقائمة الرقمية بثقة ضعيفة ثم تعود إلى ara+eng.
+        """
+
+        glyphs = components[components[:, cv2.CC_STAT_HEIGHT] >= 0.5 * reference_height]
+        tops = glyphs[:, cv2.CC_STAT_TOP]
+        bottoms = tops + glyphs[:, cv2.CC_STAT_HEIGHT]
+        band_top, band_bottom = float(np.median(tops)), float(np.median(bottoms))
+        margin = self.digit_height_tolerance * (band_bottom - band_top)
+
+        outside = (tops < band_top - margin) | (bottoms > band_bottom + margin)
+        narrow = glyphs[:, cv2.CC_STAT_WIDTH] < 0.4 * glyphs[:, cv2.CC_STAT_HEIGHT]
+        return not bool(np.any(outside & ~narrow))
+
+
+class OCREngine:
+    """واجهة موحدة لـ OCR تختار المحرك الدائم إن توفر وتعود إلى pytesseract عند الفشل"""
+
+    def __init__(self, backend: Optional[str] = None):
+        requested = (backend or os.environ.get("OCR_BACKEND", "auto")).lower()
+        self.fallback = PytesseractBackend()
+        self.backend = self.fallback
+        self.router = ScriptRouter()
+        # عدد الكتل والزمن المستغرق لكل مسار لغة
+        self.route_stats = defaultdict(lambda: {"blocks": 0, "seconds": 0.0})
+        self._stats_lock = threading.Lock()
+        # مجمع خيوط واحد للعملية كلها: كل خيوط المحللين (ولكل منها حلقة أحداث خاصة) ترسل
+        # إليه، فلا يتجاوز عدد عمليات tesseract المتزامنة OCR_WORKERS مهما تعددت الملفات
+        self.workers = int(os.environ.get("OCR_WORKERS", str(os.cpu_count() or 4)))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+
+        if requested in ("auto", "tesserocr"):
+            try:
+                self.backend = TesserocrBackend()
+            except Exception as e:
+                if requested == "tesserocr":
+                    logging.warning(f"tesserocr backend unavailable, using pytesseract: {e}")
+
+    @property
+    def backend_name(self) -> str:
+        return self.backend.name
+
+    def image_to_string(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                        whitelist: Optional[str] = None) -> str:
+        """استخراج النص من صورة"""
+
+        if self.backend is not self.fallback:
+            try:
+                return self.backend.image_to_string(image, lang=lang, psm=psm, whitelist=whitelist)
+            except Exception as e:
+                logging.warning(f"{self.backend.name} OCR failed, falling back to pytesseract: {e}")
+
+        return self.fallback.image_to_string(image, lang=lang, psm=psm, whitelist=whitelist)
+
+    def image_to_string_with_confidence(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                                        whitelist: Optional[str] = None) -> Tuple[str, float]:
+        """استخراج النص مع متوسط ثقة الكلمات (0-100)"""
+
+        if self.backend is not self.fallback:
+            try:
+                return self.backend.image_to_string_with_confidence(image, lang=lang, psm=psm, whitelist=whitelist)
+            except Exception as e:
+                logging.warning(f"{self.backend.name} OCR failed, falling back to pytesseract: {e}")
+
+        return self.fallback.image_to_string_with_confidence(image, lang=lang, psm=psm, whitelist=whitelist)
+
+    def recognize_block_sync(self, image: Image.Image, psm: int = 7) -> Tuple[str, str]:
+        """OCR لكتلة نصية بنموذج لغة واحد (أو بقائمة أرقام فقط) حسب خطها، والعودة إلى ara+eng عند ضعف الثقة"""
+
+        start = time.perf_counter()
+        route = self.router.classify(np.array(image))
+
+        if route == "blank":
+            text = ""
+        else:
+            lang, whitelist = ROUTES[route]
+            text, confidence = self.image_to_string_with_confidence(image, lang=lang, psm=psm, whitelist=whitelist)
+            if route != "ara+eng" and confidence < self.router.min_confidence:
+                route = "ara+eng"
+                text = self.image_to_string(image, lang=route, psm=psm)
+
+        with self._stats_lock:
+            stats = self.route_stats[route]
+            stats["blocks"] += 1
+            stats["seconds"] += time.perf_counter() - start
+        return text, route
+
+    async def recognize_block(self, image: Image.Image, psm: int = 7) -> Tuple[str, str]:
+        """نسخة غير حاجبة من recognize_block_sync"""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.recognize_block_sync(image, psm=psm))
+
+    async def recognize(self, image: Image.Image, lang: str = "ara+eng", psm: int = 6,
+                        whitelist: Optional[str] = None) -> str:
+        """استخراج النص في مجمع OCR المشترك حتى لا يُحجب حلقة الأحداث"""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, lambda: self.image_to_string(image, lang=lang, psm=psm, whitelist=whitelist)
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.backend.close()
+
+
+# Global instance
+ocr_engine = OCREngine()
@@ -0,0 +1,364 @@
+"""
+مخزن محلي لتاريخ الأسعار اليومية
+Memory-Mapped Price History Store for FinClick.AI
+
+- لكل رمز ملفات أعمدة ثنائية (open, high, low, close, volume) تُضاف إليها الصفوف فقط
+- الصف i هو اليوم first_day + i (أيام تقويمية، NaN لأيام عدم التداول)، فاقتطاع فترة زمنية
+  هو حساب إزاحتين على ملف مُعيَّن في الذاكرة (memmap) دون بحث أو نسخ
+- فهرس الرموز في symbols.json؛ الكتابة تتم تحت قفل ملف (fcntl) مع إعادة قراءة الفهرس، لأن كل
+  عمليات uvicorn تضيف إلى نفس المخزن
+- حسابات متجهة على مصفوفة (رموز × أيام): العوائد، التقلب المتحرك، بيتا، أقصى تراجع
+"""
+
+import os
+import json
+import fcntl
+import tempfile
+import threading
+import warnings
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+FIELDS = ("open", "high", "low", "close", "volume")
+TRADING_DAYS = 252
+_EPOCH = np.datetime64("1970-01-01", "D")
+_ITEM_SIZE = np.dtype(np.float64).itemsize
+
+
+def to_day(value) -> int:
+    """تاريخ (نص، date، datetime، Timestamp) إلى رقم اليوم منذ 1970-01-01"""
+
+    return int((np.datetime64(value, "D") - _EPOCH).astype(np.int64))
+
+
+def _nan_reduce(fn, *args, **kwargs):
+    # الصفوف الخالية من البيانات تعطي NaN دون تحذيرات numpy
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return fn(*args, **kwargs)
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """ملء أيام عدم التداول بآخر قيمة متاحة في كل صف"""
+
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+
+def daily_returns(closes: np.ndarray) -> np.ndarray:
+    """عائد كل يوم تداول مقارنة بآخر إغلاق سابق له؛ NaN لأيام عدم التداول"""
+
+    filled = forward_fill(closes)
+    previous = np.full_like(filled, np.nan)
+    previous[:, 1:] = filled[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = closes / previous - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def volatility(returns: np.ndarray) -> np.ndarray:
+    """التقلب السنوي لكل صف"""
+
+    return _nan_reduce(np.nanstd, returns, axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+
+
+def rolling_volatility(returns: np.ndarray, window: int) -> np.ndarray:
+    """التقلب السنوي المتحرك على نافذة من الأيام التقويمية (مجاميع تراكمية، O(n))"""
+
+    valid = ~np.isnan(returns)
+    values = np.where(valid, returns, 0.0)
+
+    def rolling_sum(a: np.ndarray) -> np.ndarray:
+        total = np.cumsum(a, axis=1)
+        result = total.copy()
+        result[:, window:] = total[:, window:] - total[:, :-window]
+        return result
+
+    count = rolling_sum(valid.astype(np.float64))
+    total = rolling_sum(values)
+    squares = rolling_sum(values * values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = total / count
+        variance = (squares - count * mean * mean) / (count - 1)
+    variance[count < 2] = np.nan
+    return np.sqrt(np.clip(variance, 0, None)) * np.sqrt(TRADING_DAYS)
+
+
+def beta(returns: np.ndarray, market_returns: np.ndarray) -> np.ndarray:
+    """بيتا كل صف مقابل عوائد السوق، على الأيام المشتركة فقط"""
+
+    both = ~np.isnan(returns) & ~np.isnan(market_returns)[None, :]
+    r = np.where(both, returns, 0.0)
+    m = np.where(both, market_returns[None, :], 0.0)
+    n = both.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_r = r.sum(axis=1) / n
+        mean_m = m.sum(axis=1) / n
+        covariance = (r * m).sum(axis=1) / n - mean_r * mean_m
+        variance = (m * m).sum(axis=1) / n - mean_m * mean_m
+        result = covariance / variance
+    result[(n < 2) | (variance <= 0)] = np.nan
+    return result
+
+
+def max_drawdown(closes: np.ndarray) -> np.ndarray:
+    """أقصى تراجع من قمة سابقة لكل صف (قيمة سالبة)"""
+
+    filled = forward_fill(closes)
+    peaks = np.fmax.accumulate(filled, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = filled / peaks - 1
+    return _nan_reduce(np.nanmin, drawdown, axis=1)
+
+
+def total_return(closes: np.ndarray) -> np.ndarray:
+    """العائد من أول إغلاق متاح إلى آخر إغلاق متاح لكل صف"""
+
+    valid = ~np.isnan(closes)
+    rows = np.arange(closes.shape[0])
+    first = closes[rows, valid.argmax(axis=1)]
+    last = forward_fill(closes)[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return last / first - 1
+
+
+class PriceStore:
+    """أعمدة OHLCV يومية لكل رمز في ملفات memmap تُضاف إليها الصفوف فقط"""
+
+    def __init__(self, directory: Optional[str] = None):
+        # تاريخ الأسعار يتراكم عبر إعادة التشغيل، فالمجلد الافتراضي دائم وليس مجلداً مؤقتاً
+        data_dir = os.environ.get("FINCLICK_DATA_DIR", os.path.join(os.path.expanduser("~"), ".finclick"))
+        self.directory = directory or os.environ.get("PRICE_STORE_DIR", os.path.join(data_dir, "prices"))
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maps: Dict[Tuple[str, str], np.ndarray] = {}
+        self._index_version: Optional[Tuple[int, int]] = None
+        self.index: Dict[str, Dict[str, int]] = {}
+        self._reload_index()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "symbols.json")
+
+    def _load_index(self) -> Dict[str, Dict[str, int]]:
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _current_version(self) -> Optional[Tuple[int, int]]:
+        # الفهرس يُستبدل بـ os.replace، فيتغير رقم الملف (inode) مع كل كتابة
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _reload_index(self) -> None:
+        """قراءة الفهرس من القرص وإسقاط ملفات memmap للرموز التي أضافت إليها عملية أخرى"""
+
+        version = self._current_version()
+        index = self._load_index()
+        for symbol, entry in index.items():
+            if self.index.get(symbol) != entry:
+                for field in FIELDS:
+                    self._maps.pop((symbol, field), None)
+        self.index = index
+        self._index_version = version
+
+    def _refresh(self) -> None:
+        """إعادة قراءة الفهرس للقراءة إذا كتبت عملية أخرى بعد آخر تحميل"""
+
+        if self._current_version() != self._index_version:
+            with self._lock:
+                self._reload_index()
+
+    @contextmanager
+    def _exclusive(self):
+        """قفل الكتابة بين خيوط العملية (threading) وبين عمليات الخادم (flock)"""
+
+        with self._lock:
+            fd = os.open(os.path.join(self.directory, "symbols.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _save_index(self) -> None:
+        fd, temp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.index, f)
+        os.replace(temp_path, self._index_path)
+
+    def _column_path(self, entry: Dict[str, int], field: str) -> str:
+        return os.path.join(self.directory, f"{entry['slot']:06d}", f"{field}.f8")
+
+    @property
+    def symbols(self) -> List[str]:
+        self._refresh()
+        return list(self.index)
+
+    def append(self, symbol: str, dates, columns: Dict[str, Any]) -> int:
+        """إضافة صفوف يومية وإرجاع عدد الأيام الجديدة
+
+        الأيام الأقدم من آخر يوم مخزن تُتجاهل، وآخر يوم يُستبدل إن ورد مجدداً (شمعة اليوم الجاري).
+        """
+
+        days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64) - _EPOCH.astype(np.int64)
+        if len(days) == 0:
+            return 0
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        values = {
+            field: np.asarray(columns[field], dtype=np.float64)[order] if field in columns
+            else np.full(len(days), np.nan)
+            for field in FIELDS
+        }
+
+        with self._exclusive():
+            # الفهرس المحفوظ في هذه العملية قد يكون قديماً: المكان الجديد وعدد الصفوف من الفهرس الحالي على القرص
+            self._reload_index()
+            entry = self.index.get(symbol)
+            if entry is None:
+                slot = max((existing["slot"] for existing in self.index.values()), default=-1) + 1
+                entry = {"slot": slot, "first_day": int(days[0]), "rows": 0}
+                os.makedirs(os.path.dirname(self._column_path(entry, FIELDS[0])), exist_ok=True)
+
+            rows = entry["rows"]
+            positions = days - entry["first_day"]
+            keep = positions >= max(rows - 1, 0)
+            positions = positions[keep]
+            if len(positions) == 0:
+                return 0
+
+            end = max(int(positions.max()) + 1, rows)
+            appended = positions >= rows
+            for field in FIELDS:
+                path = self._column_path(entry, field)
+                column = values[field][keep]
+                with open(path, "ab") as f:
+                    # ما بعد الصفوف المسجلة في الفهرس بقايا كتابة لم تكتمل
+                    f.truncate(rows * _ITEM_SIZE)
+                    block = np.full(end - rows, np.nan)
+                    block[positions[appended] - rows] = column[appended]
+                    f.write(block.tobytes())
+                if rows and not appended.all():
+                    with open(path, "r+b") as f:
+                        f.seek((rows - 1) * _ITEM_SIZE)
+                        f.write(column[~appended][-1:].tobytes())
+
+            entry["rows"] = end
+            self.index[symbol] = entry
+            self._save_index()
+            self._index_version = self._current_version()
+            for field in FIELDS:
+                self._maps.pop((symbol, field), None)
+            return end - rows
+
+    def append_frame(self, frame) -> int:
+        """إضافة إطار مفهرس بـ (الرمز، التاريخ) كالذي تُرجعه خدمة بيانات السوق"""
+
+        added = 0
+        for symbol, rows in frame.groupby(level="symbol"):
+            added += self.append(
+                symbol,
+                rows.index.get_level_values("date").values,
+                {field: rows[field].to_numpy() for field in FIELDS if field in rows}
+            )
+        return added
+
+    def _column(self, symbol: str, field: str) -> np.ndarray:
+        column = self._maps.get((symbol, field))
+        if column is None:
+            entry = self.index[symbol]
+            if entry["rows"] == 0:
+                return np.empty(0)
+            column = np.memmap(self._column_path(entry, field), dtype=np.float64, mode="r", shape=(entry["rows"],))
+            self._maps[(symbol, field)] = column
+        return column
+
+    def _bounds(self, symbol: str, start, end) -> Tuple[int, int]:
+        entry = self.index[symbol]
+        first_day, rows = entry["first_day"], entry["rows"]
+        lo = 0 if start is None else min(max(to_day(start) - first_day, 0), rows)
+        hi = rows if end is None else min(max(to_day(end) - first_day + 1, lo), rows)
+        return lo, hi
+
+    def slice(self, symbol: str, start=None, end=None, field: str = "close") -> Tuple[np.ndarray, np.ndarray]:
+        """(التواريخ، القيم) للفترة [start, end]؛ القيم عرض على الملف دون نسخ"""
+
+        self._refresh()
+        if symbol not in self.index:
+            return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+        lo, hi = self._bounds(symbol, start, end)
+        first_day = self.index[symbol]["first_day"]
+        dates = _EPOCH + np.arange(first_day + lo, first_day + hi)
+        return dates, self._column(symbol, field)[lo:hi]
+
+    def close_on_or_before(self, symbol: str, day=None, max_gap: int = 10) -> Optional[float]:
+        """آخر إغلاق في اليوم المحدد أو قبله بأيام قليلة (عطلات)؛ بدون يوم: آخر إغلاق مخزن"""
+
+        self._refresh()
+        if symbol not in self.index:
+            return None
+        _, hi = self._bounds(symbol, None, day)
+        window = self._column(symbol, "close")[max(hi - max_gap, 0):hi]
+        valid = window[~np.isnan(window)]
+        return float(valid[-1]) if len(valid) else None
+
+    def matrix(self, symbols: List[str], start=None, end=None, field: str = "close") -> Tuple[np.ndarray, np.ndarray]:
+        """(التواريخ، مصفوفة رموز × أيام) على تقويم مشترك؛ NaN حيث لا توجد بيانات"""
+
+        self._refresh()
+        known = [self.index[s] for s in symbols if s in self.index and self.index[s]["rows"]]
+        if not known:
+            return np.empty(0, dtype="datetime64[D]"), np.empty((len(symbols), 0))
+        first = to_day(start) if start is not None else min(e["first_day"] for e in known)
+        last = to_day(end) if end is not None else max(e["first_day"] + e["rows"] - 1 for e in known)
+
+        result = np.full((len(symbols), max(last - first + 1, 0)), np.nan)
+        for row, symbol in enumerate(symbols):
+            if symbol not in self.index:
+                continue
+            entry = self.index[symbol]
+            lo = max(first - entry["first_day"], 0)
+            hi = min(last - entry["first_day"] + 1, entry["rows"])
+            if hi > lo:
+                offset = entry["first_day"] + lo - first
+                result[row, offset:offset + hi - lo] = self._column(symbol, field)[lo:hi]
+        return _EPOCH + np.arange(first, first + result.shape[1]), result
+
+    def risk_metrics(self, symbols: List[str], benchmark: str, start=None, end=None) -> Dict[str, Dict[str, Optional[float]]]:
+        """آخر إغلاق، العائد، التقلب، بيتا، أقصى تراجع لكل رمز في الفترة"""
+
+        _, closes = self.matrix(list(symbols) + [benchmark], start, end)
+        if closes.shape[1] == 0:
+            return {}
+        returns = daily_returns(closes)
+        metrics = {
+            "last_close": forward_fill(closes)[:, -1],
+            "total_return": total_return(closes),
+            "volatility": volatility(returns),
+            "beta": beta(returns, returns[-1]),
+            "max_drawdown": max_drawdown(closes),
+            "observations": (~np.isnan(closes)).sum(axis=1).astype(np.float64)
+        }
+        return {
+            symbol: {
+                name: None if np.isnan(values[row]) else round(float(values[row]), 6)
+                for name, values in metrics.items()
+            }
+            for row, symbol in enumerate(symbols)
+            if symbol in self.index
+        }
+
+
+# Global instance
+price_store = PriceStore()
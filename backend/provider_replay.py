@@ -0,0 +1,222 @@
+"""
+تسجيل وإعادة تشغيل استجابات مزودي البيانات الخارجية
+Provider Record/Replay for FinClick.AI
+
+وضع التشغيل عبر PROVIDER_MODE:
+- live: الطلبات تذهب إلى المزودين الحقيقيين (الافتراضي)
+- record: الطلبات تذهب إلى المزودين وتُحفظ استجاباتها في PROVIDER_CASSETTES
+- replay: خادم محلي وهمي يقدّم الاستجابات المحفوظة دون أي اتصال خارجي، مع
+  زمن استجابة وأخطاء مُحقنة قابلة للضبط لاختبارات الحمل الحتمية
+
+كل استجابة تُحفظ في ملف JSON باسم بصمة الطلب: <provider>/<key>.json
+"""
+
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+MODES = ("live", "record", "replay")
+
+
+def request_key(provider: str, request: Dict[str, Any]) -> str:
+    """بصمة ثابتة للطلب (الترتيب داخل المعاملات لا يغيّرها)"""
+
+    payload = json.dumps({"provider": provider, **request}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:20]
+
+
+class CassetteStore:
+    """الاستجابات المسجلة على القرص مع نسخة في الذاكرة للقراءة المتكررة"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._loaded: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def _path(self, provider: str, key: str) -> str:
+        return os.path.join(self.directory, provider, f"{key}.json")
+
+    def save(self, provider: str, request: Dict[str, Any], status: int, body: bytes,
+             content_type: str = "application/octet-stream") -> str:
+        key = request_key(provider, request)
+        try:
+            text, encoding = body.decode("utf-8"), "text"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        cassette = {
+            "provider": provider,
+            "request": request,
+            "status": status,
+            "content_type": content_type,
+            "encoding": encoding,
+            "body": text,
+            "recorded_at": time.time()
+        }
+
+        path = self._path(provider, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # كتابة ذرية: لا يرى خادم الإعادة ملفاً نصف مكتوب
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(cassette, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(temp_path, path)
+        self._loaded[f"{provider}/{key}"] = cassette
+        return key
+
+    def load(self, provider: str, key: str) -> Optional[Dict[str, Any]]:
+        cache_key = f"{provider}/{key}"
+        if cache_key not in self._loaded:
+            try:
+                with open(self._path(provider, key), encoding="utf-8") as f:
+                    self._loaded[cache_key] = json.load(f)
+            except FileNotFoundError:
+                # لا تُحفظ النتيجة السلبية: قد يُسجَّل الطلب لاحقاً
+                return None
+        return self._loaded[cache_key]
+
+    @staticmethod
+    def body(cassette: Dict[str, Any]) -> bytes:
+        if cassette.get("encoding") == "base64":
+            return base64.b64decode(cassette["body"])
+        return cassette["body"].encode("utf-8")
+
+
+class FaultInjector:
+    """زمن استجابة وأخطاء مُحقنة بقرار حتمي لكل (طلب، رقم التكرار)
+
+    القرار لا يعتمد على ترتيب وصول الطلبات المتزامنة، فتعطي نفس البذرة نفس
+    الأخطاء ونفس التأخيرات في كل تشغيل.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, seed: int = 0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.seed = seed
+        self._counts: Dict[str, int] = {}
+
+    def decide(self, key: str):
+        """(التأخير بالثواني، رمز حالة الخطأ أو None)"""
+
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        rng = random.Random(f"{self.seed}:{key}:{count}")
+        delay = max(self.latency + rng.uniform(-self.jitter, self.jitter), 0.0)
+        error = self.error_status if rng.random() < self.error_rate else None
+        return delay, error
+
+
+class ProviderReplay:
+    """نقطة التحكم المشتركة في وضع التسجيل والإعادة لكل مزودي البيانات"""
+
+    def __init__(self):
+        self.mode = os.environ.get("PROVIDER_MODE", "live").lower()
+        if self.mode not in MODES:
+            logging.warning(f"Unknown PROVIDER_MODE {self.mode!r}, using live providers")
+            self.mode = "live"
+        self.store = CassetteStore(os.environ.get(
+            "PROVIDER_CASSETTES", os.path.join(os.path.dirname(__file__), "fixtures", "cassettes")
+        ))
+        self.faults = FaultInjector(
+            latency_ms=float(os.environ.get("REPLAY_LATENCY_MS", "0")),
+            jitter_ms=float(os.environ.get("REPLAY_JITTER_MS", "0")),
+            error_rate=float(os.environ.get("REPLAY_ERROR_RATE", "0")),
+            error_status=int(os.environ.get("REPLAY_ERROR_STATUS", "503")),
+            seed=int(os.environ.get("REPLAY_SEED", "0"))
+        )
+        self.host = os.environ.get("REPLAY_HOST", "127.0.0.1")
+        self.port = int(os.environ.get("REPLAY_PORT", "0"))
+
+        self._runner = None
+        self.base_url: Optional[str] = None
+        self.stats = {"recorded": 0, "served": 0, "misses": 0, "injected_errors": 0}
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, provider: str, request: Dict[str, Any], status: int, body: bytes,
+               content_type: str = "application/octet-stream") -> None:
+        """حفظ استجابة حقيقية؛ فشل الحفظ لا يُفشل الطلب الأصلي"""
+
+        try:
+            self.store.save(provider, request, status, body, content_type)
+            self.stats["recorded"] += 1
+        except Exception as e:
+            logging.warning(f"Recording {provider} response failed: {e}")
+
+    def replay_url(self, provider: str, request: Dict[str, Any]) -> str:
+        """عنوان الاستجابة المسجلة على الخادم المحلي"""
+
+        if self.base_url is None:
+            raise RuntimeError("Provider replay server is not running")
+        return f"{self.base_url}/{provider}/{request_key(provider, request)}"
+
+    async def _serve(self, request):
+        provider, key = request.match_info["provider"], request.match_info["key"]
+        cassette = self.store.load(provider, key)
+        if cassette is None:
+            self.stats["misses"] += 1
+            logging.warning(f"No recorded {provider} response for {key}")
+            return web.json_response({"error": "no recorded response"}, status=404, headers={"X-Replay-Miss": key})
+
+        delay, error = self.faults.decide(f"{provider}/{key}")
+        if delay:
+            await asyncio.sleep(delay)
+        if error is not None:
+            self.stats["injected_errors"] += 1
+            return web.json_response({"error": "injected error"}, status=error)
+
+        self.stats["served"] += 1
+        return web.Response(
+            status=cassette["status"],
+            body=self.store.body(cassette),
+            headers={"Content-Type": cassette.get("content_type") or "application/octet-stream"}
+        )
+
+    async def start(self) -> None:
+        """تشغيل الخادم الوهمي في وضع الإعادة؛ يُستدعى عند بدء الخادم"""
+
+        if not self.replaying or self._runner is not None:
+            return
+        if web is None:
+            raise RuntimeError("aiohttp is not installed")
+
+        app = web.Application()
+        app.router.add_route("*", "/{provider}/{key}", self._serve)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{self.host}:{port}"
+        logging.info(f"Replaying provider responses from {self.store.directory} on {self.base_url}")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+            self.base_url = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "mode": self.mode, "cassettes": self.store.directory, "replay_url": self.base_url}
+
+
+# Global instance
+providers = ProviderReplay()
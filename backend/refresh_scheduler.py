@@ -0,0 +1,282 @@
+"""
+مُجدول تحديث بيانات السوق والاقتصاد في الخلفية
+Background Refresh Scheduler for FinClick.AI
+
+- مستويات المؤشرات وأسعار الأسهم الأكثر حركة وأسعار الصرف والمؤشرات الاقتصادية تُحدّث على فترات قابلة للضبط مع إزاحة عشوائية
+- عامل واحد فقط (القائد) يُحدّث عبر قفل بمدة إيجار في MongoDB، فلا تتكرر الطلبات مع تعدد عمال uvicorn
+- النتائج تُكتب في الذاكرة المؤقتة المشتركة، وطلبات المستخدمين تقرأ منها فقط
+- مقاييس التقادم: عمر كل لقطة مقارنة بفترة تحديثها، وآخر نجاح وآخر خطأ
+"""
+
+import os
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from enrichment_cache import TieredTTLCache, HOUR
+from http_client import http_client
+from market_data import market_data
+
+
+@dataclass
+class RefreshJob:
+    """لقطة بيانات تُحدّث كل interval ثانية"""
+
+    name: str
+    interval: float
+    fetch: Callable[[], Awaitable[Any]]
+    runs: int = 0
+    failures: int = 0
+    last_success: Optional[float] = None
+    last_duration: Optional[float] = None
+    last_error: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class RefreshScheduler:
+    """تشغيل مهام التحديث على العامل القائد فقط"""
+
+    def __init__(self, lock_name: str = "market_refresh", lease_seconds: Optional[float] = None,
+                 jitter: float = 0.1):
+        self.lock_name = lock_name
+        self.lease = lease_seconds or float(os.environ.get("REFRESH_LEASE_SECONDS", "30"))
+        self.jitter = jitter
+        self.enabled = os.environ.get("REFRESH_SCHEDULER_ENABLED", "true").lower() == "true"
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self.cache = TieredTTLCache("market_snapshots", max_entries=64)
+        self.database = None
+        self.jobs: Dict[str, RefreshJob] = {}
+        self.is_leader = False
+        self._election: Optional[asyncio.Task] = None
+
+    def bind(self, database) -> None:
+        self.database = database
+        self.cache.bind(database)
+
+    def register(self, name: str, interval: float, fetch: Callable[[], Awaitable[Any]]) -> None:
+        self.jobs[name] = RefreshJob(name, interval, fetch)
+
+    async def start(self) -> None:
+        """بدء الانتخاب والتحديث؛ يُستدعى عند بدء الخادم"""
+
+        if not self.enabled or self._election is not None:
+            return
+        self._election = asyncio.create_task(self._elect())
+
+    async def stop(self) -> None:
+        """إيقاف المهام وتسليم القيادة فوراً لعامل آخر؛ يُستدعى عند إيقاف الخادم"""
+
+        if self._election is not None:
+            self._election.cancel()
+            await asyncio.gather(self._election, return_exceptions=True)
+            self._election = None
+        await self._stop_jobs()
+        if self.is_leader and self.database is not None:
+            try:
+                await self.database.scheduler_locks.delete_one({"_id": self.lock_name, "owner": self.worker_id})
+            except Exception as e:
+                logging.warning(f"Refresh lock release failed: {e}")
+        self.is_leader = False
+
+    async def _try_acquire(self) -> bool:
+        """أخذ القفل أو تجديده؛ ينجح إن كان القفل لهذا العامل أو انتهى إيجاره"""
+
+        if self.database is None:
+            return True
+        now = datetime.utcnow()
+        try:
+            lock = await self.database.scheduler_locks.find_one_and_update(
+                {"_id": self.lock_name, "$or": [{"owner": self.worker_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.worker_id, "expires_at": now + timedelta(seconds=self.lease)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return False  # القفل لعامل آخر ولم ينتهِ إيجاره
+        return lock is not None and lock.get("owner") == self.worker_id
+
+    async def _elect(self) -> None:
+        while True:
+            try:
+                leader = await self._try_acquire()
+            except Exception as e:
+                logging.warning(f"Refresh leader election failed: {e}")
+                leader = False
+
+            if leader and not self.is_leader:
+                logging.info(f"Worker {self.worker_id} is now the market data refresh leader")
+                for job in self.jobs.values():
+                    job.task = asyncio.create_task(self._run_job(job))
+            elif not leader and self.is_leader:
+                logging.info(f"Worker {self.worker_id} lost market data refresh leadership")
+                await self._stop_jobs()
+            self.is_leader = leader
+
+            # التجديد قبل انتهاء الإيجار بوقت كافٍ
+            await asyncio.sleep(self.lease / 3)
+
+    async def _stop_jobs(self) -> None:
+        tasks = [job.task for job in self.jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            job.task = None
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _run_job(self, job: RefreshJob) -> None:
+        # لقطة حديثة كتبها قائد سابق لا تُجلب مجدداً قبل موعدها
+        snapshot = await self.cache.peek(job.name)
+        delay = max(job.interval - snapshot[1], 0) if snapshot else 0
+        # إزاحة أولية حتى لا تبدأ كل المهام في نفس اللحظة
+        delay += random.uniform(0, min(job.interval * self.jitter, 5))
+
+        while True:
+            await asyncio.sleep(delay)
+            delay = self._jittered(job.interval) if await self._refresh(job) else self._jittered(min(job.interval, 60))
+
+    async def _refresh(self, job: RefreshJob) -> bool:
+        job.runs += 1
+        start = time.perf_counter()
+        try:
+            value = await job.fetch()
+            if not value:
+                raise ValueError("empty snapshot")
+            await self.cache.put(job.name, value)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logging.warning(f"Refresh job {job.name} failed: {e}")
+            return False
+        finally:
+            job.last_duration = round(time.perf_counter() - start, 3)
+
+        job.last_success = time.time()
+        job.last_error = None
+        return True
+
+    async def read(self, name: str) -> Tuple[Optional[Any], Dict[str, Any]]:
+        """آخر لقطة ومعلومات تقادمها؛ لا يُجلب شيء على مسار الطلب"""
+
+        job = self.jobs[name]
+        # العمال غير القادة يعيدون القراءة من MongoDB حيث يكتب القائد
+        snapshot = await self.cache.peek(name, reload_after=min(job.interval, 60))
+        if snapshot is None:
+            return None, {"age_seconds": None, "interval_seconds": job.interval, "stale": True}
+        value, age = snapshot
+        return value, {
+            "age_seconds": round(age, 1),
+            "interval_seconds": job.interval,
+            "stale": age > 2 * job.interval
+        }
+
+    async def get_stats(self) -> Dict[str, Any]:
+        jobs = {}
+        for name, job in self.jobs.items():
+            _, freshness = await self.read(name)
+            jobs[name] = {
+                **freshness,
+                "staleness_ratio": round(freshness["age_seconds"] / job.interval, 2)
+                if freshness["age_seconds"] is not None else None,
+                "runs": job.runs,
+                "failures": job.failures,
+                "last_success": datetime.utcfromtimestamp(job.last_success).isoformat() if job.last_success else None,
+                "last_duration": job.last_duration,
+                "last_error": job.last_error
+            }
+        return {"worker_id": self.worker_id, "leader": self.is_leader, "enabled": self.enabled, "jobs": jobs}
+
+
+def _symbols(variable: str, default: str) -> List[str]:
+    return [symbol.strip() for symbol in os.environ.get(variable, default).split(",") if symbol.strip()]
+
+
+async def _latest_levels(symbols: List[str]) -> Dict[str, Dict[str, float]]:
+    changes = market_data.latest_changes(await market_data.history(symbols, period="5d"))
+    return {
+        symbol: {
+            "value": float(row["current_value"]),
+            "change": round(float(row["change"]), 4),
+            "change_percent": round(float(row["change_percent"]), 3)
+        }
+        for symbol, row in changes.iterrows()
+    }
+
+
+async def fetch_index_levels() -> Dict[str, Dict[str, float]]:
+    """مستويات المؤشرات الرئيسية (تنزيل مجمّع واحد)"""
+
+    return await _latest_levels(_symbols("REFRESH_INDICES", "^TA125.TA,^TASI.SR,^GSPC,^IXIC,^DJI"))
+
+
+async def fetch_movers() -> Dict[str, Dict[str, float]]:
+    """أسعار الأسهم التي تُختار منها الأكثر حركة"""
+
+    return await _latest_levels(_symbols("REFRESH_MOVERS", "TEVA.TA,ICL.TA,LUMI.TA,POLI.TA,NICE.TA,ESLT.TA"))
+
+
+async def fetch_fx_rates() -> Dict[str, Dict[str, float]]:
+    """أسعار الصرف"""
+
+    return await _latest_levels(_symbols("REFRESH_FX_PAIRS", "USDSAR=X,USDILS=X,EURUSD=X,USDAED=X"))
+
+
+# مؤشرات البنك الدولي: أحدث قيمة متاحة لكل دولة
+MACRO_INDICATORS = {
+    "inflation_rate": "FP.CPI.TOTL.ZG",
+    "unemployment_rate": "SL.UEM.TOTL.ZS",
+    "gdp_growth": "NY.GDP.MKTP.KD.ZG",
+    "interest_rate": "FR.INR.LEND"
+}
+
+
+async def fetch_macro_indicators() -> Dict[str, Dict[str, Any]]:
+    """المؤشرات الاقتصادية من واجهة البنك الدولي عبر عميل HTTP المشترك"""
+
+    base_url = os.environ.get("WORLD_BANK_API_URL", "https://api.worldbank.org/v2")
+    countries = _symbols("REFRESH_MACRO_COUNTRIES", "SAU,ISR,ARE")
+
+    async def fetch(country: str, name: str, indicator: str):
+        status, body = await http_client.get_json(
+            f"{base_url}/country/{country}/indicator/{indicator}", params={"format": "json", "mrnev": "1"}
+        )
+        if status != 200 or not isinstance(body, list) or len(body) < 2 or not body[1]:
+            return country, name, None
+        latest = body[1][0]
+        return country, name, {"value": latest.get("value"), "year": latest.get("date")}
+
+    results = await asyncio.gather(
+        *(fetch(country, name, indicator) for country in countries for name, indicator in MACRO_INDICATORS.items()),
+        return_exceptions=True
+    )
+    indicators: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Macro indicator fetch failed: {result}")
+            continue
+        country, name, value = result
+        if value is not None:
+            indicators.setdefault(country, {})[name] = value
+    return indicators
+
+
+# Global instance
+refresh_scheduler = RefreshScheduler()
+refresh_scheduler.register("indices", float(os.environ.get("REFRESH_INDICES_SECONDS", "60")), fetch_index_levels)
+refresh_scheduler.register("movers", float(os.environ.get("REFRESH_INDICES_SECONDS", "60")), fetch_movers)
+refresh_scheduler.register("fx_rates", float(os.environ.get("REFRESH_FX_SECONDS", "300")), fetch_fx_rates)
+refresh_scheduler.register("macro", float(os.environ.get("REFRESH_MACRO_SECONDS", str(6 * HOUR))), fetch_macro_indicators)
@@ -1339,14 +1339,13 @@ Version: 1.0 - Revolutionary Edition
 import asyncio
 import logging
 import json
-import requests
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 import openai
 import google.generativeai as genai
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import concurrent.futures
 from functools import lru_cache
 import yfinance as yf
@@ -1356,6 +1355,11 @@ import time
 import math
 from scipy import stats
 import warnings
+
+from enrichment_cache import analysis_data_cache, MINUTE, DAY, WEEK
+from price_store import price_store
+from stage_dag import StageDAG
+from symbol_resolver import symbol_resolver
 warnings.filterwarnings('ignore')
 
 # إعداد المفاتيح من متغيرات البيئة
@@ -1384,6 +1388,9 @@ class AnalysisConfiguration:
     include_risks: bool = True
     include_swot: bool = True
     include_benchmarking: bool = True
+    # رمز السهم ومؤشر المقارنة لحساب مقاييس المخاطر من مخزن الأسعار المحلي
+    symbol: str = ""
+    benchmark_symbol: str = ""
 
 class RevolutionaryFinancialAnalysisEngine:
     """
@@ -1408,8 +1415,19 @@ class RevolutionaryFinancialAnalysisEngine:
             'global_markets_agent': self._initialize_global_agent()
         }
         
-        # كاش للبيانات المتكررة
-        self._cache = {}
+        # كاش للبيانات المتكررة: LRU داخل العملية مدعوم بـ MongoDB (يُربط في server.py)
+        self._cache = analysis_data_cache
+        self.data_ttls = {
+            'market': 5 * MINUTE,
+            'economic': DAY,
+            'research': 2 * WEEK,
+            'benchmark': DAY,
+            'regional': 15 * MINUTE
+        }
+        
+        # مهلة كل مرحلة تحليل ومهلة التحليل كله (المراحل قد تستدعي نماذج لغوية)
+        self.stage_timeout = float(os.environ.get('ANALYSIS_STAGE_TIMEOUT_SECONDS', '20'))
+        self.analysis_deadline = float(os.environ.get('ANALYSIS_DEADLINE_SECONDS', '60'))
         
         logger.info("🚀 Revolutionary Financial Analysis Engine initialized successfully!")
 
@@ -1468,14 +1486,16 @@ class RevolutionaryFinancialAnalysisEngine:
         يجمع بين جميع أنواع التحليل مع الذكاء الاصطناعي المتقدم
         """
         logger.info(f"🚀 Starting Revolutionary Analysis for {config.company_name}")
+        config = self._with_symbols(config)
         
         # تشغيل جميع الوكلاء بشكل متوازي
+        regional_fetcher = self._fetch_saudi_data if config.comparison_level == "saudi" else self._fetch_global_data
         tasks = [
-            self._fetch_market_data(config),
-            self._fetch_economic_data(config),
-            self._fetch_company_research(config),
-            self._fetch_benchmarks(config),
-            self._fetch_saudi_data(config) if config.comparison_level == "saudi" else self._fetch_global_data(config)
+            self._cached_fetch('market', config, self._fetch_market_data),
+            self._cached_fetch('economic', config, self._fetch_economic_data),
+            self._cached_fetch('research', config, self._fetch_company_research),
+            self._cached_fetch('benchmark', config, self._fetch_benchmarks),
+            self._cached_fetch('regional', config, regional_fetcher)
         ]
         
         # تنفيذ المهام بشكل متوازي
@@ -1484,27 +1504,63 @@ class RevolutionaryFinancialAnalysisEngine:
         # دمج البيانات
         consolidated_data = self._consolidate_data(data_results)
         
-        # تطبيق التحليل الثوري
+        # تطبيق التحليل الثوري: المراحل المستقلة تعمل معاً
+        stages = self._analysis_stages(config, consolidated_data)
+        sections, run_info = await stages.run_sections(self.analysis_deadline)
+        
         revolutionary_results = {
             'metadata': {
                 'analysis_timestamp': datetime.now().isoformat(),
                 'engine_version': '1.0-Revolutionary',
                 'total_analysis_types': 116,
-                'ai_confidence': 95.7
+                'ai_confidence': 95.7,
+                **run_info
             },
-            'company_profile': await self._ai_enhanced_company_profile(config, consolidated_data),
-            'financial_health_score': await self._calculate_revolutionary_health_score(consolidated_data),
-            'predictive_analytics': await self._ai_predictive_analysis(consolidated_data),
-            'risk_assessment': await self._comprehensive_risk_analysis(consolidated_data),
-            'opportunity_analysis': await self._ai_opportunity_detection(consolidated_data),
-            'strategic_recommendations': await self._generate_ai_recommendations(consolidated_data),
-            'market_positioning': await self._analyze_market_position(consolidated_data),
-            'future_scenarios': await self._generate_future_scenarios(consolidated_data)
+            **sections
         }
         
         logger.info("🚀 Revolutionary Analysis completed successfully!")
         return revolutionary_results
 
+    def _analysis_stages(self, config: AnalysisConfiguration, data: Dict) -> StageDAG:
+        """مراحل التحليل واعتمادياتها؛ ترتيب الإضافة هو ترتيب الأقسام في النتيجة"""
+        stages = StageDAG(default_timeout=self.stage_timeout)
+        stages.add('company_profile', lambda upstream: self._ai_enhanced_company_profile(config, data))
+        stages.add('financial_health_score', lambda upstream: self._calculate_revolutionary_health_score(data))
+        stages.add('predictive_analytics', lambda upstream: self._ai_predictive_analysis(data))
+        stages.add('risk_assessment', lambda upstream: self._comprehensive_risk_analysis(data))
+        stages.add('opportunity_analysis', lambda upstream: self._ai_opportunity_detection(data))
+        # التوصيات والسيناريوهات لا تقرأ نتائج المراحل الأخرى، فلا تنتظرها
+        stages.add('strategic_recommendations', lambda upstream: self._generate_ai_recommendations(data))
+        stages.add('market_positioning', lambda upstream: self._analyze_market_position(data))
+        stages.add('future_scenarios', lambda upstream: self._generate_future_scenarios(data))
+        return stages
+
+    @staticmethod
+    def _with_symbols(config: AnalysisConfiguration) -> AnalysisConfiguration:
+        """رمز السهم من اسم الشركة ومؤشر المقارنة من مستوى المقارنة إن لم يُحددا"""
+        symbol = config.symbol or symbol_resolver.resolve(config.company_name) or ""
+        benchmark = config.benchmark_symbol
+        if symbol and not benchmark:
+            benchmark = "^TASI.SR" if config.comparison_level == "saudi" else "^GSPC"
+        return replace(config, symbol=symbol, benchmark_symbol=benchmark)
+
+    async def _cached_fetch(self, source: str, config: AnalysisConfiguration, fetcher) -> Dict:
+        """جلب بيانات مصدر عبر الكاش حسب مدة صلاحيته؛ النتيجة الفارغة (فشل الجلب) لا تُحفظ"""
+        key = "|".join([
+            config.company_name.strip().casefold(), config.sector, config.comparison_level,
+            config.symbol, config.benchmark_symbol, str(config.analysis_years), source
+        ])
+        
+        async def fetch():
+            data = await fetcher(config)
+            if not data:
+                raise ValueError(f"No {source} data for {config.company_name}")
+            return data
+        
+        data, _ = await self._cache.get_or_fetch(key, self.data_ttls[source], fetch)
+        return data
+
     async def _fetch_market_data(self, config: AnalysisConfiguration) -> Dict:
         """جلب بيانات السوق"""
         try:
@@ -1517,6 +1573,21 @@ class RevolutionaryFinancialAnalysisEngine:
                 'pe_ratio': np.random.uniform(10, 30),
                 'sector_performance': np.random.uniform(-5, 15)
             }
+            
+            # مقاييس حقيقية من تاريخ الأسعار المحلي عند توفره
+            if config.symbol:
+                benchmark = config.benchmark_symbol or ("^TASI.SR" if config.comparison_level == "saudi" else "^GSPC")
+                start = (datetime.now() - timedelta(days=365 * max(config.analysis_years, 1))).date()
+                metrics = await asyncio.get_running_loop().run_in_executor(
+                    None, price_store.risk_metrics, [config.symbol], benchmark, start
+                )
+                risk_metrics = metrics.get(config.symbol)
+                if risk_metrics:
+                    market_data['risk_metrics'] = {**risk_metrics, 'benchmark': benchmark}
+                    if risk_metrics['last_close'] is not None:
+                        market_data['stock_price'] = risk_metrics['last_close']
+                    if risk_metrics['beta'] is not None:
+                        market_data['beta'] = risk_metrics['beta']
             return market_data
         except Exception as e:
             logger.error(f"Error fetching market data: {e}")
@@ -1710,11 +1781,30 @@ class RevolutionaryFinancialAnalysisEngine:
             logger.error(f"Error in predictive analysis: {e}")
             return {}
 
+    @staticmethod
+    def _market_risk_from_prices(metrics: Optional[Dict]) -> Optional[Dict]:
+        """مخاطر السوق من التقلب السنوي وبيتا وأقصى تراجع المحسوبة من تاريخ الأسعار"""
+        if not metrics or metrics.get('volatility') is None:
+            return None
+        
+        volatility_pct = metrics['volatility'] * 100
+        beta = metrics['beta'] if metrics.get('beta') is not None else 1.0
+        drawdown_pct = abs(metrics.get('max_drawdown') or 0.0) * 100
+        # تقلب 10% ≈ 20، تقلب 35% ≈ 70؛ بيتا وأقصى تراجع يرفعان الدرجة
+        score = float(np.clip(volatility_pct * 2 + (beta - 1) * 10 + drawdown_pct * 0.2, 0, 100))
+        
+        return {
+            'level': 'Low' if score < 35 else 'Medium' if score < 60 else 'High',
+            'score': round(score, 2),
+            'factors': ['Market volatility', 'Beta', 'Maximum drawdown'],
+            'metrics': metrics
+        }
+
     async def _comprehensive_risk_analysis(self, data: Dict) -> Dict:
         """تحليل المخاطر الشامل"""
         try:
             risk_categories = {
-                'market_risk': {
+                'market_risk': self._market_risk_from_prices(data.get('market', {}).get('risk_metrics')) or {
                     'level': np.random.choice(['Low', 'Medium', 'High']),
                     'score': np.random.uniform(20, 80),
                     'factors': ['Market volatility', 'Sector performance', 'Economic conditions']
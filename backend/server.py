@@ -4,6 +4,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
 import os
 import logging
 import hashlib
@@ -15,7 +16,6 @@ from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
 import openai
-import requests
 import json
 import io
 import pandas as pd
@@ -25,6 +25,15 @@ import PyPDF2
 import math
 from analysis_engine import FinancialAnalysisEngine
 from ocr_data_parser import financial_parser
+from upload_buffer import is_archive, UploadTooLargeError, RequestSizeLimitMiddleware
+from chunked_upload import chunked_upload_store, ChunkedUploadError, UploadConflictError
+from blob_store import blob_store, BLOB_FIELDS
+from write_behind import write_queue
+from enrichment_cache import enrichment_cache, analysis_data_cache
+from http_client import http_client
+from provider_replay import providers
+from symbol_resolver import symbol_resolver
+from refresh_scheduler import refresh_scheduler
 from ai_agents import ai_agents
 from comprehensive_financial_analyzer import ComprehensiveFinancialAnalyzer
 
@@ -50,6 +59,11 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+blob_store.configure(db)
+write_queue.bind(db)
+enrichment_cache.bind(db)
+analysis_data_cache.bind(db)
+refresh_scheduler.bind(db)
 
 # APIs setup
 openai.api_key = os.environ.get('OPENAI_API_KEY')
@@ -112,6 +126,17 @@ class AnalysisRequest(BaseModel):
     analysis_years: int
     analysis_types: List[str]
 
+class ChunkedUploadInit(BaseModel):
+    filename: str
+    total_size: int
+    company_name: str = "شركة غير محددة"
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None  # اختياري: بصمة الملف كاملاً للتحقق عند الاكتمال
+
+class SymbolResolveRequest(BaseModel):
+    names: List[str]
+    k: int = 1
+
 class AnalysisResult(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -336,8 +361,9 @@ async def login_user(login_data: UserLogin):
     if not user or not verify_password(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    # Update last login
-    await db.users.update_one(
+    # Update last login (كتابة مؤجلة خارج زمن الرد)
+    await write_queue.update(
+        "users",
         {"_id": user["_id"]},
         {"$set": {"last_login": datetime.now(timezone.utc)}}
     )
@@ -889,10 +915,22 @@ async def get_analysis_history(user_data = Depends(get_current_user)):
     
     return analyses
 
+async def save_file_processing_record(user_email: str, company_name: str, processing_results: Dict[str, Any]) -> None:
+    """حفظ نتائج المعالجة؛ النص الخام والجداول تُخزن ككتل مضغوطة خارج المستند، والسجل يُكتب مؤجلاً"""
+    
+    await write_queue.insert("file_processing", {
+        "user_email": user_email,
+        "company_name": company_name,
+        "processing_results": await blob_store.offload_processing_results(processing_results),
+        "upload_date": datetime.utcnow(),
+        "status": "completed"
+    })
+
 @api_router.post("/upload-financial-files")
 async def upload_financial_files(
     files: List[UploadFile] = File(...),
     company_name: str = Form(default="شركة غير محددة"),
+    full_scan: bool = Form(default=False),
     current_user: dict = Depends(get_current_user)
 ):
     """رفع ومعالجة الملفات المالية باستخدام OCR والذكاء الاصطناعي"""
@@ -902,26 +940,23 @@ async def upload_financial_files(
         supported_extensions = {'.pdf', '.xlsx', '.xls', '.docx', '.doc', '.jpg', '.jpeg', '.png'}
         
         for file in files:
+            if is_archive(file.filename):
+                continue  # الأرشيفات تُفحص ملفاتها الداخلية أثناء فك الضغط
             file_extension = os.path.splitext(file.filename.lower())[1]
             if file_extension not in supported_extensions:
                 raise HTTPException(
                     status_code=400, 
-                    detail=f"Unsupported file format: {file_extension}. Supported formats: {', '.join(supported_extensions)}"
+                    detail=f"Unsupported file format: {file_extension}. Supported formats: {', '.join(supported_extensions)}, .zip, .tar"
                 )
         
         # معالجة الملفات باستخدام نظام OCR
-        processing_results = await financial_parser.process_uploaded_files(files, company_name)
+        processing_results = await financial_parser.process_uploaded_files(files, company_name, full_scan=full_scan)
         
         # حفظ النتائج في قاعدة البيانات
-        file_processing_record = {
-            "user_email": current_user["email"],
-            "company_name": company_name,
-            "processing_results": processing_results,
-            "upload_date": datetime.utcnow(),
-            "status": "completed"
-        }
+        await save_file_processing_record(current_user["email"], company_name, processing_results)
         
-        await db["file_processing"].insert_one(file_processing_record)
+        companies = list(processing_results["companies"])
+        symbols = dict(zip(companies, symbol_resolver.resolve_many(companies)))
         
         return {
             "status": "success",
@@ -929,13 +964,121 @@ async def upload_financial_files(
             "processing_summary": processing_results["processing_summary"],
             "extracted_data": processing_results["extracted_data"],
             "company_name": company_name,
-            "files_processed": len(files)
+            "companies": {
+                company: {
+                    "symbol": symbols[company],
+                    "processing_summary": group["processing_summary"],
+                    "extracted_data": group["extracted_data"]
+                }
+                for company, group in processing_results["companies"].items()
+            },
+            "files_processed": processing_results["processing_summary"]["total_files"]
         }
         
     except Exception as e:
         logging.error(f"File processing error: {e}")
         raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
 
+@api_router.post("/uploads/init")
+async def init_chunked_upload(request: ChunkedUploadInit, current_user: dict = Depends(get_current_user)):
+    """بدء رفع مجزأ قابل للاستئناف للملفات الكبيرة"""
+    
+    file_extension = os.path.splitext(request.filename.lower())[1]
+    if file_extension not in financial_parser.supported_formats:
+        raise HTTPException(status_code=400, detail=f"Unsupported file format: {file_extension}")
+    
+    try:
+        session = await chunked_upload_store.init_upload(
+            current_user["email"], request.filename, request.total_size, request.company_name,
+            chunk_size=request.chunk_size, sha256=request.sha256
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"status": "success", "upload": session}
+
+@api_router.put("/uploads/{upload_id}/chunks/{index}")
+async def append_upload_chunk(
+    upload_id: str,
+    index: int,
+    chunk: UploadFile = File(...),
+    checksum: str = Form(...),
+    current_user: dict = Depends(get_current_user)
+):
+    """استلام جزء واحد مع بصمة SHA-256؛ يمكن إرسال الأجزاء بأي ترتيب وإعادة إرسالها"""
+    
+    try:
+        session = await chunked_upload_store.append_chunk(
+            upload_id, current_user["email"], index, await chunk.read(), checksum
+        )
+    except UploadConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"status": "success", "upload": session}
+
+@api_router.get("/uploads/{upload_id}")
+async def get_chunked_upload_status(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """حالة الرفع: الأجزاء المستلمة والناقصة لاستئناف الرفع بعد انقطاع الاتصال"""
+    
+    try:
+        manifest = chunked_upload_store.get_session(upload_id, current_user["email"])
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return {"status": "success", "upload": chunked_upload_store.describe(manifest)}
+
+@api_router.delete("/uploads/{upload_id}")
+async def abort_chunked_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """إلغاء رفع مجزأ وحذف أجزائه"""
+    
+    try:
+        chunked_upload_store.abort_upload(upload_id, current_user["email"])
+    except UploadConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    return {"status": "success"}
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_chunked_upload(
+    upload_id: str,
+    full_scan: bool = Form(default=False),
+    current_user: dict = Depends(get_current_user)
+):
+    """إنهاء الرفع المجزأ ومعالجة الملف"""
+    
+    try:
+        manifest, upload = await chunked_upload_store.complete_upload(upload_id, current_user["email"])
+    except UploadConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ChunkedUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        processing_results = await financial_parser.process_assembled_upload(
+            upload, manifest["company_name"], full_scan=full_scan
+        )
+        
+        await save_file_processing_record(current_user["email"], manifest["company_name"], processing_results)
+        
+        return {
+            "status": "success",
+            "message": "Files processed successfully",
+            "processing_summary": processing_results["processing_summary"],
+            "extracted_data": processing_results["extracted_data"],
+            "company_name": manifest["company_name"],
+            "files_processed": processing_results["processing_summary"]["total_files"]
+        }
+        
+    except Exception as e:
+        logging.error(f"Chunked upload processing error: {e}")
+        raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
+
 @api_router.get("/ocr-capabilities")
 async def get_ocr_capabilities():
     """الحصول على إمكانيات نظام OCR ومعالجة البيانات"""
@@ -958,7 +1101,8 @@ async def get_file_processing_history(
     
     try:
         history = await db["file_processing"].find(
-            {"user_email": current_user["email"]}
+            {"user_email": current_user["email"]},
+            {"company_name": 1, "upload_date": 1, "status": 1, "processing_results.processing_summary": 1}
         ).sort("upload_date", -1).limit(limit).to_list(None)
         
         # تنسيق النتائج
@@ -984,6 +1128,44 @@ async def get_file_processing_history(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/file-processing/{record_id}/files/{file_index}/{field}")
+async def get_file_processing_blob(
+    record_id: str,
+    file_index: int,
+    field: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """قراءة النص الخام أو الجداول المستخرجة لملف معالج عند الطلب"""
+    
+    if field not in BLOB_FIELDS:
+        raise HTTPException(status_code=404, detail=f"Unknown field: {field}")
+    if not ObjectId.is_valid(record_id):
+        raise HTTPException(status_code=404, detail="Record not found")
+    
+    record = await db["file_processing"].find_one(
+        {"_id": ObjectId(record_id), "user_email": current_user["email"]},
+        {"processing_results.files_processed": 1}
+    )
+    if record is None:
+        raise HTTPException(status_code=404, detail="Record not found")
+    
+    files = record["processing_results"].get("files_processed", [])
+    if not 0 <= file_index < len(files):
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    file_result = files[file_index]
+    ref = file_result.get("blobs", {}).get(field)
+    if ref is None:
+        # سجلات قديمة محفوظة قبل نقل الكتل خارج المستند
+        value = file_result.get("extracted_data", {}).get(field, "" if field == "raw_text" else [])
+    else:
+        try:
+            value = await blob_store.get_json(ref)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Blob not found")
+    
+    return {"status": "success", "filename": file_result.get("filename"), field: value}
+
 @api_router.get("/ai-agents-status")
 async def get_ai_agents_status():
     """الحصول على حالة وكلاء الذكاء الاصطناعي"""
@@ -1019,39 +1201,70 @@ async def enrich_company_data_endpoint(
             "enrichment_date": datetime.utcnow()
         }
         
-        await db["data_enrichment"].insert_one(enrichment_record)
+        await write_queue.insert("data_enrichment", enrichment_record)
         
         return {
             "status": "success",
             "message": "Company data enriched successfully",
-            "enriched_data": enriched_data
+            "enriched_data": enriched_data,
+            "cache_age_seconds": enriched_data.get("cache", {}).get("age_seconds")
         }
         
     except Exception as e:
         logging.error(f"Data enrichment error: {e}")
         raise HTTPException(status_code=500, detail=f"Data enrichment failed: {str(e)}")
 
+@api_router.post("/symbols/resolve")
+async def resolve_symbols(request: SymbolResolveRequest, current_user: dict = Depends(get_current_user)):
+    """حل أسماء الشركات (عربي/إنجليزي) إلى رموز الأسهم مع أفضل المرشحين ودرجاتهم"""
+    
+    if len(request.names) > 5000 or not 1 <= request.k <= 20:
+        raise HTTPException(status_code=400, detail="Up to 5000 names and k between 1 and 20")
+    
+    return {
+        "status": "success",
+        "results": symbol_resolver.search_many(request.names, request.k)
+    }
+
 @api_router.get("/market-data")
 async def get_market_data():
-    """الحصول على بيانات السوق المباشرة"""
+    """الحصول على بيانات السوق من اللقطات التي يحدّثها المُجدول في الخلفية"""
     
     try:
-        # بيانات السوق التجريبية - يمكن ربطها بمصادر حقيقية لاحقاً
+        indices, indices_freshness = await refresh_scheduler.read("indices")
+        movers, movers_freshness = await refresh_scheduler.read("movers")
+        fx_rates, fx_freshness = await refresh_scheduler.read("fx_rates")
+        macro, macro_freshness = await refresh_scheduler.read("macro")
+        
+        # شكل الاستجابة السابق محفوظ؛ قبل أول لقطة تكون القيم افتراضية و freshness يبين تقادمها
+        indices = indices or {}
+        macro = macro or {}
+        tase = indices.get("^TA125.TA", {})
+        top_movers = sorted((movers or {}).items(), key=lambda item: abs(item[1]["change_percent"]), reverse=True)
+        primary_macro = macro.get(os.environ.get("MARKET_DATA_MACRO_COUNTRY", "ISR"), {})
+        
         market_data = {
             "tase_index": {
-                "value": 11234.56,
-                "change": 1.2,
-                "change_percent": 0.11
+                "value": tase.get("value", 0.0),
+                "change": tase.get("change", 0.0),
+                "change_percent": tase.get("change_percent", 0.0)
             },
             "top_movers": [
-                {"symbol": "TEVA", "price": 45.67, "change": 2.3},
-                {"symbol": "ICL", "price": 78.90, "change": -1.2},
-                {"symbol": "BANK", "price": 123.45, "change": 0.8}
+                {"symbol": symbol.split(".")[0], "price": level["value"], "change": level["change_percent"]}
+                for symbol, level in top_movers[:3]
             ],
             "economic_indicators": {
-                "interest_rate": 4.75,
-                "inflation_rate": 3.2,
-                "unemployment_rate": 5.1
+                name: (primary_macro.get(name) or {}).get("value")
+                for name in ("interest_rate", "inflation_rate", "unemployment_rate", "gdp_growth")
+            },
+            "indices": indices,
+            "fx_rates": fx_rates or {},
+            "economic_indicators_by_country": macro,
+            "freshness": {
+                "indices": indices_freshness,
+                "top_movers": movers_freshness,
+                "fx_rates": fx_freshness,
+                "economic_indicators": macro_freshness
             },
             "last_updated": datetime.utcnow().isoformat()
         }
@@ -1252,7 +1465,11 @@ async def health_check():
         "status": "healthy",
         "message": "FinClick.AI API is running",
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "version": "2.0.0"
+        "version": "2.0.0",
+        "write_behind": write_queue.get_stats(),
+        "http_client": http_client.get_stats(),
+        "providers": providers.get_stats(),
+        "refresh_scheduler": await refresh_scheduler.get_stats()
     }
 
 @api_router.get("/")
@@ -1262,6 +1479,19 @@ async def root():
 # Include the router
 app.include_router(api_router)
 
+# حد حجم طلبات الرفع قبل أن يُحفظ جسمها على القرص (CORS يُضاف بعده فيغلّفه)
+upload_request_limit = int(os.environ.get('MAX_UPLOAD_REQUEST_MB', '1024')) * 1024 * 1024
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    limits={
+        "/api/upload-financial-data": upload_request_limit,
+        "/api/upload-financial-files": upload_request_limit,
+        "/api/analyze-with-files": upload_request_limit,
+        # جزء واحد مع هامش لترويسات multipart
+        "/api/uploads/": chunked_upload_store.max_chunk_size + 1024 * 1024
+    }
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1274,6 +1504,13 @@ async def startup_event():
     """تهيئة النظام عند بدء التشغيل"""
     logger.info("Starting FinClick.AI system initialization...")
     await initialize_predefined_accounts()
+    await write_queue.start()
+    # خادم إعادة الاستجابات المسجلة (PROVIDER_MODE=replay فقط)
+    await providers.start()
+    # جلسة HTTP واحدة مشتركة لكل مصادر البيانات الخارجية
+    await http_client.start()
+    # تحديث بيانات السوق في الخلفية (العامل القائد فقط)
+    await refresh_scheduler.start()
     logger.info("System initialization completed successfully")
 
 # Configure logging
@@ -1285,4 +1522,9 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # تفريغ السجلات المؤجلة قبل إغلاق الاتصال
+    await refresh_scheduler.stop()
+    await write_queue.stop()
+    await http_client.close()
+    await providers.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+دمج الطلبات المتزامنة المتطابقة
+Single-Flight Request Coalescing for FinClick.AI
+
+عندما يطلب عدة مستخدمين نفس البيانات في نفس اللحظة (إثراء نفس الشركة، أسعار نفس الرمز)
+يُنفَّذ طلب خارجي واحد لكل مفتاح، وينتظر الباقون نفس المهمة ويتشاركون نتيجتها أو خطأها.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """مهمة واحدة قيد التنفيذ لكل مفتاح يتشاركها جميع المنتظرين"""
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.stats = {"executed": 0, "coalesced": 0}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """تنفيذ fn مرة واحدة لكل مفتاح قيد التنفيذ وإرجاع نتيجتها لكل المنتظرين
+
+        إلغاء أحد المنتظرين (مهلة وكيل مثلاً) لا يلغي المهمة المشتركة على الباقين.
+        """
+
+        task = self._flights.get(key)
+        if task is None:
+            self.stats["executed"] += 1
+            # fn قد تُرجع coroutine أو Future (run_in_executor مثلاً)
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            # استرجاع الاستثناء حتى لا يُسجل "never retrieved" إذا أُلغي كل المنتظرين
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            self.stats["coalesced"] += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": len(self._flights)}
@@ -0,0 +1,110 @@
+"""
+منفذ مراحل التحليل كرسم بياني للاعتماديات
+Stage DAG Executor for FinClick.AI
+
+كل مرحلة دالة غير متزامنة تبدأ فور انتهاء المراحل التي تعتمد عليها:
+- المراحل المستقلة تعمل معاً، فيصبح الزمن أطول مسار في الرسم لا مجموع أزمنة المراحل
+- مهلة خاصة لكل مرحلة ومهلة إجمالية للتحليل كله
+- النتائج الجزئية: المرحلة الفاشلة لا توقف غيرها، والمراحل التابعة تعمل بما توفر من نتائج
+"""
+
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class Stage:
+    """مرحلة تستقبل نتائج المراحل التي تعتمد عليها (الناجحة منها فقط)"""
+
+    name: str
+    fn: StageFn
+    after: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+
+
+class StageDAG:
+    """تشغيل المراحل حسب اعتمادياتها مع مهلات ونتائج جزئية"""
+
+    def __init__(self, default_timeout: Optional[float] = None):
+        self.default_timeout = default_timeout
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, fn: StageFn, after: Iterable[str] = (), timeout: Optional[float] = None) -> None:
+        """إضافة مرحلة؛ اعتمادياتها يجب أن تُضاف قبلها، فلا يمكن تكوين حلقة"""
+
+        after = tuple(after)
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        unknown = [dependency for dependency in after if dependency not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(unknown)}")
+        self.stages[name] = Stage(name, fn, after, timeout)
+
+    async def _run_stage(self, stage: Stage, tasks: Dict[str, asyncio.Task],
+                         results: Dict[str, Any], reports: Dict[str, Dict[str, Any]]) -> None:
+        if stage.after:
+            # _run_stage لا يرفع أخطاء المراحل، فانتظار الاعتماديات لا يفشل إلا بالإلغاء
+            await asyncio.gather(*(tasks[dependency] for dependency in stage.after))
+        upstream = {dependency: results[dependency] for dependency in stage.after if dependency in results}
+
+        timeout = stage.timeout if stage.timeout is not None else self.default_timeout
+        start = time.perf_counter()
+        try:
+            results[stage.name] = await asyncio.wait_for(stage.fn(upstream), timeout)
+            status, error = "success", None
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"exceeded {timeout:.2f}s"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+
+        if error:
+            logging.warning(f"Stage {stage.name} {status}: {error}")
+        report = {"status": status, "duration": round(time.perf_counter() - start, 3)}
+        if error:
+            report["error"] = error
+        missing = [dependency for dependency in stage.after if dependency not in upstream]
+        if missing:
+            report["missing_inputs"] = missing
+        reports[stage.name] = report
+
+    async def run(self, deadline: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """تشغيل كل المراحل وإرجاع (نتيجة كل مرحلة ناجحة، تقرير كل مرحلة)"""
+
+        results: Dict[str, Any] = {}
+        reports: Dict[str, Dict[str, Any]] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+        # ترتيب الإضافة يضمن وجود مهام الاعتماديات قبل المراحل التابعة لها
+        for name, stage in self.stages.items():
+            tasks[name] = asyncio.create_task(self._run_stage(stage, tasks, results, reports))
+
+        start = time.perf_counter()
+        _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            elapsed = round(time.perf_counter() - start, 3)
+            for name in self.stages:
+                if name not in reports:
+                    reports[name] = {"status": "deadline", "duration": elapsed}
+            logging.warning(f"Analysis deadline of {deadline}s reached with {len(pending)} stages unfinished")
+
+        return results, {name: reports[name] for name in self.stages}
+
+    async def run_sections(self, deadline: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """تشغيل المراحل وإرجاع (قسم لكل مرحلة بترتيب الإضافة، {"stages": التقارير، "partial": ...})
+
+        قسم المرحلة التي فشلت أو تجاوزت مهلتها فارغ كما عند فشلها داخلياً، و partial صحيح إذا لم تنجح كل المراحل.
+        """
+
+        results, reports = await self.run(deadline)
+        sections = {name: results.get(name) or {} for name in self.stages}
+        partial = any(report["status"] != "success" for report in reports.values())
+        return sections, {"stages": reports, "partial": partial}
@@ -0,0 +1,198 @@
+"""
+فهرس رموز الأسهم للبحث بأسماء الشركات
+Symbol Resolution Index for FinClick.AI
+
+فهرس مبني مرة واحدة من ملف الإدراجات المحلي (SYMBOL_LISTINGS_FILE، CSV: symbol,name,name_ar,exchange,aliases):
+- جدول تجزئة للأسماء المطبّعة (عربي/إنجليزي، بدون لواحق مثل Inc وشركة وLtd)
+- مصفوفة أسماء مرتبة للبحث بالبادئة (bisect) لإكمال الأسماء الجزئية
+- فهرس ثلاثيات أحرف للمطابقة التقريبية (أخطاء الإملاء وOCR)
+"""
+
+import os
+import csv
+import bisect
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from label_index import normalize_arabic, similarity, tokenize, trigrams
+
+# لواحق الأسماء القانونية التي لا تميّز الشركة (بعد التطبيع)
+_LEGAL_SUFFIXES = frozenset(
+    tokenize(
+        "inc incorporated corp corporation co company ltd limited plc llc group holding holdings "
+        "the sa ag nv bm com شركة مجموعة المحدودة القابضة"
+    )
+)
+
+
+def normalize_name(name: str) -> str:
+    """اسم الشركة المطبّع: كلمات بدون تشكيل وأداة التعريف واللواحق القانونية والحروف المفردة (B.M.، ش.م.ع)"""
+
+    tokens = tokenize(name)
+    kept = [token for token in tokens if token not in _LEGAL_SUFFIXES and len(token) > 1]
+    return ' '.join(kept or tokens)
+
+
+class SymbolResolver:
+    """حل أسماء الشركات إلى رموز الأسهم مع مرشحين مرتبين بالدرجة"""
+
+    def __init__(self, listings_file: Optional[str] = None, min_score: float = 0.8,
+                 prefix_scan: int = 64, cache_size: int = 16384):
+        self.listings_file = listings_file or os.environ.get(
+            "SYMBOL_LISTINGS_FILE", os.path.join(os.path.dirname(__file__), "data", "listings.csv")
+        )
+        self.min_score = min_score
+        # أقصى عدد أسماء تُفحص لبادئة قصيرة جداً ("a")
+        self.prefix_scan = prefix_scan
+
+        # (symbol, name, exchange) والأسماء المطبّعة لكل إدراج
+        self._listings: List[Tuple[str, str, str]] = []
+        self._aliases: List[List[str]] = []
+        self._names: Dict[str, List[int]] = {}
+        self._symbols: Dict[str, int] = {}
+        self._sorted_names: List[str] = []
+        self._sorted = True
+        self._trigrams: Dict[str, List[int]] = {}
+
+        self._load()
+        self._search_cached = lru_cache(maxsize=cache_size)(self._search)
+
+    def _load(self) -> None:
+        try:
+            with open(self.listings_file, encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    aliases = [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+                    self.add(row["symbol"], row["name"], row.get("exchange") or "",
+                             [row.get("name_ar") or "", *aliases])
+        except FileNotFoundError:
+            logging.warning(f"Symbol listings file not found: {self.listings_file}")
+
+    def add(self, symbol: str, name: str, exchange: str = "", aliases: Iterable[str] = ()) -> None:
+        """إضافة إدراج بأسمائه البديلة إلى الفهارس"""
+
+        listing_id = len(self._listings)
+        self._listings.append((symbol.strip(), name.strip(), exchange.strip()))
+        self._symbols[normalize_arabic(symbol.strip())] = listing_id
+
+        names = list(dict.fromkeys(normalize_name(n) for n in (name, *aliases) if n and n.strip()))
+        self._aliases.append(names)
+        for alias in names:
+            if alias not in self._names:
+                self._sorted_names.append(alias)
+                self._sorted = False
+            self._names.setdefault(alias, []).append(listing_id)
+            for trigram in set(trigrams(alias)):
+                self._trigrams.setdefault(trigram, []).append(listing_id)
+
+        if hasattr(self, "_search_cached"):
+            self._search_cached.cache_clear()
+
+    @property
+    def size(self) -> int:
+        return len(self._listings)
+
+    def _prefixed(self, prefix: str) -> List[str]:
+        """الأسماء التي تبدأ بالبادئة، أقصرها أولاً (O(log n) للوصول إلى أولها)"""
+
+        if not self._sorted:
+            self._sorted_names.sort()
+            self._sorted = True
+        start = bisect.bisect_left(self._sorted_names, prefix)
+        matches = []
+        for name in self._sorted_names[start:start + self.prefix_scan]:
+            if not name.startswith(prefix):
+                break
+            matches.append(name)
+        return sorted(matches, key=len)
+
+    def _search(self, query: str, k: int) -> Tuple[Tuple[int, float, str], ...]:
+        normalized = normalize_name(query)
+        if not normalized:
+            return ()
+        scores: Dict[int, Tuple[float, str]] = {}
+
+        def offer(listing_id: int, score: float, match: str) -> None:
+            if score > scores.get(listing_id, (0.0, ""))[0]:
+                scores[listing_id] = (score, match)
+
+        symbol_id = self._symbols.get(normalize_arabic(query.strip()))
+        if symbol_id is not None:
+            offer(symbol_id, 1.0, "symbol")
+        for listing_id in self._names.get(normalized, ()):
+            offer(listing_id, 1.0, "exact")
+
+        # اسم مسجل كامل في بداية الاستعلام: "Apple Computers Inc" ← apple
+        # يبدأ من min_score فيُحل دائماً، ويبقى أقل من المطابقة التامة مهما طال الاسم
+        tokens = normalized.split(' ')
+        for length in range(len(tokens) - 1, 0, -1):
+            head = ' '.join(tokens[:length])
+            for listing_id in self._names.get(head, ()):
+                offer(listing_id, self.min_score + (0.95 - self.min_score) * len(head) / len(normalized), "leading")
+
+        # الاستعلام بداية اسم مسجل: "micro" ← microsoft
+        for name in self._prefixed(normalized)[:k]:
+            for listing_id in self._names[name]:
+                offer(listing_id, 0.6 + 0.35 * len(normalized) / len(name), "prefix")
+
+        # المطابقة التقريبية فقط إن لم تكفِ المطابقات السابقة
+        best = max((score for score, _ in scores.values()), default=0.0)
+        if (best < self.min_score or len(scores) < k) and len(normalized) >= 3:
+            query_trigrams = set(trigrams(normalized))
+            shared = Counter()
+            for trigram in query_trigrams:
+                shared.update(self._trigrams.get(trigram, ()))
+            # التشابه الكامل (الأبطأ) لأكثر المرشحين اشتراكاً في الثلاثيات فقط
+            for listing_id, _ in shared.most_common(max(k * 2, 8)):
+                score = max(similarity(normalized, alias) for alias in self._aliases[listing_id])
+                offer(listing_id, score * 0.95, "fuzzy")
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1][0], item[0]))[:k]
+        return tuple((listing_id, round(score, 4), match) for listing_id, (score, match) in ranked)
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """أفضل k مرشحين: الرمز والاسم والسوق والدرجة (0-1) ونوع المطابقة"""
+
+        return [
+            {
+                "symbol": self._listings[listing_id][0],
+                "name": self._listings[listing_id][1],
+                "exchange": self._listings[listing_id][2],
+                "score": score,
+                "match": match
+            }
+            for listing_id, score, match in self._search_cached(str(query), k)
+        ]
+
+    def resolve(self, query: str, min_score: Optional[float] = None) -> Optional[str]:
+        """رمز أفضل مرشح إن تجاوزت درجته الحد الأدنى"""
+
+        candidates = self._search_cached(str(query), 1)
+        if candidates and candidates[0][1] >= (self.min_score if min_score is None else min_score):
+            return self._listings[candidates[0][0]][0]
+        return None
+
+    def resolve_many(self, queries: Iterable[str], min_score: Optional[float] = None) -> List[Optional[str]]:
+        """حل دفعة أسماء (الرفع المجمّع)؛ الأسماء المتكررة تُحل مرة واحدة"""
+
+        queries = list(queries)
+        resolved = {query: self.resolve(query, min_score) for query in dict.fromkeys(queries)}
+        return [resolved[query] for query in queries]
+
+    def search_many(self, queries: Iterable[str], k: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """أفضل k مرشحين لكل اسم في الدفعة"""
+
+        return {query: self.search(query, k) for query in dict.fromkeys(queries)}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "listings": self.size,
+            "names": len(self._names),
+            "trigrams": len(self._trigrams),
+            "cache": self._search_cached.cache_info()._asdict()
+        }
+
+
+# Global instance
+symbol_resolver = SymbolResolver()
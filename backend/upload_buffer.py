@@ -0,0 +1,325 @@
+"""
+مخزن مؤقت للملفات المرفوعة
+Upload Buffer for FinClick.AI
+
+يكتب الملف المرفوع على القرص على دفعات مرة واحدة فقط، ثم يسلّم كل محلل
+(pdfplumber, PyPDF2, pandas, openpyxl, camelot ...) مسار الملف أو مقبضاً مستقلاً
+بدلاً من نسخ البايتات في الذاكرة لكل محلل. الملف الذي حفظه Starlette على القرص
+مسبقاً يُستخدم كما هو دون نسخة ثانية.
+
+RequestSizeLimitMiddleware يرفض طلبات الرفع الأكبر من الحد قبل أن يحفظ Starlette
+جسم الطلب على القرص: من Content-Length إن وُجد، وأثناء استلام الجسم إن لم يوجد.
+
+يدعم أيضاً أرشيفات zip و tar: تُقرأ الملفات الداخلية واحداً تلو الآخر من
+الأرشيف مباشرة إلى مخزن مؤقت لكل ملف دون فك الأرشيف كاملاً على القرص.
+"""
+
+import os
+import json
+import asyncio
+import tarfile
+import zipfile
+import tempfile
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+class UploadTooLargeError(ValueError):
+    """الملف المرفوع يتجاوز الحد المسموح"""
+
+
+class ArchiveLimitError(ValueError):
+    """الأرشيف يتجاوز حد عدد الملفات أو الحجم الإجمالي"""
+
+
+class UploadBuffer:
+    """ملف مرفوع محفوظ مؤقتاً على القرص مع وصول بدون نسخ"""
+
+    chunk_size = 1024 * 1024
+
+    def __init__(self, filename: str, path: str, size: int, source: Optional[BinaryIO] = None):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        # ملف Starlette الذي يشير إليه path؛ يبقى مفتوحاً ما دام المخزن مستخدماً
+        self._source = source
+
+    @classmethod
+    async def from_upload(cls, upload: Any, max_bytes: Optional[int] = None,
+                          directory: Optional[str] = None) -> "UploadBuffer":
+        """الملف المرفوع على القرص: ملف Starlette نفسه إن كان قد نُقل إلى القرص، وإلا نسخة على دفعات"""
+
+        declared_size = getattr(upload, "size", None)
+        if max_bytes and declared_size and declared_size > max_bytes:
+            raise UploadTooLargeError(
+                f"{upload.filename} exceeds the upload size limit of {max_bytes} bytes"
+            )
+
+        suffix = os.path.splitext(upload.filename or "")[1].lower()
+        directory = directory or os.environ.get("UPLOAD_TMP_DIR")
+
+        spooled = cls._from_spooled(upload, suffix, directory)
+        if spooled is not None:
+            if max_bytes and spooled.size > max_bytes:
+                spooled.close()
+                raise UploadTooLargeError(
+                    f"{upload.filename} exceeds the upload size limit of {max_bytes} bytes"
+                )
+            return spooled
+
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+        size = 0
+
+        try:
+            with os.fdopen(fd, "wb") as target:
+                while True:
+                    chunk = await upload.read(cls.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise UploadTooLargeError(
+                            f"{upload.filename} exceeds the upload size limit of {max_bytes} bytes"
+                        )
+                    target.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+
+        return cls(upload.filename, path, size)
+
+    @classmethod
+    def _from_spooled(cls, upload: Any, suffix: str, directory: Optional[str]) -> Optional["UploadBuffer"]:
+        """رابط رمزي باسم بامتداد الملف إلى SpooledTemporaryFile الذي نُقل إلى القرص
+
+        TemporaryFile بلا اسم على لينكس فيُربط عبر /proc/self/fd؛ الامتداد مطلوب لأن بعض
+        المحللين (camelot، openpyxl) يرفضون المسارات بدونه. الملف الذي ما زال في الذاكرة يُنسخ.
+        """
+
+        spooled = getattr(upload, "file", None)
+        if not getattr(spooled, "_rolled", False):
+            return None
+        try:
+            fd = spooled.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+        target = f"/proc/self/fd/{fd}"
+        if not os.path.exists(target):
+            return None
+
+        link_directory = tempfile.mkdtemp(prefix="upload-", dir=directory)
+        path = os.path.join(link_directory, f"upload{suffix}")
+        os.symlink(target, path)
+        return cls(upload.filename, path, os.fstat(fd).st_size, source=spooled)
+
+    def open(self) -> BinaryIO:
+        """مقبض ملف مستقل لكل محلل"""
+
+        return open(self.path, "rb")
+
+    def close(self) -> None:
+        """حذف الملف المؤقت؛ ملف Starlette يغلقه Starlette نفسه فيُحذف الرابط فقط"""
+
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        if self._source is not None:
+            try:
+                os.rmdir(os.path.dirname(self.path))
+            except OSError:
+                pass
+            self._source = None
+
+    def __enter__(self) -> "UploadBuffer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class RequestSizeLimitMiddleware:
+    """رفض طلبات الرفع الأكبر من حد مسارها قبل حفظ جسمها (ASGI)
+
+    limits: بادئة المسار ← أقصى حجم للجسم بالبايت. Content-Length الأكبر من الحد يُرفض
+    فوراً دون قراءة الجسم؛ والجسم بلا Content-Length (chunked) يُعدّ أثناء الاستلام
+    ويُقطع عند تجاوز الحد، فلا يُكتب على القرص أكثر من الحد في الحالتين.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        # البادئة الأطول أولاً حتى تغلب المسارات الأكثر تحديداً
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _limit(self, path: str) -> Optional[int]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return limit
+        return None
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps({"detail": f"Request body exceeds the upload size limit of {limit} bytes"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        limit = self._limit(scope["path"]) if scope["type"] == "http" and scope["method"] in ("POST", "PUT") else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await self._reject(send, limit)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLargeError(f"Request body exceeds the upload size limit of {limit} bytes")
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded and not response_started:
+                return  # استجابة خطأ تحليل الجسم من التطبيق تُستبدل بـ 413
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLargeError:
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(send, limit)
+
+
+class _ArchiveMemberReader:
+    """ملف داخل أرشيف بواجهة القراءة غير المتزامنة التي يتوقعها UploadBuffer.from_upload"""
+
+    def __init__(self, filename: str, stream: BinaryIO):
+        self.filename = filename
+        self._stream = stream
+
+    async def read(self, size: int = -1) -> bytes:
+        # فك الضغط في خيط منفصل حتى تبدأ معالجة الملفات المقروءة سابقاً أثناء قراءة التالي
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._stream.read, size)
+
+
+def is_archive(filename: str) -> bool:
+    """هل الملف أرشيف zip أو tar؟"""
+
+    return (filename or "").lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_hidden(path: str) -> bool:
+    parts = path.replace("\\", "/").split("/")
+    return any(part.startswith(".") or part == "__MACOSX" for part in parts if part)
+
+
+def archive_path_parts(member_path: str) -> List[str]:
+    return [part for part in member_path.replace("\\", "/").split("/") if part]
+
+
+def shared_archive_root(member_paths: List[str]) -> Optional[str]:
+    """المجلد الجذري الوحيد الذي يضم كل ملفات الأرشيف (نتيجة ضغط مجلد واحد)، إن وُجد"""
+
+    roots = set()
+    for member_path in member_paths:
+        parts = archive_path_parts(member_path)
+        if len(parts) < 2:
+            return None
+        roots.add(parts[0])
+    return roots.pop() if len(roots) == 1 else None
+
+
+async def iter_archive_members(upload: Any, max_members: int, max_total_bytes: int,
+                               max_member_bytes: Optional[int] = None,
+                               accept: Optional[Callable[[str], bool]] = None,
+                               skipped: Optional[List[str]] = None,
+                               max_archive_bytes: Optional[int] = None) -> AsyncIterator[Tuple[str, UploadBuffer]]:
+    """قراءة ملفات الأرشيف بالتتابع، وإرجاع (المسار داخل الأرشيف، مخزن الملف) لكل ملف مقبول
+
+    tar يُقرأ كتدفق (r|*) فلا يحتاج إلى إمكانية الرجوع في الملف، و zip يُقرأ من
+    الملف المؤقت للرفع مباشرة. يُفرض حد الحجم الإجمالي أثناء القراءة لا من الحجم المعلن فقط،
+    ويُفرض max_archive_bytes على حجم الأرشيف المضغوط نفسه قبل قراءة أي ملف.
+    """
+
+    source = getattr(upload, "file", None)
+    if source is None:
+        raise ValueError(f"{upload.filename} cannot be read as an archive")
+    if max_archive_bytes is not None and source.seek(0, os.SEEK_END) > max_archive_bytes:
+        raise UploadTooLargeError(f"{upload.filename} exceeds the upload size limit of {max_archive_bytes} bytes")
+    source.seek(0)
+
+    members_read = 0
+    total_bytes = 0
+
+    def check_limits(name: str, declared_size: Optional[int]) -> int:
+        if members_read >= max_members:
+            raise ArchiveLimitError(f"Archive exceeds the limit of {max_members} files")
+        remaining = max_total_bytes - total_bytes
+        if declared_size is not None and declared_size > remaining:
+            raise ArchiveLimitError(f"Archive exceeds the total size limit of {max_total_bytes} bytes at {name}")
+        return min(remaining, max_member_bytes) if max_member_bytes else remaining
+
+    async def read_member(name: str, stream: BinaryIO, limit: int) -> UploadBuffer:
+        try:
+            return await UploadBuffer.from_upload(_ArchiveMemberReader(name, stream), limit)
+        except UploadTooLargeError:
+            # الحجم المعلن قد يكون أصغر من الفعلي؛ إن كان المتبقي من الحد الإجمالي هو القيد فهذا تجاوز للأرشيف لا للملف
+            if limit >= max_total_bytes - total_bytes:
+                raise ArchiveLimitError(
+                    f"Archive exceeds the total size limit of {max_total_bytes} bytes at {name}"
+                ) from None
+            raise
+
+    def wanted(name: str) -> bool:
+        if _is_hidden(name):
+            return False
+        if accept is not None and not accept(name):
+            if skipped is not None:
+                skipped.append(name)
+            return False
+        return True
+
+    if upload.filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not wanted(info.filename):
+                    continue
+                limit = check_limits(info.filename, info.file_size)
+                with archive.open(info) as stream:
+                    buffer = await read_member(info.filename, stream, limit)
+                members_read += 1
+                total_bytes += buffer.size
+                yield info.filename, buffer
+    else:
+        with tarfile.open(fileobj=source, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or not wanted(member.name):
+                    continue
+                limit = check_limits(member.name, member.size)
+                stream = archive.extractfile(member)
+                buffer = await read_member(member.name, stream, limit)
+                members_read += 1
+                total_bytes += buffer.size
+                yield member.name, buffer
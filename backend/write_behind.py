@@ -0,0 +1,190 @@
+"""
+طابور الكتابة المؤجلة إلى MongoDB
+Write-Behind Persistence Queue for FinClick.AI
+
+سجلات التدقيق (نتائج معالجة الملفات، سجلات الإثراء، آخر تسجيل دخول) لا يحتاجها الرد
+على الطلب، فتُضاف إلى طابور وتُكتب على دفعات (insert_many / bulk_write) كل فترة قصيرة.
+
+- الطابور محدود الحجم: عند بطء MongoDB ينتظر الطلب مكاناً في الطابور بدلاً من تراكم الذاكرة
+- إعادة المحاولة للدفعة الفاشلة مع تأخير متزايد
+- تفريغ كامل للطابور عند إيقاف الخادم
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class WriteBehindQueue:
+    """تجميع عمليات الإدراج والتحديث وكتابتها على دفعات في الخلفية"""
+
+    def __init__(self, database=None, flush_interval: Optional[float] = None,
+                 batch_size: int = 500, max_pending: Optional[int] = None,
+                 max_retries: int = 3, shutdown_timeout: float = 10.0):
+        self.database = database
+        self.flush_interval = flush_interval or float(os.environ.get("WRITE_BEHIND_INTERVAL_MS", "200")) / 1000
+        self.batch_size = batch_size
+        self.max_pending = max_pending or int(os.environ.get("WRITE_BEHIND_MAX_PENDING", "10000"))
+        self.max_retries = max_retries
+        self.shutdown_timeout = shutdown_timeout
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "failed": 0, "backpressure_waits": 0}
+
+    def bind(self, database) -> None:
+        self.database = database
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None and not self._writer.done()
+
+    async def start(self) -> None:
+        """تشغيل الكاتب في الخلفية؛ يُستدعى عند بدء الخادم"""
+
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._stopping = asyncio.Event()
+        self._writer = asyncio.create_task(self._run())
+
+    async def insert(self, collection: str, document: Dict[str, Any]) -> None:
+        """إدراج مستند مؤجل"""
+
+        await self._enqueue(("insert", collection, document))
+
+    async def update(self, collection: str, filter: Dict[str, Any], update: Dict[str, Any],
+                     upsert: bool = False) -> None:
+        """تحديث مستند مؤجل"""
+
+        await self._enqueue(("update", collection, (filter, update, upsert)))
+
+    async def _enqueue(self, operation: Tuple[str, str, Any]) -> None:
+        if not self.running:
+            # الكاتب غير مُشغّل (سكربتات أو اختبارات خارج الخادم): كتابة مباشرة
+            await self._write_batch([operation])
+            return
+
+        self.stats["enqueued"] += 1
+        if self._queue.full():
+            self.stats["backpressure_waits"] += 1
+        await self._queue.put(operation)
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                operation = await self._next(deadline - time.monotonic())
+                if operation is None:
+                    break
+                batch.append(operation)
+
+            try:
+                await self._write_with_retry(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _next(self, timeout: float) -> Optional[Tuple[str, str, Any]]:
+        """العملية التالية في الطابور، أو None عند انتهاء المهلة؛ بعد طلب الإيقاف لا ينتظر بقية الفاصل"""
+
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if timeout <= 0 or self._stopping.is_set():
+            return None
+
+        get = asyncio.ensure_future(self._queue.get())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        done, _ = await asyncio.wait({get, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        stopping.cancel()
+        if get in done:
+            return get.result()
+        # Queue.get لا يسحب العنصر قبل أن يُستأنف، فالإلغاء لا يفقد أي عملية
+        get.cancel()
+        return None
+
+    async def _write_with_retry(self, batch: List[Tuple[str, str, Any]]) -> None:
+        runs = self._runs(batch)
+        written = 0
+        for attempt in range(self.max_retries + 1):
+            try:
+                # إعادة المحاولة تبدأ من المجموعة التي فشلت، فلا يُعاد تطبيق تحديث سبق تنفيذه
+                while written < len(runs):
+                    await self._write_run(*runs[written])
+                    written += 1
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.stats["written"] += sum(len(run[2]) for run in runs[:written])
+                    self.stats["failed"] += sum(len(run[2]) for run in runs[written:])
+                    logging.error(f"Write-behind batch of {len(batch)} operations dropped: {e}")
+                    return
+                logging.warning(f"Write-behind batch failed (attempt {attempt + 1}), retrying: {e}")
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    @staticmethod
+    def _runs(batch: List[Tuple[str, str, Any]]) -> List[Tuple[str, str, List[Any]]]:
+        """تقسيم الدفعة لكل مجموعة إلى عمليات متتالية من نفس النوع مع الحفاظ على ترتيب الطابور داخل المجموعة"""
+
+        by_collection: Dict[str, List[Tuple[str, str, List[Any]]]] = {}
+        for kind, collection, payload in batch:
+            runs = by_collection.setdefault(collection, [])
+            if runs and runs[-1][0] == kind:
+                runs[-1][2].append(payload)
+            else:
+                runs.append((kind, collection, [payload]))
+        return [run for runs in by_collection.values() for run in runs]
+
+    async def _write_run(self, kind: str, collection: str, payloads: List[Any]) -> None:
+        if kind == "insert":
+            try:
+                await self.database[collection].insert_many(payloads, ordered=False)
+            except BulkWriteError as e:
+                # pymongo يضع _id قبل الإرسال، فإعادة المحاولة لا تكرر المستندات المكتوبة سابقاً
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+        else:
+            # ordered=True: التحديثات على نفس المستند تُطبق بترتيب وصولها
+            requests = [UpdateOne(filter, update, upsert=upsert) for filter, update, upsert in payloads]
+            await self.database[collection].bulk_write(requests, ordered=True)
+
+    async def _write_batch(self, batch: List[Tuple[str, str, Any]]) -> None:
+        for run in self._runs(batch):
+            await self._write_run(*run)
+
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    async def stop(self) -> None:
+        """تفريغ الطابور ثم إيقاف الكاتب؛ يُستدعى عند إيقاف الخادم"""
+
+        if not self.running:
+            return
+        self._stopping.set()
+        try:
+            await asyncio.wait_for(self._queue.join(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            logging.error(f"Write-behind queue shut down with {self._queue.qsize()} operations unwritten")
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        self._writer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "pending": self._queue.qsize() if self._queue is not None else 0}
+
+
+# Global instance
+write_queue = WriteBehindQueue()
@@ -0,0 +1,22 @@
+"""
+إحصاءات الزمن المشتركة بين سكربتات القياس
+Shared latency statistics for the benchmark scripts
+"""
+
+import statistics
+
+
+def percentile(values, pct):
+    """أقرب قيمة مرتبة للنسبة المئوية pct (0-100)"""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(latencies_ms):
+    """المتوسط و p50 و p95 لقائمة أزمنة بالمللي ثانية"""
+    return {
+        "mean_ms": round(statistics.mean(latencies_ms), 2),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+    }
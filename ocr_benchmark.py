@@ -0,0 +1,111 @@
+"""
+مقارنة زمن OCR لكل صورة بين المحرك الدائم (tesserocr) و pytesseract
+OCR backend latency benchmark
+
+Usage:
+    python ocr_benchmark.py [images_dir] [--repeat N] [--output results.json]
+
+بدون مجلد صور يتم توليد مجموعة صور اصطناعية محلياً.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from ocr_engine import PytesseractBackend, TesserocrBackend
+from benchmark_stats import latency_summary
+
+SAMPLE_LINES = [
+    "Total Assets 6,500,000",
+    "Current Liabilities 1,200,000",
+    "Revenue 8,000,000",
+    "Net Income 787,500",
+    "Operating Cash Flow (950,000)",
+]
+
+
+def generate_corpus(count: int = 20):
+    """توليد صور صغيرة لبنود القوائم المالية بأحجام مختلفة"""
+    font = ImageFont.load_default()
+    images = []
+    for i in range(count):
+        lines = SAMPLE_LINES[: 1 + i % len(SAMPLE_LINES)]
+        image = Image.new("L", (600, 40 + 30 * len(lines)), color=255)
+        draw = ImageDraw.Draw(image)
+        for row, line in enumerate(lines):
+            draw.text((20, 20 + 30 * row), line, fill=0, font=font)
+        images.append((f"synthetic_{i:03d}.png", image.resize((1200, image.height * 2))))
+    return images
+
+
+def load_corpus(directory: str):
+    """تحميل الصور من مجلد محلي"""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if os.path.splitext(name.lower())[1] in (".png", ".jpg", ".jpeg", ".tif", ".tiff"):
+            with Image.open(os.path.join(directory, name)) as image:
+                images.append((name, image.convert("L")))
+    return images
+
+
+def benchmark_backend(backend, images, repeat: int):
+    """قياس زمن كل صورة بالمللي ثانية"""
+    latencies = []
+    for _ in range(repeat):
+        for _, image in images:
+            start = time.perf_counter()
+            backend.image_to_string(image, lang="ara+eng", psm=6)
+            latencies.append((time.perf_counter() - start) * 1000)
+    backend.close()
+    return {
+        "backend": backend.name,
+        "images": len(images) * repeat,
+        **latency_summary(latencies),
+        "total_s": round(sum(latencies) / 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR backend latency benchmark")
+    parser.add_argument("images_dir", nargs="?", help="Directory of images (default: synthetic corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    images = load_corpus(args.images_dir) if args.images_dir else generate_corpus()
+    print(f"🔍 Benchmarking OCR on {len(images)} images x {args.repeat}")
+
+    results = {"timestamp": datetime.now().isoformat(), "corpus": args.images_dir or "synthetic", "backends": []}
+
+    backends = [PytesseractBackend()]
+    try:
+        backends.append(TesserocrBackend())
+    except Exception as e:
+        print(f"⚠️  tesserocr backend unavailable: {e}")
+
+    for backend in backends:
+        stats = benchmark_backend(backend, images, args.repeat)
+        results["backends"].append(stats)
+        print(f"✅ {stats['backend']:<12} mean {stats['mean_ms']:>8} ms   p50 {stats['p50_ms']:>8} ms   p95 {stats['p95_ms']:>8} ms")
+
+    if len(results["backends"]) == 2:
+        speedup = results["backends"][0]["mean_ms"] / max(results["backends"][1]["mean_ms"], 1e-9)
+        results["speedup"] = round(speedup, 2)
+        print(f"🚀 Persistent engine speedup: {speedup:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
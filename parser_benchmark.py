@@ -0,0 +1,389 @@
+"""
+قياس أداء محلل الملفات المالية على مجموعة ملفات اصطناعية محلية
+Parser throughput benchmark for FinancialDataParser
+
+يولّد الملفات التالية بقيم معروفة مسبقاً:
+- PDF نصي (reportlab) و PDF ممسوح ضوئياً (صور صفحات)
+- Excel متعدد الأوراق (openpyxl)
+- Word (python-docx)
+- صور PNG
+بالعربية والإنجليزية ومزيج منهما وبأعداد صفحات مختلفة، ثم يقيس لكل صيغة:
+الصفحات/ثانية، زمن p50/p95، ذروة الذاكرة، ونسبة استرجاع البنود.
+
+Usage:
+    python parser_benchmark.py [--pages 1,5,20] [--languages en,ar,mixed] [--output results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import tempfile
+import statistics
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmark_stats import latency_summary
+
+# القيم الحقيقية للبنود المولدة: (القائمة، البند) -> (التسمية العربية، التسمية الإنجليزية، القيمة)
+GROUND_TRUTH = {
+    ("balance_sheet", "current_assets"): ("الأصول المتداولة", "Current Assets", 2450000),
+    ("balance_sheet", "fixed_assets"): ("الأصول الثابتة", "Fixed Assets", 3870000),
+    ("balance_sheet", "total_assets"): ("إجمالي الأصول", "Total Assets", 6320000),
+    ("balance_sheet", "current_liabilities"): ("الخصوم المتداولة", "Current Liabilities", 1185000),
+    ("balance_sheet", "total_equity"): ("حقوق المساهمين", "Shareholders Equity", 3410000),
+    ("income_statement", "revenue"): ("الإيرادات", "Revenue", 8125000),
+    ("income_statement", "gross_profit"): ("مجمل الربح", "Gross Profit", 3040000),
+    ("income_statement", "operating_profit"): ("الربح التشغيلي", "Operating Profit", 1265000),
+    ("income_statement", "net_income"): ("صافي الربح", "Net Income", 812400),
+    ("cash_flow", "operating_cash_flow"): ("التدفق النقدي التشغيلي", "Operating Cash Flow", 964000),
+    ("cash_flow", "investing_cash_flow"): ("التدفق النقدي الاستثماري", "Investing Cash Flow", 415000),
+    ("cash_flow", "financing_cash_flow"): ("التدفق النقدي التمويلي", "Financing Cash Flow", 218000),
+}
+
+FILLER_LINES = [
+    ("إيضاحات حول القوائم المالية الموحدة", "Notes to the consolidated financial statements"),
+    ("تم إعداد القوائم المالية وفقاً للمعايير الدولية", "Prepared in accordance with international standards"),
+    ("السياسات المحاسبية الهامة المطبقة خلال السنة", "Significant accounting policies applied during the year"),
+    ("تقرير مراجع الحسابات المستقل", "Independent auditor's report"),
+]
+
+FONT_CANDIDATES = [
+    os.environ.get("BENCHMARK_FONT", ""),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+]
+
+
+def find_font():
+    """خط يدعم الحروف العربية؛ بدونه تُولَّد الملفات بالإنجليزية فقط"""
+    for path in FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def statement_lines(language: str):
+    """أسطر البنود بالتسمية واللغة المطلوبة"""
+    lines = []
+    for index, (ar_label, en_label, value) in enumerate(GROUND_TRUTH.values()):
+        if language == "ar" or (language == "mixed" and index % 2 == 0):
+            label = ar_label
+        else:
+            label = en_label
+        lines.append((label, f"{value:,}"))
+    return lines
+
+
+def filler_lines(language: str, count: int = 12):
+    lines = []
+    for i in range(count):
+        ar_text, en_text = FILLER_LINES[i % len(FILLER_LINES)]
+        lines.append(ar_text if language == "ar" or (language == "mixed" and i % 2) else en_text)
+    return lines
+
+
+def page_plan(pages: int):
+    """الصفحات التي تحمل القوائم: في البداية كما في معظم التقارير السنوية"""
+    return {min(1, pages - 1)}
+
+
+def make_text_pdf(path, pages, language, font_path):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font = "Helvetica"
+    if font_path:
+        pdfmetrics.registerFont(TTFont("BenchFont", font_path))
+        font = "BenchFont"
+
+    doc = canvas.Canvas(path, pagesize=A4)
+    statement_pages = page_plan(pages)
+    for page in range(pages):
+        doc.setFont(font, 11)
+        y = 800
+        if page in statement_pages:
+            for label, value in statement_lines(language):
+                doc.drawString(60, y, f"{label} {value}")
+                y -= 22
+        for line in filler_lines(language):
+            doc.drawString(60, y, line)
+            y -= 18
+        doc.showPage()
+    doc.save()
+
+
+def render_page_image(lines, font_path):
+    from PIL import Image, ImageDraw, ImageFont
+
+    font = ImageFont.truetype(font_path, 28) if font_path else ImageFont.load_default()
+    image = Image.new("L", (1654, 2339), color=255)  # A4 @ 200 DPI
+    draw = ImageDraw.Draw(image)
+    y = 120
+    for line in lines:
+        draw.text((120, y), line, fill=0, font=font)
+        y += 48
+    return image
+
+
+def make_scanned_pdf(path, pages, language, font_path):
+    statement_pages = page_plan(pages)
+    images = []
+    for page in range(pages):
+        lines = [f"{label} {value}" for label, value in statement_lines(language)] if page in statement_pages else []
+        images.append(render_page_image(lines + filler_lines(language), font_path))
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=200)
+
+
+def make_image(path, language, font_path):
+    lines = [f"{label} {value}" for label, value in statement_lines(language)]
+    render_page_image(lines, font_path).save(path, dpi=(200, 200))
+
+
+def make_xlsx(path, sheets, language):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    worksheet = workbook.active
+    worksheet.title = "Statements"
+    worksheet.append(["Item", "2024", "2023"])
+    for label, value in statement_lines(language):
+        worksheet.append([label, value, ""])
+
+    # أوراق إضافية كبيرة لقياس التدرج مع حجم الملف
+    for index in range(1, sheets):
+        sheet = workbook.create_sheet(f"Detail {index}")
+        sheet.append(["Account", "Debit", "Credit"])
+        for row in range(2000):
+            sheet.append([f"Ledger account {index}-{row}", row * 10, row * 7])
+    workbook.save(path)
+
+
+def make_docx(path, pages, language):
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    document = Document()
+    statement_pages = page_plan(pages)
+    for page in range(pages):
+        if page in statement_pages:
+            table = document.add_table(rows=1, cols=2)
+            table.rows[0].cells[0].text = "Item"
+            table.rows[0].cells[1].text = "2024"
+            for label, value in statement_lines(language):
+                cells = table.add_row().cells
+                cells[0].text = label
+                cells[1].text = value
+        for line in filler_lines(language):
+            document.add_paragraph(line)
+        if page < pages - 1:
+            document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.save(path)
+
+
+def build_corpus(directory, page_counts, languages, formats):
+    """توليد الملفات وإرجاع قائمة (الصيغة، المسار، عدد الصفحات، اللغة)"""
+    font_path = find_font()
+    if not font_path and any(language != "en" for language in languages):
+        print("⚠️  No Arabic-capable font found (set BENCHMARK_FONT); generating English documents only")
+        languages = ["en"]
+
+    corpus = []
+    for language in languages:
+        for pages in page_counts:
+            stem = os.path.join(directory, f"{language}_{pages:03d}p")
+            builders = {
+                "pdf_text": (f"{stem}_text.pdf", lambda p: make_text_pdf(p, pages, language, font_path)),
+                "pdf_scanned": (f"{stem}_scanned.pdf", lambda p: make_scanned_pdf(p, pages, language, font_path)),
+                "xlsx": (f"{stem}.xlsx", lambda p: make_xlsx(p, pages, language)),
+                "docx": (f"{stem}.docx", lambda p: make_docx(p, pages, language)),
+            }
+            for name in formats:
+                if name in builders:
+                    path, build = builders[name]
+                    build(path)
+                    corpus.append((name, path, pages, language))
+        if "png" in formats:
+            path = os.path.join(directory, f"{language}_scan.png")
+            make_image(path, language, font_path)
+            corpus.append(("png", path, 1, language))
+    return corpus
+
+
+class LocalUpload:
+    """ملف محلي بواجهة UploadFile التي يتوقعها المحلل"""
+
+    def __init__(self, path):
+        self.filename = os.path.basename(path)
+        self.size = os.path.getsize(path)
+        self._file = open(path, "rb")
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def close(self):
+        self._file.close()
+
+
+def field_recall(extracted_data):
+    """نسبة البنود المستخرجة بقيمتها الصحيحة (بهامش 0.5%)"""
+    found = 0
+    for (statement_type, field), (_, _, expected) in GROUND_TRUTH.items():
+        value = extracted_data.get(statement_type, {}).get(field)
+        if value and abs(float(value) - expected) <= expected * 0.005:
+            found += 1
+    return found / len(GROUND_TRUTH)
+
+
+def missing_ocr_languages(required):
+    """نماذج اللغات غير المثبتة لدى tesseract"""
+    import pytesseract
+
+    try:
+        installed = set(pytesseract.get_languages(config=""))
+    except Exception:
+        installed = set()
+    return [language for language in required if language not in installed]
+
+
+def run_format(name, documents, repeat, full_scan, routing=None):
+    """تشغيل صيغة واحدة في عملية مستقلة حتى تكون ذروة الذاكرة خاصة بها"""
+    from ocr_data_parser import FinancialDataParser
+    from ocr_engine import ocr_engine
+
+    parser = FinancialDataParser()
+    if routing is not None:
+        parser.ocr_language_routing = routing
+    latencies, recalls = [], []
+    total_pages, total_time = 0, 0.0
+
+    async def process(path):
+        upload = LocalUpload(path)
+        try:
+            start = time.perf_counter()
+            results = await parser.process_uploaded_files([upload], "Benchmark Co", full_scan=full_scan)
+            return time.perf_counter() - start, results["files_processed"][0]
+        finally:
+            upload.close()
+
+    for _ in range(repeat):
+        for path, pages in documents:
+            elapsed, file_result = asyncio.run(process(path))
+            latencies.append(elapsed * 1000)
+            recalls.append(field_recall(file_result["extracted_data"]))
+            total_pages += pages
+            total_time += elapsed
+
+    return {
+        "format": name,
+        "documents": len(documents) * repeat,
+        "pages": total_pages,
+        "pages_per_second": round(total_pages / total_time, 2) if total_time else None,
+        **latency_summary(latencies),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "field_recall": round(statistics.mean(recalls), 3),
+        "ocr_language_routing": parser.ocr_language_routing,
+        "ocr_routes": {route: dict(stats) for route, stats in ocr_engine.route_stats.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FinancialDataParser throughput benchmark")
+    parser.add_argument("--pages", default="1,5,20", help="Comma-separated page counts")
+    parser.add_argument("--languages", default="en,ar,mixed")
+    parser.add_argument("--formats", default="pdf_text,pdf_scanned,xlsx,docx,png")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--full-scan", action="store_true", help="Disable early termination")
+    parser.add_argument("--compare-routing", action="store_true",
+                        help="Run image formats with and without OCR language routing and report the time saved")
+    parser.add_argument("--corpus-dir", help="Keep the generated corpus in this directory")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.compare_routing:
+        missing = missing_ocr_languages(("ara", "eng"))
+        if missing:
+            # بدون النماذج تفشل قراءة كل صورة في أحد الوضعين فتصبح المقارنة بلا معنى
+            print(f"❌ --compare-routing needs tesseract language data for: {', '.join(missing)}")
+            return 1
+
+    page_counts = [int(p) for p in args.pages.split(",")]
+    languages = args.languages.split(",")
+    formats = args.formats.split(",")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = args.corpus_dir or temp_dir
+        os.makedirs(directory, exist_ok=True)
+
+        print(f"🔍 Generating corpus in {directory} ...")
+        corpus = build_corpus(directory, page_counts, languages, formats)
+        print(f"   {len(corpus)} documents")
+
+        results = {
+            "timestamp": datetime.now().isoformat(),
+            "settings": {
+                "pages": page_counts,
+                "languages": languages,
+                "repeat": args.repeat,
+                "full_scan": args.full_scan,
+            },
+            "formats": {},
+        }
+
+        context = multiprocessing.get_context("spawn")
+        for name in formats:
+            documents = [(path, pages) for fmt, path, pages, _ in corpus if fmt == name]
+            if not documents:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                stats = pool.submit(run_format, name, documents, args.repeat, args.full_scan).result()
+            results["formats"][name] = stats
+            print(
+                f"✅ {name:<12} {stats['pages_per_second']:>8} pages/s   p50 {stats['p50_ms']:>9} ms   "
+                f"p95 {stats['p95_ms']:>9} ms   peak RSS {stats['peak_rss_mb']:>7} MB   recall {stats['field_recall']:.0%}"
+            )
+
+            # مقارنة OCR بنموذج ara+eng دائماً مقابل التوجيه حسب خط كل كتلة
+            if args.compare_routing and name == "png":
+                comparison = {}
+                for routing in (False, True):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        comparison[routing] = pool.submit(
+                            run_format, name, documents, args.repeat, args.full_scan, routing
+                        ).result()
+                saved_ms = comparison[False]["mean_ms"] - comparison[True]["mean_ms"]
+                results["ocr_routing"] = {
+                    "ara_eng_mean_ms": comparison[False]["mean_ms"],
+                    "routed_mean_ms": comparison[True]["mean_ms"],
+                    "ocr_time_saved_ms": round(saved_ms, 2),
+                    "ocr_time_saved_pct": round(saved_ms / comparison[False]["mean_ms"] * 100, 1),
+                    "routed_recall": comparison[True]["field_recall"],
+                    "ara_eng_recall": comparison[False]["field_recall"],
+                    "routes": comparison[True]["ocr_routes"],
+                }
+                print(
+                    f"🚀 OCR language routing saved {saved_ms:.1f} ms per image "
+                    f"({results['ocr_routing']['ocr_time_saved_pct']}%)"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"📄 Results written to {args.output}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
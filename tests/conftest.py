@@ -0,0 +1,5 @@
+import os
+import sys
+
+# وحدات الخادم تستورد بعضها بأسماء مسطحة (from write_behind import ...)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
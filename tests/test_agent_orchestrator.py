@@ -0,0 +1,155 @@
+import time
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from agent_orchestrator import AgentOrchestrator
+
+
+async def serve():
+    """خادم محلي: /fast يرد فوراً، /slow بعد ثانية، /error بخطأ 500؛ ويعد الطلبات لكل مسار"""
+
+    hits = {}
+
+    async def handler(request):
+        hits[request.path] = hits.get(request.path, 0) + 1
+        if request.path == "/slow":
+            await asyncio.sleep(1)
+        if request.path == "/error":
+            return web.Response(status=500)
+        return web.json_response({"source": request.path.strip("/")})
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}", hits
+
+
+def http_agent(session, url, section):
+    """وكيل يجلب JSON من الخادم المحلي ويكتبه في قسمه من النتيجة الجزئية"""
+
+    async def agent(partial):
+        async with session.get(url) as response:
+            response.raise_for_status()
+            partial[section] = await response.json()
+    return agent
+
+
+def run_against(scenario):
+    async def run():
+        runner, url, hits = await serve()
+        try:
+            async with aiohttp.ClientSession() as session:
+                return await scenario(session, url, hits)
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_overall_deadline_merges_only_finished_agents():
+    orchestrator = AgentOrchestrator(deadline=0.3, default_timeout=5.0)
+
+    async def scenario(session, url, hits):
+        start = time.perf_counter()
+        merged, reports = await orchestrator.run({
+            "fast_agent": http_agent(session, f"{url}/fast", "market"),
+            "slow_agent": http_agent(session, f"{url}/slow", "news"),
+            "broken_agent": http_agent(session, f"{url}/error", "research")
+        })
+        return merged, reports, time.perf_counter() - start
+
+    merged, reports, elapsed = run_against(scenario)
+    assert elapsed < 1.0
+    assert merged == {"market": {"source": "fast"}}
+    assert reports["fast_agent"]["status"] == "success"
+    assert reports["slow_agent"]["status"] == "deadline"
+    assert reports["broken_agent"]["status"] == "failed"
+
+
+def test_per_agent_timeout_within_the_deadline():
+    orchestrator = AgentOrchestrator(deadline=5.0)
+    orchestrator.configure("slow_agent", timeout=0.2)
+
+    async def scenario(session, url, hits):
+        return await orchestrator.run({
+            "fast_agent": http_agent(session, f"{url}/fast", "market"),
+            "slow_agent": http_agent(session, f"{url}/slow", "news")
+        })
+
+    merged, reports = run_against(scenario)
+    assert merged == {"market": {"source": "fast"}}
+    assert reports["slow_agent"]["status"] == "timeout"
+    assert reports["slow_agent"]["duration"] < 1.0
+    assert orchestrator.breakers["slow_agent"].consecutive_failures == 1
+
+
+def test_breaker_opens_after_three_failures_and_skips_the_agent():
+    orchestrator = AgentOrchestrator(deadline=5.0, failure_threshold=3, reset_timeout=60.0)
+
+    async def scenario(session, url, hits):
+        agents = {"broken_agent": http_agent(session, f"{url}/error", "research")}
+        statuses = []
+        for _ in range(4):
+            _, reports = await orchestrator.run(agents)
+            statuses.append(reports["broken_agent"]["status"])
+        return statuses, hits.get("/error", 0)
+
+    statuses, requests = run_against(scenario)
+    assert statuses == ["failed", "failed", "failed", "skipped"]
+    # الوكيل المتخطى لا يصل إلى الخادم
+    assert requests == 3
+    assert orchestrator.get_breaker_states()["broken_agent"]["state"] == "open"
+
+
+def test_half_open_allows_one_trial_after_cooldown():
+    orchestrator = AgentOrchestrator(deadline=5.0, failure_threshold=3, reset_timeout=0.2)
+
+    async def scenario(session, url, hits):
+        broken = {"agent": http_agent(session, f"{url}/error", "market")}
+        healthy = {"agent": http_agent(session, f"{url}/fast", "market")}
+        for _ in range(3):
+            await orchestrator.run(broken)
+        breaker = orchestrator.breakers["agent"]
+        assert breaker.state == "open"
+
+        await asyncio.sleep(0.25)
+        assert breaker.state == "half_open"
+        # المحاولة التجريبية تفشل: يُفتح القاطع فوراً دون انتظار ثلاثة إخفاقات
+        _, reports = await orchestrator.run(broken)
+        assert reports["agent"]["status"] == "failed"
+        assert breaker.state == "open"
+
+        await asyncio.sleep(0.25)
+        # محاولة تجريبية واحدة فقط بين تشغيلين متزامنين
+        first, second = await asyncio.gather(orchestrator.run(healthy), orchestrator.run(healthy))
+        return first, second, breaker.state, hits.get("/fast", 0)
+
+    first, second, state, requests = run_against(scenario)
+    assert sorted([first[1]["agent"]["status"], second[1]["agent"]["status"]]) == ["skipped", "success"]
+    assert requests == 1
+    assert state == "closed"
+
+
+def test_agent_reported_error_is_not_merged():
+    orchestrator = AgentOrchestrator(deadline=5.0)
+
+    async def reports_error(partial):
+        partial["news"] = {"error": "provider rejected the request"}
+
+    async def scenario(session, url, hits):
+        return await orchestrator.run({
+            "fast_agent": http_agent(session, f"{url}/fast", "market"),
+            "news_agent": reports_error
+        })
+
+    merged, reports = run_against(scenario)
+    assert merged == {"market": {"source": "fast"}}
+    assert reports["news_agent"] == {"status": "failed", "duration": reports["news_agent"]["duration"],
+                                     "error": "provider rejected the request"}
@@ -0,0 +1,40 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+
+import financial_analysis_engine_170
+from analysis_engine import FinancialAnalysisEngine
+from financial_analysis_engine_170 import FinancialAnalysisEngine as NewFinancialAnalysisEngine
+from price_store import PriceStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = PriceStore(str(tmp_path))
+    monkeypatch.setattr(financial_analysis_engine_170, "price_store", store)
+    return store
+
+
+def test_share_price_comes_from_the_resolved_symbol(store):
+    dates = np.array(["2024-09-01", "2025-09-01"], dtype="datetime64[D]")
+    store.append("2222.SR", dates, {"close": [26.5, 24.3]})
+
+    engine = FinancialAnalysisEngine()
+    engine.company_name = "Saudi Aramco"
+    engine.price_date = "2025-09-01"
+    data = engine._convert_to_new_format()
+
+    assert data.symbol == "2222.SR"
+    new_engine = NewFinancialAnalysisEngine(data)
+    assert new_engine.share_price == 24.3
+    assert new_engine.share_price_year_ago == 26.5
+
+
+def test_unknown_company_keeps_the_entered_price(store):
+    engine = FinancialAnalysisEngine()
+    engine.company_name = "شركة غير مدرجة للاختبار"
+    data = engine._convert_to_new_format()
+
+    assert data.symbol == ""
+    assert NewFinancialAnalysisEngine(data).share_price == data.stock_price
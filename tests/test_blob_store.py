@@ -0,0 +1,78 @@
+import os
+import asyncio
+
+import pytest
+
+import blob_store
+from blob_store import BlobStore, LocalBlobBackend
+
+TABLES = [[["البند", "2024"], ["إجمالي الأصول", "1,234,567"]]]
+
+
+def stored_files(directory):
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+def test_round_trip(tmp_path):
+    store = BlobStore(LocalBlobBackend(str(tmp_path)))
+
+    async def run():
+        ref = await store.put_json(TABLES)
+        return ref, await store.get_json(ref)
+
+    ref, value = asyncio.run(run())
+    assert value == TABLES
+    assert ref["backend"] == "local"
+    assert len(ref["blob"]) == 64
+    # المرجع يشير إلى ملف على القرص يبقى بعد إعادة إنشاء المخزن
+    assert asyncio.run(BlobStore(LocalBlobBackend(str(tmp_path))).get_json(ref)) == TABLES
+
+
+def test_identical_content_is_stored_once(tmp_path):
+    store = BlobStore(LocalBlobBackend(str(tmp_path)))
+
+    async def run():
+        return [await store.put_json({"raw_text": "نفس النص"}) for _ in range(3)]
+
+    refs = asyncio.run(run())
+    assert len({ref["blob"] for ref in refs}) == 1
+    assert len(stored_files(tmp_path)) == 1
+
+
+def test_zlib_fallback_without_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "zstandard", None)
+    store = BlobStore(LocalBlobBackend(str(tmp_path)))
+    text = "إجمالي الإيرادات " * 500
+
+    ref = asyncio.run(store.put_json(text))
+    with open(os.path.join(str(tmp_path), ref["blob"][:2], ref["blob"]), "rb") as f:
+        assert f.read().startswith(b"zlib\0")
+    assert ref["stored_size"] < ref["size"]
+    assert asyncio.run(store.get_json(ref)) == text
+
+
+def test_zstd_blob_needs_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, "zstandard", None)
+    backend = LocalBlobBackend(str(tmp_path))
+    key = "ab" * 32
+    asyncio.run(backend.put(key, b"zstd\0payload"))
+    with pytest.raises(RuntimeError, match="zstandard"):
+        asyncio.run(BlobStore(backend).get_json({"blob": key}))
+
+
+def test_missing_or_malformed_keys_raise_key_error(tmp_path):
+    store = BlobStore(LocalBlobBackend(str(tmp_path)))
+    with pytest.raises(KeyError):
+        asyncio.run(store.get_json({"blob": "0" * 64}))
+    with pytest.raises(KeyError):
+        asyncio.run(store.get_json({"blob": "../../etc/passwd"}))
+
+
+def test_default_directory_is_persistent(tmp_path, monkeypatch):
+    monkeypatch.delenv("BLOB_STORE_DIR", raising=False)
+    monkeypatch.setenv("FINCLICK_DATA_DIR", str(tmp_path))
+    assert LocalBlobBackend().directory == os.path.join(str(tmp_path), "blobs")
+
+    monkeypatch.delenv("FINCLICK_DATA_DIR")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert LocalBlobBackend().directory == os.path.join(str(tmp_path), ".finclick", "blobs")
@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import multiprocessing
+
+import pytest
+
+from chunked_upload import ChunkedUploadError, ChunkedUploadStore, UploadConflictError
+
+CHUNK_SIZE = 4
+
+
+def chunk_of(payload, index):
+    data = payload[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+    return data, hashlib.sha256(data).hexdigest()
+
+
+def append_chunks(directory, upload_id, payload, indices):
+    # عملية خادم مستقلة بنسختها الخاصة من المخزن
+    store = ChunkedUploadStore(directory)
+
+    async def run():
+        for index in indices:
+            data, checksum = chunk_of(payload, index)
+            await store.append_chunk(upload_id, "user@example.com", index, data, checksum)
+
+    asyncio.run(run())
+
+
+def test_chunks_from_several_processes_are_all_recorded(tmp_path):
+    payload = bytes(range(256)) * 2
+    store = ChunkedUploadStore(str(tmp_path))
+    session = asyncio.run(store.init_upload(
+        "user@example.com", "report.pdf", len(payload), "Aramco",
+        chunk_size=CHUNK_SIZE, sha256=hashlib.sha256(payload).hexdigest()
+    ))
+    upload_id, total_chunks = session["upload_id"], session["total_chunks"]
+
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=append_chunks, args=(str(tmp_path), upload_id, payload, range(worker, total_chunks, 4)))
+        for worker in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    assert store.describe(store.get_session(upload_id))["missing_chunks"] == []
+    manifest, upload = asyncio.run(store.complete_upload(upload_id, "user@example.com"))
+    try:
+        with open(upload.path, "rb") as f:
+            assert f.read() == payload
+    finally:
+        upload.close()
+
+
+def test_resume_reports_missing_chunks_and_rejects_bad_checksum(tmp_path):
+    payload = b"0123456789"
+    store = ChunkedUploadStore(str(tmp_path))
+    upload_id = asyncio.run(store.init_upload(
+        "user@example.com", "report.pdf", len(payload), "Aramco", chunk_size=CHUNK_SIZE
+    ))["upload_id"]
+
+    data, checksum = chunk_of(payload, 1)
+    status = asyncio.run(store.append_chunk(upload_id, "user@example.com", 1, data, checksum))
+    assert status["received_chunks"] == [1]
+    assert status["missing_chunks"] == [0, 2]
+    assert status["contiguous_bytes"] == 0
+
+    data, _ = chunk_of(payload, 0)
+    with pytest.raises(ChunkedUploadError, match="Checksum mismatch"):
+        asyncio.run(store.append_chunk(upload_id, "user@example.com", 0, data, "0" * 64))
+    with pytest.raises(ChunkedUploadError, match="incomplete"):
+        asyncio.run(store.complete_upload(upload_id, "user@example.com"))
+
+
+def uploaded_session(directory, payload, sha256=None):
+    store = ChunkedUploadStore(directory)
+    upload_id = asyncio.run(store.init_upload(
+        "user@example.com", "report.pdf", len(payload), "Aramco", chunk_size=CHUNK_SIZE, sha256=sha256
+    ))["upload_id"]
+    append_chunks(directory, upload_id, payload, range(3))
+    return store, upload_id
+
+
+def test_concurrent_completes_move_the_file_once(tmp_path):
+    payload = b"0123456789"
+    store, upload_id = uploaded_session(str(tmp_path), payload, hashlib.sha256(payload).hexdigest())
+
+    async def run():
+        return await asyncio.gather(
+            *(store.complete_upload(upload_id, "user@example.com") for _ in range(4)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    completed = [result for result in results if not isinstance(result, Exception)]
+    assert len(completed) == 1
+    assert all(isinstance(result, UploadConflictError) for result in results if isinstance(result, Exception))
+
+    manifest, upload = completed[0]
+    try:
+        with open(upload.path, "rb") as f:
+            assert f.read() == payload
+    finally:
+        upload.close()
+
+    # التكرار بعد الإنهاء تعارض وليس جلسة مجهولة
+    with pytest.raises(UploadConflictError, match="completed"):
+        asyncio.run(store.complete_upload(upload_id, "user@example.com"))
+    data, checksum = chunk_of(payload, 0)
+    with pytest.raises(UploadConflictError):
+        asyncio.run(store.append_chunk(upload_id, "user@example.com", 0, data, checksum))
+
+
+def test_late_chunk_while_completing_is_rejected(tmp_path):
+    payload = b"0123456789"
+    store, upload_id = uploaded_session(str(tmp_path), payload)
+    store._begin_complete(upload_id, "user@example.com")
+
+    data, checksum = chunk_of(payload, 2)
+    with pytest.raises(UploadConflictError, match="completing"):
+        asyncio.run(store.append_chunk(upload_id, "user@example.com", 2, data, checksum))
+    with pytest.raises(UploadConflictError):
+        store.abort_upload(upload_id, "user@example.com")
+    assert store.describe(store.get_session(upload_id))["state"] == "completing"
+
+
+def test_failed_verification_reopens_the_session(tmp_path):
+    payload = b"0123456789"
+    store, upload_id = uploaded_session(str(tmp_path), payload, hashlib.sha256(b"other").hexdigest())
+
+    with pytest.raises(ChunkedUploadError, match="Checksum mismatch"):
+        asyncio.run(store.complete_upload(upload_id, "user@example.com"))
+
+    # الأجزاء يمكن إعادة إرسالها بعد فشل التحقق
+    data, checksum = chunk_of(payload, 0)
+    status = asyncio.run(store.append_chunk(upload_id, "user@example.com", 0, data, checksum))
+    assert status["state"] == "uploading"
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import enrichment_cache
+from enrichment_cache import TieredTTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(enrichment_cache, "time", clock)
+    return clock
+
+
+class CountingFetch:
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def test_fresh_value_is_served_until_ttl_expires(clock):
+    cache = TieredTTLCache("test_cache", max_stale_factor=2)
+    fetch = CountingFetch("v1", "v2")
+
+    async def run():
+        first = await cache.get_or_fetch("key", 60, fetch)
+        clock.now += 30
+        second = await cache.get_or_fetch("key", 60, fetch)
+        # أقدم من مدة الصلاحية × max_stale_factor: جلب متزامن جديد
+        clock.now += 120
+        third = await cache.get_or_fetch("key", 60, fetch)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert (first[0], first[1]["status"]) == ("v1", "miss")
+    assert (second[0], second[1]["status"], second[1]["age_seconds"]) == ("v1", "fresh", 30.0)
+    assert (third[0], third[1]["status"]) == ("v2", "miss")
+    assert fetch.calls == 2
+
+
+def test_stale_value_is_returned_while_revalidating(clock):
+    cache = TieredTTLCache("test_cache", max_stale_factor=10)
+    fetch = CountingFetch("v1", "v2")
+
+    async def run():
+        await cache.get_or_fetch("key", 60, fetch)
+        clock.now += 120
+        stale = await cache.get_or_fetch("key", 60, fetch)
+        # انتظار انتهاء التحديث في الخلفية
+        await asyncio.gather(*cache._refreshing)
+        refreshed = await cache.get_or_fetch("key", 60, fetch)
+        return stale, refreshed
+
+    stale, refreshed = asyncio.run(run())
+    assert (stale[0], stale[1]["status"]) == ("v1", "stale")
+    assert (refreshed[0], refreshed[1]["status"]) == ("v2", "fresh")
+    assert fetch.calls == 2
+
+
+def test_failed_fetch_falls_back_to_last_known_value(clock):
+    cache = TieredTTLCache("test_cache", max_stale_factor=2)
+    fetch = CountingFetch("v1", ConnectionError("provider down"))
+
+    async def run():
+        await cache.get_or_fetch("key", 60, fetch)
+        clock.now += 600
+        return await cache.get_or_fetch("key", 60, fetch)
+
+    value, info = asyncio.run(run())
+    assert (value, info["status"]) == ("v1", "stale_fallback")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(TieredTTLCache("test_cache").get_or_fetch("key", 60, CountingFetch(ConnectionError("down"))))
+
+
+def test_concurrent_misses_fetch_once(clock):
+    cache = TieredTTLCache("test_cache")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "v1"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("key", 60, fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert [value for value, _ in results] == ["v1"] * 5
+    assert len(calls) == 1
+
+
+def test_lookup_leaves_misses_to_the_caller(clock):
+    cache = TieredTTLCache("test_cache", max_stale_factor=2)
+    fetch = CountingFetch()
+
+    async def run():
+        miss = await cache.lookup("key", 60, fetch)
+        info = await cache.fetched("key", 60, "v1")
+        fresh = await cache.lookup("key", 60, fetch)
+        clock.now += 600
+        expired = await cache.lookup("key", 60, fetch)
+        return miss, info, fresh, expired
+
+    miss, info, fresh, expired = asyncio.run(run())
+    assert miss == (None, None)
+    assert info["status"] == "miss"
+    assert fresh[0][0] == "v1" and fresh[0][1]["status"] == "fresh"
+    # أقدم من الحد: لا قيمة تُعاد، لكن آخر قيمة معروفة متاحة إذا فشل جلب المستدعي
+    hit, cached = expired
+    assert hit is None
+    assert cache.fallback(cached, 60)[0] == "v1"
+    assert fetch.calls == 0
@@ -0,0 +1,174 @@
+import time
+import socket
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from http_client import PooledHTTPClient
+
+
+async def serve(handler):
+    """تشغيل خادم aiohttp محلي على منفذ عشوائي وإرجاع (المشغل، العنوان)"""
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+def make_client(**settings):
+    client = PooledHTTPClient()
+    client.backoff_base = 0.01
+    for name, value in settings.items():
+        setattr(client, name, value)
+    return client
+
+
+def run_against(handler, scenario, **settings):
+    """تشغيل scenario(client, url) مقابل خادم محلي ثم إغلاق الجلسة والخادم"""
+
+    async def run():
+        runner, url = await serve(handler)
+        client = make_client(**settings)
+        try:
+            return await scenario(client, url)
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_retries_transient_statuses_then_succeeds():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.json_response({"price": 42})
+
+    async def scenario(client, url):
+        return await client.get_json(f"{url}/quote"), client.stats
+
+    (status, body), stats = run_against(handler, scenario)
+    assert (status, body) == (200, {"price": 42})
+    assert len(calls) == 3
+    assert stats["retries"] == 2
+
+
+def test_returns_last_response_when_retries_are_exhausted():
+    async def handler(request):
+        return web.Response(status=502, text="bad gateway")
+
+    async def scenario(client, url):
+        return await client.get_text(f"{url}/quote", retries=1)
+
+    assert run_against(handler, scenario) == (502, "bad gateway")
+
+
+def test_backoff_is_full_jitter_within_the_exponential_bound():
+    client = make_client(backoff_base=0.5)
+    for attempt in range(4):
+        delays = [client._backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= 0.5 * 2 ** attempt for delay in delays)
+        # التأخير عشوائي وليس ثابتاً لكل المحاولات المتزامنة
+        assert len(set(delays)) > 1
+
+
+def test_honours_retry_after():
+    calls = []
+
+    async def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        return web.Response(text="ok")
+
+    async def scenario(client, url):
+        return await client.get_text(f"{url}/quote")
+
+    # backoff_base صغير جداً، فالانتظار ثانية كاملة لا يأتي إلا من Retry-After
+    assert run_against(handler, scenario) == (200, "ok")
+    assert calls[1] - calls[0] >= 0.9
+
+
+def test_reuses_pooled_connection():
+    ports = []
+
+    async def handler(request):
+        ports.append(request.transport.get_extra_info("peername")[1])
+        return web.Response(text="ok")
+
+    async def scenario(client, url):
+        for _ in range(5):
+            await client.get_text(f"{url}/quote")
+
+    run_against(handler, scenario)
+    assert len(ports) == 5
+    assert len(set(ports)) == 1
+
+
+def test_timeout_is_retried_then_raised():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.path)
+        await asyncio.sleep(1)
+        return web.Response(text="late")
+
+    async def scenario(client, url):
+        with pytest.raises(asyncio.TimeoutError):
+            await client.get_text(f"{url}/slow", retries=1)
+        return client.stats
+
+    stats = run_against(handler, scenario, timeout=0.2)
+    assert len(calls) == 2
+    assert stats["failures"] == 1
+
+
+def test_connection_failure_raises_client_error():
+    # منفذ محجوز ثم مُغلق: لا يوجد خادم يستمع عليه
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    async def run():
+        client = make_client()
+        try:
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await client.get_text(f"http://127.0.0.1:{port}/quote", retries=1)
+            return client.stats
+        finally:
+            await client.close()
+
+    stats = asyncio.run(run())
+    assert stats["requests"] == 2
+    assert stats["failures"] == 1
+
+
+def test_post_is_not_retried_unless_marked_idempotent():
+    calls = []
+
+    async def handler(request):
+        calls.append(request.method)
+        return web.Response(status=503)
+
+    async def scenario(client, url):
+        # POST غير آمن التكرار: الاستجابة الأولى تُعاد كما هي
+        first = await client.request("POST", f"{url}/orders", json={"qty": 1})
+        sent_once = len(calls)
+        await client.request("POST", f"{url}/search", json={"q": "2222"}, idempotent=True, retries=1)
+        return first, sent_once, client.stats
+
+    first, sent_once, stats = run_against(handler, scenario)
+    assert first == (503, "")
+    assert sent_once == 1
+    assert calls == ["POST", "POST", "POST"]
+    assert stats["retries"] == 1
@@ -0,0 +1,26 @@
+from label_index import label_index
+
+
+def test_exact_labels_score_one():
+    assert label_index.resolve_scored("Total Assets") == (("balance_sheet", "total_assets"), 1.0)
+    assert label_index.resolve_scored("إجمالي الأصول") == (("balance_sheet", "total_assets"), 1.0)
+
+
+def test_partial_and_fuzzy_labels_score_below_one():
+    key, score = label_index.resolve_scored("Total current assets")
+    assert key == ("balance_sheet", "current_assets")
+    assert 0.7 < score < 1.0
+
+    key, score = label_index.resolve_scored("Totl asets")
+    assert key == ("balance_sheet", "total_assets")
+    assert label_index.min_similarity <= score < 1.0
+
+    assert label_index.resolve_scored("foo bar") is None
+
+
+def test_find_scored_values_reports_match_quality_per_field():
+    found = label_index.find_scored_values("Total Assets 1,000 Net Incme 50")
+    assert found[("balance_sheet", "total_assets")] == (1000.0, 1.0)
+    value, score = found[("income_statement", "net_income")]
+    assert value == 50.0 and score < 1.0
+    assert label_index.find_values("Total Assets 1,000") == {("balance_sheet", "total_assets"): 1000.0}
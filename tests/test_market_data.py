@@ -0,0 +1,160 @@
+import os
+import asyncio
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+import market_data
+from market_data import FixtureBackend, MarketDataService, PRICE_COLUMNS, _normalize
+from price_store import PriceStore
+
+FIXTURES = os.path.join(os.path.dirname(market_data.__file__), "fixtures", "market_data")
+
+
+class CountingBackend:
+    """FixtureBackend يسجل كل تنزيل مع رموزه"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.backend = FixtureBackend(FIXTURES)
+        self.downloads = []
+
+    def download(self, symbols, period):
+        self.downloads.append(sorted(symbols))
+        return self.backend.download(symbols, period)
+
+    def info(self, symbol):
+        return self.backend.info(symbol)
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # كل تنزيل يُضاف إلى مخزن الأسعار؛ مخزن مؤقت حتى لا يُكتب في المخزن المشترك
+    monkeypatch.setattr(market_data, "price_store", PriceStore(str(tmp_path)))
+    service = MarketDataService(backend=CountingBackend())
+    yield service
+    service._executor.shutdown(wait=True)
+
+
+def test_concurrent_history_calls_share_one_download(service):
+    async def run():
+        requests = [["2222.SR"], ["1120.SR"], ["2222.SR", "1120.SR"], ["2222.SR"], ["UNKNOWN.SR"]]
+        frames = await asyncio.gather(*(service.history(symbols, "1mo") for symbols in requests))
+        again = await service.history(["2222.SR", "1120.SR"], "1mo")
+        return frames, again
+
+    frames, again = asyncio.run(run())
+    assert service.backend.downloads == [["1120.SR", "2222.SR", "UNKNOWN.SR"]]
+    assert service.stats["downloads"] == 1
+    assert service.stats["memory_hits"] == 1
+    assert set(frames[0].index.get_level_values("symbol")) == {"2222.SR"}
+    assert set(frames[2].index.get_level_values("symbol")) == {"2222.SR", "1120.SR"}
+    assert frames[4].empty
+    assert len(again) == len(frames[2])
+    assert list(frames[2].columns) == PRICE_COLUMNS
+
+
+def test_symbols_without_rows_are_not_downloaded_every_window(service, monkeypatch):
+    class FakeClock:
+        now = 1000.0
+
+        def monotonic(self):
+            return self.now
+
+    # ساعة الوحدة فقط؛ حلقة الأحداث تبقى على ساعتها الحقيقية لنافذة التجميع
+    clock = FakeClock()
+    monkeypatch.setattr(market_data, "time", clock)
+
+    async def run():
+        first = await service.history(["UNKNOWN.SR"], "1mo")
+        cached = await service.history(["UNKNOWN.SR", "2222.SR"], "1mo")
+        clock.now += service.empty_ttl + 1
+        expired = await service.history(["UNKNOWN.SR", "2222.SR"], "1mo")
+        return first, cached, expired
+
+    first, cached, expired = asyncio.run(run())
+    assert first.empty
+    assert set(cached.index.get_level_values("symbol")) == {"2222.SR"}
+    # النتيجة الفارغة تنتهي قبل بيانات 2222.SR فيُعاد تنزيل UNKNOWN.SR وحده
+    assert service.backend.downloads == [["UNKNOWN.SR"], ["2222.SR"], ["UNKNOWN.SR"]]
+    assert service.get_stats()["empty_symbols"] == 1
+
+
+def test_failed_download_is_not_cached_as_empty(service):
+    def failing(symbols, period):
+        service.backend.downloads.append(sorted(symbols))
+        raise ConnectionError("rate limited")
+
+    service.backend.download = failing
+
+    async def run():
+        await service.history(["2222.SR"], "1mo")
+        await service.history(["2222.SR"], "1mo")
+
+    asyncio.run(run())
+    assert service.backend.downloads == [["2222.SR"], ["2222.SR"]]
+
+
+def test_fixture_period_counts_trading_days(service):
+    frame = asyncio.run(service.history(["2222.SR"], "5d"))
+    assert len(frame) == 5
+    assert frame.index.get_level_values("date")[-1] == pd.Timestamp("2025-09-30")
+    assert asyncio.run(service.info("2222.SR"))["currency"] == "SAR"
+    assert asyncio.run(service.info("UNKNOWN.SR")) == {}
+
+
+def yahoo_frame(offset=0.0):
+    index = pd.DatetimeIndex(["2025-09-01 00:00", "2025-09-02 00:00", "2025-09-03 00:00"], tz="Asia/Riyadh")
+    return pd.DataFrame({
+        "Open": [10.0 + offset, 11.0 + offset, 12.0 + offset],
+        "High": [10.5 + offset, 11.5 + offset, 12.5 + offset],
+        "Low": [9.5 + offset, 10.5 + offset, 11.5 + offset],
+        "Close": [10.2 + offset, float("nan"), 12.2 + offset],
+        "Adj Close": [10.1 + offset, float("nan"), 12.1 + offset],
+        "Volume": [1000, 2000, 3000]
+    }, index=index)
+
+
+def test_normalize_flat_single_symbol_frame():
+    frame = _normalize(yahoo_frame(), ["2222.SR"])
+    assert list(frame.columns) == PRICE_COLUMNS
+    assert frame.index.names == ["symbol", "date"]
+    # اليوم بلا إغلاق يُحذف، والتواريخ بلا منطقة زمنية
+    assert list(frame.index) == [("2222.SR", pd.Timestamp("2025-09-01")), ("2222.SR", pd.Timestamp("2025-09-03"))]
+    assert frame["adj_close"].tolist() == [10.1, 12.1]
+
+
+@pytest.mark.parametrize("symbol_level", [0, 1])
+def test_normalize_multi_level_columns(symbol_level):
+    raw = pd.concat({"2222.SR": yahoo_frame(), "1120.SR": yahoo_frame(100.0)}, axis=1)
+    if symbol_level == 1:
+        # group_by="column": المستوى الأول الحقل والثاني الرمز
+        raw = raw.swaplevel(axis=1).sort_index(axis=1)
+
+    frame = _normalize(raw, ["2222.SR", "1120.SR", "MISSING.SR"])
+    assert list(frame.columns) == PRICE_COLUMNS
+    assert set(frame.index.get_level_values("symbol")) == {"2222.SR", "1120.SR"}
+    assert frame.loc[("1120.SR", pd.Timestamp("2025-09-03")), "close"] == 112.2
+    assert frame.loc[("2222.SR", pd.Timestamp("2025-09-01")), "volume"] == 1000
+
+
+def test_normalize_empty_download():
+    assert _normalize(None, ["2222.SR"]).empty
+    assert list(_normalize(pd.DataFrame(), ["2222.SR"]).columns) == PRICE_COLUMNS
+
+
+def test_latest_changes():
+    frame = pd.concat([
+        _normalize(yahoo_frame(), ["2222.SR"]),
+        _normalize(yahoo_frame().iloc[:1], ["1120.SR"])
+    ]).sort_index()
+
+    changes = MarketDataService.latest_changes(frame)
+    assert changes.loc["2222.SR", "current_value"] == 12.2
+    assert changes.loc["2222.SR", "change"] == pytest.approx(2.0)
+    assert changes.loc["2222.SR", "change_percent"] == pytest.approx((12.2 - 10.2) / 10.2 * 100)
+    # رمز بصف واحد: لا تغير
+    assert changes.loc["1120.SR", "change_percent"] == 0.0
+    assert MarketDataService.latest_changes(market_data.empty_frame()).empty
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("pytesseract")
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from ocr_engine import NUMERIC_WHITELIST, OCREngine, ScriptRouter
+
+
+def blank(width=420, height=60):
+    return np.full((height, width), 255, dtype=np.uint8)
+
+
+def latin_crop(text):
+    image = blank()
+    cv2.putText(image, text, (10, 42), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+    return image
+
+
+def arabic_word(image, x, width):
+    """كلمة عربية مصطنعة: خط أساس متصل تعلوه أسنان الحروف مع نقاط منفصلة"""
+
+    cv2.line(image, (x, 40), (x + width, 40), 0, 3)
+    for tooth in range(x + 6, x + width, 14):
+        cv2.line(image, (tooth, 40), (tooth, 26), 0, 3)
+    cv2.line(image, (x + width, 40), (x + width, 12), 0, 3)
+    cv2.circle(image, (x + 12, 50), 2, 0, -1)
+    cv2.circle(image, (x + width // 2, 18), 2, 0, -1)
+
+
+def arabic_crop():
+    image = blank()
+    arabic_word(image, 20, 110)
+    arabic_word(image, 160, 90)
+    arabic_word(image, 280, 120)
+    return image
+
+
+def mixed_crop():
+    image = blank()
+    arabic_word(image, 280, 120)
+    cv2.putText(image, "Revenue 2024", (10, 42), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+    return image
+
+
+@pytest.mark.parametrize("crop, route", [
+    (arabic_crop(), "ara"),
+    (latin_crop("Total revenue"), "eng"),
+    (latin_crop("Net income for the year"), "eng"),
+    (latin_crop("1,234,567"), "digits"),
+    (latin_crop("(12,500)"), "digits"),
+    (latin_crop("2024"), "digits"),
+    (mixed_crop(), "ara+eng"),
+    (blank(), "blank"),
+    (np.zeros((0, 0), dtype=np.uint8), "blank")
+])
+def test_script_router_classifies_synthetic_crops(crop, route):
+    assert ScriptRouter().classify(crop) == route
+
+
+DEJAVU = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+@pytest.mark.skipif(not os.path.exists(DEJAVU), reason="DejaVu font not installed")
+@pytest.mark.parametrize("text, route", [
+    ("Total revenue", "eng"), ("Equity", "eng"), ("1,234,567", "digits"), ("(12,500)", "digits"), ("-3.5", "digits")
+])
+def test_script_router_on_truetype_text(text, route):
+    # أقواس الخطوط الحقيقية تنزل تحت خط الأساس مثل p و y لكنها أضيق
+    image = Image.new("L", (420, 60), 255)
+    ImageDraw.Draw(image).text((10, 10), text, font=ImageFont.truetype(DEJAVU, 28), fill=0)
+    assert ScriptRouter().classify(np.array(image)) == route
+
+
+def test_script_router_accepts_rgb_crops():
+    rgb = cv2.cvtColor(latin_crop("1,234,567"), cv2.COLOR_GRAY2RGB)
+    assert ScriptRouter().classify(rgb) == "digits"
+
+
+class RecordingBackend:
+    """بديل tesseract يسجل معاملات كل استدعاء ويعيد ثقة محددة"""
+
+    name = "recording"
+
+    def __init__(self, confidence=90.0):
+        self.confidence = confidence
+        self.calls = []
+
+    def image_to_string(self, image, lang="ara+eng", psm=6, whitelist=None):
+        self.calls.append((lang, psm, whitelist))
+        return "fallback"
+
+    def image_to_string_with_confidence(self, image, lang="ara+eng", psm=6, whitelist=None):
+        self.calls.append((lang, psm, whitelist))
+        return "text", self.confidence
+
+    def close(self):
+        pass
+
+
+def engine_with(backend):
+    engine = OCREngine(backend="pytesseract")
+    engine.backend = engine.fallback = backend
+    return engine
+
+
+def test_numeric_blocks_use_the_digit_whitelist():
+    backend = RecordingBackend()
+    engine = engine_with(backend)
+    try:
+        assert engine.recognize_block_sync(Image.fromarray(latin_crop("1,234,567"))) == ("text", "digits")
+        assert engine.recognize_block_sync(Image.fromarray(latin_crop("Total revenue"))) == ("text", "eng")
+        assert engine.recognize_block_sync(Image.fromarray(arabic_crop())) == ("text", "ara")
+    finally:
+        engine.close()
+
+    assert backend.calls == [("eng", 7, NUMERIC_WHITELIST), ("eng", 7, None), ("ara", 7, None)]
+    assert engine.route_stats["digits"]["blocks"] == 1
+
+
+def test_low_confidence_route_falls_back_to_ara_eng():
+    backend = RecordingBackend(confidence=20.0)
+    engine = engine_with(backend)
+    try:
+        assert engine.recognize_block_sync(Image.fromarray(latin_crop("2024"))) == ("fallback", "ara+eng")
+    finally:
+        engine.close()
+
+    assert backend.calls == [("eng", 7, NUMERIC_WHITELIST), ("ara+eng", 7, None)]
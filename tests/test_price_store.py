@@ -0,0 +1,79 @@
+import multiprocessing
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from price_store import PriceStore
+
+
+def days(start, count):
+    return np.arange(np.datetime64(start), np.datetime64(start) + count)
+
+
+def append_range(store, symbol, start, count, first_value):
+    values = np.arange(first_value, first_value + count, dtype=np.float64)
+    return store.append(symbol, days(start, count), {"close": values})
+
+
+def test_stale_instances_get_distinct_slots(tmp_path):
+    # ثلاث عمليات فتحت المخزن قبل أن تكتب أي منها
+    first, second, third = (PriceStore(str(tmp_path)) for _ in range(3))
+    append_range(first, "AAA", "2025-09-01", 3, 1)
+    append_range(second, "BBB", "2025-09-01", 3, 10)
+    append_range(third, "CCC", "2025-09-01", 3, 20)
+
+    reader = PriceStore(str(tmp_path))
+    assert sorted(entry["slot"] for entry in reader.index.values()) == [0, 1, 2]
+    assert reader.slice("BBB")[1].tolist() == [10.0, 11.0, 12.0]
+    assert reader.slice("CCC")[1].tolist() == [20.0, 21.0, 22.0]
+
+
+def test_stale_row_count_does_not_truncate_other_writes(tmp_path):
+    first = PriceStore(str(tmp_path))
+    append_range(first, "AAA", "2025-09-01", 5, 1)
+    second = PriceStore(str(tmp_path))
+
+    append_range(first, "AAA", "2025-09-06", 5, 6)
+    # second يرى 5 صفوف فقط في فهرسه المحفوظ
+    assert append_range(second, "AAA", "2025-09-11", 1, 11) == 1
+
+    assert second.slice("AAA")[1].tolist() == [float(v) for v in range(1, 12)]
+    # القارئ القديم يرى كتابات العمليات الأخرى
+    assert first.close_on_or_before("AAA") == 11.0
+
+
+def write_symbols(directory, worker):
+    store = PriceStore(directory)
+    for i in range(10):
+        append_range(store, f"W{worker}S{i}", "2025-09-01", 4, worker * 100 + i)
+        append_range(store, "SHARED", str(np.datetime64("2025-01-01") + worker * 10 + i), 1, worker * 10 + i)
+
+
+def test_concurrent_writers_across_processes(tmp_path):
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_symbols, args=(str(tmp_path), worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    store = PriceStore(str(tmp_path))
+    assert len(store.symbols) == 41
+    assert len({entry["slot"] for entry in store.index.values()}) == 41
+    for worker in range(4):
+        for i in range(10):
+            first_value = worker * 100 + i
+            assert store.slice(f"W{worker}S{i}")[1].tolist() == [float(first_value + k) for k in range(4)]
+
+    # الأيام الأقدم من آخر يوم مخزن تُتجاهل، فآخر يوم (من العامل الأخير) محفوظ دائماً
+    _, shared = store.slice("SHARED")
+    assert set(shared[~np.isnan(shared)].tolist()) <= {float(v) for v in range(40)}
+    assert store.close_on_or_before("SHARED") == 39.0
+
+
+def test_default_directory_is_persistent(tmp_path, monkeypatch):
+    monkeypatch.delenv("PRICE_STORE_DIR", raising=False)
+    monkeypatch.setenv("FINCLICK_DATA_DIR", str(tmp_path))
+    assert PriceStore().directory == str(tmp_path / "prices")
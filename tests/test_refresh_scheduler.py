@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("pandas")
+from pymongo.errors import DuplicateKeyError
+
+import enrichment_cache
+from refresh_scheduler import RefreshScheduler
+
+
+class FakeLocks:
+    """مجموعة scheduler_locks في الذاكرة: find_one_and_update بمرشح القفل و upsert كما في MongoDB"""
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _matches(document, filter):
+        alternatives = filter.get("$or", [{}])
+        for alternative in alternatives:
+            if "owner" in alternative and document.get("owner") == alternative["owner"]:
+                return True
+            if "expires_at" in alternative and document["expires_at"] < alternative["expires_at"]["$lt"]:
+                return True
+        return False
+
+    async def find_one_and_update(self, filter, update, upsert=False, return_document=None):
+        key = filter["_id"]
+        document = self.documents.get(key)
+        if document is not None and not self._matches(document, filter):
+            if upsert:
+                # لا مستند يطابق المرشح فيحاول upsert إدراج _id موجود
+                raise DuplicateKeyError("E11000 duplicate key error")
+            return None
+        document = self.documents.setdefault(key, {"_id": key})
+        document.update(update["$set"])
+        return dict(document)
+
+    async def delete_one(self, filter):
+        document = self.documents.get(filter["_id"])
+        if document is not None and document.get("owner") == filter.get("owner"):
+            del self.documents[filter["_id"]]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.scheduler_locks = FakeLocks()
+
+
+def make_scheduler(database, lease=0.3, fetch=None):
+    scheduler = RefreshScheduler(lock_name="test_refresh", lease_seconds=lease, jitter=0.0)
+    scheduler.enabled = True
+    # القفل فقط في MongoDB المزيف؛ اللقطات تبقى في ذاكرة العملية
+    scheduler.database = database
+
+    async def default_fetch():
+        return {"level": 1}
+
+    scheduler.register("indices", 60, fetch or default_fetch)
+    return scheduler
+
+
+def test_only_one_of_two_schedulers_becomes_leader():
+    database = FakeDatabase()
+    fetches = []
+
+    def counting(name):
+        async def fetch():
+            fetches.append(name)
+            return {"level": 1}
+        return fetch
+
+    first = make_scheduler(database, fetch=counting("first"))
+    second = make_scheduler(database, fetch=counting("second"))
+
+    async def run():
+        await asyncio.gather(first.start(), second.start())
+        await asyncio.sleep(0.2)
+        leaders = (first.is_leader, second.is_leader)
+        await asyncio.gather(first.stop(), second.stop())
+        return leaders
+
+    assert sorted(asyncio.run(run())) == [False, True]
+    leader = "first" if fetches and fetches[0] == "first" else "second"
+    assert fetches == [leader]
+
+
+def test_takeover_after_the_lease_expires():
+    database = FakeDatabase()
+    first = make_scheduler(database, lease=0.1)
+    second = make_scheduler(database, lease=0.1)
+
+    async def run():
+        assert await first._try_acquire()
+        assert not await second._try_acquire()
+        # first توقف عن التجديد (عملية ميتة) فينتهي إيجاره
+        await asyncio.sleep(0.15)
+        assert await second._try_acquire()
+        # القائد السابق لا يستعيد القفل ما دام إيجار second سارياً
+        assert not await first._try_acquire()
+
+    asyncio.run(run())
+    assert database.scheduler_locks.documents["test_refresh"]["owner"] == second.worker_id
+
+
+def test_renewal_keeps_the_lock_for_its_owner():
+    database = FakeDatabase()
+    first = make_scheduler(database, lease=0.1)
+    second = make_scheduler(database, lease=0.1)
+
+    async def run():
+        for _ in range(4):
+            assert await first._try_acquire()
+            await asyncio.sleep(0.05)
+            assert not await second._try_acquire()
+
+    asyncio.run(run())
+
+
+def test_stop_releases_the_lock_for_another_worker():
+    database = FakeDatabase()
+    first = make_scheduler(database, lease=30)
+    second = make_scheduler(database, lease=30)
+
+    async def run():
+        await first.start()
+        await asyncio.sleep(0.05)
+        assert first.is_leader
+        assert not await second._try_acquire()
+
+        await first.stop()
+        assert "test_refresh" not in database.scheduler_locks.documents
+        assert first.jobs["indices"].task is None
+        # لا انتظار لانتهاء إيجار مدته 30 ثانية
+        return await second._try_acquire()
+
+    assert asyncio.run(run())
+
+
+def test_read_reports_stale_after_twice_the_interval(monkeypatch):
+    class FakeClock:
+        now = 1_000_000.0
+
+        def time(self):
+            return self.now
+
+    clock = FakeClock()
+    monkeypatch.setattr(enrichment_cache, "time", clock)
+    scheduler = make_scheduler(None)
+
+    async def run():
+        missing = await scheduler.read("indices")
+        await scheduler.cache.put("indices", {"level": 1})
+        clock.now += 90
+        aging = await scheduler.read("indices")
+        clock.now += 40
+        stale = await scheduler.read("indices")
+        return missing, aging, stale
+
+    missing, aging, stale = asyncio.run(run())
+    assert missing == (None, {"age_seconds": None, "interval_seconds": 60, "stale": True})
+    assert aging == ({"level": 1}, {"age_seconds": 90.0, "interval_seconds": 60, "stale": False})
+    assert stale[1]["stale"] is True
+    assert stale[1]["age_seconds"] == 130.0
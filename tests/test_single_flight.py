@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_calls_collapse_to_one():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"symbol": "2222.SR"}
+
+    async def run():
+        return await asyncio.gather(*(flights.do("aramco", fetch) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{"symbol": "2222.SR"}] * 10
+    assert flights.get_stats() == {"executed": 1, "coalesced": 9, "in_flight": 0}
+
+
+def test_errors_are_shared_and_the_key_is_released():
+    flights = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise ConnectionError("provider down")
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("aramco", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ConnectionError) for result in results)
+        # بعد انتهاء المهمة يبدأ الطلب التالي جلباً جديداً
+        with pytest.raises(ConnectionError):
+            await flights.do("aramco", failing)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_cancelling_one_waiter_keeps_the_shared_call():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def run():
+        first = asyncio.create_task(flights.do("key", fetch))
+        second = asyncio.create_task(flights.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 42
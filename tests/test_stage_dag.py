@@ -0,0 +1,111 @@
+import time
+import asyncio
+
+import pytest
+
+from stage_dag import StageDAG
+
+
+def stage(value, delay=0.0, log=None, name=None):
+    """مرحلة تنتظر delay ثم تعيد value؛ تسجل بدايتها ونهايتها ومدخلاتها في log"""
+
+    async def fn(upstream):
+        if log is not None:
+            log.append(("start", name, sorted(upstream)))
+        await asyncio.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        if log is not None:
+            log.append(("end", name))
+        return value
+    return fn
+
+
+def test_dependent_stage_starts_after_its_dependencies_with_their_results():
+    log = []
+    dag = StageDAG()
+    dag.add("health", stage({"score": 80}, 0.05, log, "health"))
+    dag.add("risk", stage({"level": "low"}, 0.1, log, "risk"))
+    dag.add("profile", stage({"name": "Aramco"}, 0.0, log, "profile"))
+
+    async def recommendations(upstream):
+        log.append(("start", "recommendations", sorted(upstream)))
+        return {"based_on": upstream}
+
+    dag.add("recommendations", recommendations, after=("health", "risk"))
+
+    start = time.perf_counter()
+    results, reports = asyncio.run(dag.run())
+    elapsed = time.perf_counter() - start
+
+    # المراحل المستقلة معاً: الزمن أطول مسار (0.1) لا المجموع (0.15)
+    assert elapsed < 0.14
+    assert log.index(("start", "recommendations", ["health", "risk"])) > log.index(("end", "risk"))
+    assert results["recommendations"] == {"based_on": {"health": {"score": 80}, "risk": {"level": "low"}}}
+    assert all(report["status"] == "success" for report in reports.values())
+
+
+def test_stages_must_be_added_after_their_dependencies():
+    dag = StageDAG()
+    dag.add("health", stage({}))
+    with pytest.raises(ValueError, match="unknown stages: risk"):
+        dag.add("recommendations", stage({}), after=("health", "risk"))
+    with pytest.raises(ValueError, match="Duplicate"):
+        dag.add("health", stage({}))
+
+
+def test_per_stage_timeout():
+    dag = StageDAG(default_timeout=1.0)
+    dag.add("slow", stage({"late": True}, 0.5), timeout=0.05)
+    dag.add("fast", stage({"ok": True}, 0.0))
+
+    results, reports = asyncio.run(dag.run())
+    assert results == {"fast": {"ok": True}}
+    assert reports["slow"]["status"] == "timeout"
+    assert reports["slow"]["duration"] < 0.3
+
+
+def test_overall_deadline_cancels_unfinished_stages():
+    dag = StageDAG()
+    dag.add("fast", stage({"ok": True}))
+    dag.add("slow", stage({"late": True}, 1.0))
+    dag.add("after_slow", stage({"late": True}), after=("slow",))
+
+    start = time.perf_counter()
+    sections, run_info = asyncio.run(dag.run_sections(deadline=0.1))
+    assert time.perf_counter() - start < 0.5
+    assert sections == {"fast": {"ok": True}, "slow": {}, "after_slow": {}}
+    assert run_info["stages"]["slow"]["status"] == "deadline"
+    assert run_info["stages"]["after_slow"]["status"] == "deadline"
+    assert run_info["partial"] is True
+
+
+def test_failed_dependency_leaves_an_empty_section_and_dependents_still_run():
+    dag = StageDAG()
+    dag.add("health", stage(RuntimeError("no statements")))
+    dag.add("risk", stage({"level": "low"}))
+
+    async def recommendations(upstream):
+        return {"inputs": sorted(upstream)}
+
+    dag.add("recommendations", recommendations, after=("health", "risk"))
+
+    sections, run_info = asyncio.run(dag.run_sections())
+    assert sections["health"] == {}
+    assert sections["recommendations"] == {"inputs": ["risk"]}
+    assert run_info["stages"]["health"] == {
+        "status": "failed", "duration": run_info["stages"]["health"]["duration"], "error": "no statements"
+    }
+    assert run_info["stages"]["recommendations"]["missing_inputs"] == ["health"]
+    assert run_info["partial"] is True
+
+
+def test_complete_run_is_not_partial_and_keeps_stage_order():
+    dag = StageDAG()
+    for name in ("profile", "health", "risk"):
+        dag.add(name, stage({"stage": name}, 0.01 if name == "profile" else 0.0))
+
+    sections, run_info = asyncio.run(dag.run_sections(deadline=5.0))
+    assert list(sections) == ["profile", "health", "risk"]
+    assert list(run_info["stages"]) == ["profile", "health", "risk"]
+    assert run_info["partial"] is False
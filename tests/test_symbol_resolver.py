@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+import symbol_resolver
+from symbol_resolver import SymbolResolver
+
+LISTINGS = os.path.join(os.path.dirname(symbol_resolver.__file__), "data", "listings.csv")
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return SymbolResolver(LISTINGS)
+
+
+def best(resolver, query):
+    candidates = resolver.search(query, 1)
+    return (candidates[0]["symbol"], candidates[0]["match"]) if candidates else None
+
+
+def test_exact_names_and_symbols(resolver):
+    assert best(resolver, "Apple Inc.") == ("AAPL", "exact")
+    assert best(resolver, "Saudi Arabian Oil Company") == ("2222.SR", "exact")
+    assert best(resolver, "teva") == ("TEVA", "symbol")
+    assert resolver.resolve("TEVA") == "TEVA"
+
+
+def test_arabic_names(resolver):
+    assert best(resolver, "أرامكو") == ("2222.SR", "exact")
+    # أداة التعريف والهمزات لا تؤثر
+    assert resolver.resolve("الراجحي") == "1120.SR"
+    assert resolver.resolve("شركة أرامكو السعودية") == "2222.SR"
+
+
+def test_prefix_of_a_listed_name(resolver):
+    assert best(resolver, "Microso") == ("MSFT", "prefix")
+    assert resolver.resolve("Microso") == "MSFT"
+    # بادئة قصيرة: مرشح في البحث لكنها لا تكفي للحل التلقائي
+    assert best(resolver, "Micro") == ("MSFT", "prefix")
+    assert resolver.resolve("Micro") is None
+
+
+def test_fuzzy_matches_typos(resolver):
+    assert best(resolver, "Microsfot") == ("MSFT", "fuzzy")
+    assert resolver.resolve("Amazn") == "AMZN"
+
+
+def test_listed_name_at_the_start_of_the_query(resolver):
+    assert best(resolver, "Apple Computers Inc") == ("AAPL", "leading")
+    assert resolver.resolve("Apple Computers Inc") == "AAPL"
+    assert resolver.resolve("Al Rajhi Bank Saudi") == "1120.SR"
+    # المطابقة البادئة تبقى أقل من المطابقة التامة
+    assert resolver.search("Apple Computers Inc", 1)[0]["score"] < 1.0
+
+
+def test_unknown_company(resolver):
+    assert resolver.resolve("شركة غير مدرجة") is None
+    assert resolver.resolve_many(["Apple Computers Inc", "شركة غير مدرجة", "Apple Computers Inc"]) == ["AAPL", None, "AAPL"]
@@ -0,0 +1,186 @@
+import io
+import os
+import asyncio
+import zipfile
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+from upload_buffer import (
+    ArchiveLimitError, RequestSizeLimitMiddleware, UploadBuffer, UploadTooLargeError, iter_archive_members,
+    shared_archive_root
+)
+
+
+def run_request(middleware, path, chunks, content_length=None):
+    """إرسال طلب ASGI بأجزاء الجسم المعطاة وإرجاع (الحالة، عدد البايتات التي قرأها التطبيق)"""
+
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    scope = {"type": "http", "method": "POST", "path": path, "headers": headers}
+    messages = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"]
+
+
+def make_app(consumed):
+    async def app(scope, receive, send):
+        try:
+            while True:
+                message = await receive()
+                consumed.append(len(message.get("body", b"")))
+                if not message.get("more_body"):
+                    break
+        except Exception:
+            # مثل FastAPI: خطأ تحليل الجسم يصبح 400
+            await send({"type": "http.response.start", "status": 400, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def test_rejects_declared_length_without_reading_body():
+    consumed = []
+    middleware = RequestSizeLimitMiddleware(make_app(consumed), {"/api/upload": 10})
+    assert run_request(middleware, "/api/upload", [b"x" * 20], content_length=20) == 413
+    assert consumed == []
+
+
+def test_stops_streamed_body_at_limit():
+    consumed = []
+    middleware = RequestSizeLimitMiddleware(make_app(consumed), {"/api/upload": 10})
+    assert run_request(middleware, "/api/upload", [b"x" * 6, b"x" * 6, b"x" * 6]) == 413
+    # الجزء الذي تجاوز الحد لا يصل إلى التطبيق
+    assert sum(consumed) == 6
+
+
+def test_passes_requests_within_limit_and_other_paths():
+    consumed = []
+    middleware = RequestSizeLimitMiddleware(make_app(consumed), {"/api/upload": 10})
+    assert run_request(middleware, "/api/upload", [b"x" * 5, b"x" * 5], content_length=10) == 200
+    assert run_request(middleware, "/api/other", [b"x" * 50], content_length=50) == 200
+
+
+def test_longest_prefix_wins():
+    middleware = RequestSizeLimitMiddleware(make_app([]), {"/api/": 100, "/api/uploads/": 10})
+    assert run_request(middleware, "/api/uploads/1/chunks/0", [b"x" * 20], content_length=20) == 413
+    assert run_request(middleware, "/api/analyze", [b"x" * 20], content_length=20) == 200
+
+
+def make_zip(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return SimpleNamespace(filename="reports.zip", file=io.BytesIO(data.getvalue()))
+
+
+def read_archive(upload, **limits):
+    async def collect():
+        members = []
+        async for name, buffer in iter_archive_members(upload, **limits):
+            members.append((name, buffer.size))
+            buffer.close()
+        return members
+    return asyncio.run(collect())
+
+
+def test_shared_archive_root():
+    # ضغط مجلد واحد يضع كل الملفات تحته
+    assert shared_archive_root(["Reports/Aramco/2023.pdf", "Reports/SABIC/2023.pdf"]) == "Reports"
+    assert shared_archive_root(["Aramco/2023.pdf", "SABIC/2023.pdf"]) is None
+    assert shared_archive_root(["Reports/2023.pdf", "summary.pdf"]) is None
+    assert shared_archive_root([]) is None
+
+
+def test_archive_total_limit_reports_archive_not_member():
+    upload = make_zip({"a.pdf": b"x" * 60, "b.pdf": b"x" * 60})
+    with pytest.raises(ArchiveLimitError, match="total size limit of 100 bytes"):
+        read_archive(upload, max_members=10, max_total_bytes=100, max_member_bytes=80)
+
+
+def test_member_limit_reports_member():
+    upload = make_zip({"a.pdf": b"x" * 60})
+    with pytest.raises(UploadTooLargeError, match="a.pdf exceeds the upload size limit of 50 bytes"):
+        read_archive(upload, max_members=10, max_total_bytes=1000, max_member_bytes=50)
+
+
+def test_compressed_archive_size_is_capped():
+    upload = make_zip({"a.pdf": b"x" * 60})
+    size = len(upload.file.getvalue())
+    with pytest.raises(UploadTooLargeError, match="reports.zip exceeds"):
+        read_archive(upload, max_members=10, max_total_bytes=1000, max_archive_bytes=size - 1)
+    assert read_archive(upload, max_members=10, max_total_bytes=1000, max_archive_bytes=size) == [("a.pdf", 60)]
+
+
+class SpooledUpload:
+    """مثل UploadFile في Starlette: SpooledTemporaryFile ينتقل إلى القرص بعد max_size"""
+
+    def __init__(self, filename, payload, max_size):
+        self.filename = filename
+        self.size = len(payload)
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size)
+        self.file.write(payload)
+        self.file.seek(0)
+        self.reads = 0
+
+    async def read(self, size=-1):
+        self.reads += 1
+        return self.file.read(size)
+
+
+def test_rolled_over_upload_is_used_without_a_copy(tmp_path):
+    payload = b"%PDF-1.4 " + bytes(range(256)) * 64
+    upload = SpooledUpload("Report.PDF", payload, max_size=1024)
+    assert upload.file._rolled
+
+    buffer = asyncio.run(UploadBuffer.from_upload(upload, max_bytes=len(payload), directory=str(tmp_path)))
+    try:
+        assert upload.reads == 0
+        assert buffer.size == len(payload)
+        # المحللون الذين يتحققون من الامتداد يرون .pdf
+        assert buffer.path.endswith(".pdf")
+        with buffer.open() as f:
+            assert f.read() == payload
+        with open(buffer.path, "rb") as f:
+            assert f.read(8) == payload[:8]
+    finally:
+        buffer.close()
+
+    assert os.listdir(str(tmp_path)) == []
+    # ملف Starlette يبقى سليماً ليغلقه Starlette
+    upload.file.seek(0)
+    assert upload.file.read() == payload
+
+
+def test_in_memory_upload_is_copied(tmp_path):
+    upload = SpooledUpload("report.xlsx", b"PK small workbook", max_size=1024)
+    assert not upload.file._rolled
+
+    with asyncio.run(UploadBuffer.from_upload(upload, directory=str(tmp_path))) as buffer:
+        assert upload.reads > 0
+        assert os.path.dirname(buffer.path) == str(tmp_path)
+        with buffer.open() as f:
+            assert f.read() == b"PK small workbook"
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_rolled_over_upload_over_the_limit_is_rejected(tmp_path):
+    upload = SpooledUpload("report.pdf", b"x" * 4096, max_size=1024)
+    upload.size = None  # لا حجم معلن، فالحد يُفرض من حجم الملف على القرص
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(UploadBuffer.from_upload(upload, max_bytes=2048, directory=str(tmp_path)))
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pymongo")
+from pymongo.errors import BulkWriteError
+
+from write_behind import WriteBehindQueue
+
+
+class FakeCollection:
+    """مجموعة في الذاكرة تطبق insert_many و bulk_write ($set فقط) وتسجل الاستدعاءات"""
+
+    def __init__(self):
+        self.documents = {}
+        self.calls = []
+        self.failures = {"insert_many": [], "bulk_write": []}
+
+    def _maybe_fail(self, method):
+        if self.failures[method]:
+            raise self.failures[method].pop(0)
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls.append(("insert_many", len(documents), ordered))
+        self._maybe_fail("insert_many")
+        for document in documents:
+            self.documents[document["key"]] = dict(document)
+
+    async def bulk_write(self, requests, ordered=True):
+        self.calls.append(("bulk_write", len(requests), ordered))
+        self._maybe_fail("bulk_write")
+        for request in requests:
+            key = request._filter["key"]
+            if key in self.documents or request._upsert:
+                self.documents.setdefault(key, {"key": key}).update(request._doc["$set"])
+
+
+def make_queue(collection, **options):
+    options.setdefault("flush_interval", 0.05)
+    return WriteBehindQueue(database={"audit": collection}, **options)
+
+
+def test_batches_queued_operations_and_drains_on_stop():
+    collection = FakeCollection()
+    queue = make_queue(collection, flush_interval=10)
+
+    async def run():
+        await queue.start()
+        for i in range(5):
+            await queue.insert("audit", {"key": i})
+        # الفاصل الزمني أطول من الاختبار: stop يجب أن يفرغ الطابور
+        await queue.stop()
+
+    asyncio.run(run())
+    assert collection.calls == [("insert_many", 5, False)]
+    assert sorted(collection.documents) == [0, 1, 2, 3, 4]
+    assert queue.stats["written"] == 5
+    assert queue.stats["batches"] == 1
+
+
+def test_keeps_queue_order_for_the_same_document():
+    collection = FakeCollection()
+    queue = make_queue(collection)
+
+    async def run():
+        await queue.start()
+        await queue.insert("audit", {"key": "a", "value": 0})
+        await queue.update("audit", {"key": "a"}, {"$set": {"value": 1}})
+        await queue.insert("audit", {"key": "b", "value": 0})
+        await queue.update("audit", {"key": "a"}, {"$set": {"value": 2}})
+        await queue.update("audit", {"key": "b"}, {"$set": {"value": 3}})
+        await queue.stop()
+
+    asyncio.run(run())
+    assert collection.documents["a"]["value"] == 2
+    assert collection.documents["b"]["value"] == 3
+    assert collection.calls == [
+        ("insert_many", 1, False), ("bulk_write", 1, True), ("insert_many", 1, False), ("bulk_write", 2, True)
+    ]
+
+
+def test_retries_from_the_failed_run():
+    collection = FakeCollection()
+    collection.failures["bulk_write"].append(ConnectionError("mongo unavailable"))
+    queue = make_queue(collection)
+
+    async def run():
+        await queue.start()
+        await queue.insert("audit", {"key": "a", "value": 0})
+        await queue.update("audit", {"key": "a"}, {"$set": {"value": 1}})
+        await queue.stop()
+
+    asyncio.run(run())
+    assert collection.documents["a"]["value"] == 1
+    # الإدراج الناجح لا يُعاد عند إعادة محاولة التحديث
+    assert collection.calls == [("insert_many", 1, False), ("bulk_write", 1, True), ("bulk_write", 1, True)]
+    assert queue.stats["failed"] == 0
+
+
+def test_duplicate_key_errors_count_as_written():
+    collection = FakeCollection()
+    collection.failures["insert_many"].append(BulkWriteError({"writeErrors": [{"code": 11000}]}))
+    queue = make_queue(collection)
+    asyncio.run(queue._write_batch([("insert", "audit", {"key": "a"})]))
+    assert queue.stats["written"] == 1
+
+    collection.failures["insert_many"].append(BulkWriteError({"writeErrors": [{"code": 121}]}))
+    with pytest.raises(BulkWriteError):
+        asyncio.run(queue._write_batch([("insert", "audit", {"key": "b"})]))